@@ -0,0 +1 @@
+pytest_plugins = ["mauromattos_scrapy.perf_budget", "pytester"]
@@ -0,0 +1,184 @@
+"""Per-field allocation profiling of page objects with tracemalloc.
+
+Every field is computed on a fresh page whose HTML has already been parsed,
+so a field is charged for the cached fields it reads but not for parsing,
+which is reported as the pseudo-field ``<parse>``. For each field the peak
+of traced memory while it runs is recorded. The field is then computed a
+second time on another fresh page, and the allocations alive at that run's
+peak, transient ones included, are grouped by traceback into folded stacks
+(``Page;field;file:line;...  bytes``) that flamegraph.pl, inferno or
+speedscope render directly.
+"""
+
+import inspect
+import sys
+import tracemalloc
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Type
+
+from web_poet.fields import get_fields_dict
+
+from mauromattos_scrapy.extraction import build_page
+
+PARSE_FIELD = "<parse>"
+DEFAULT_FRAMES = 30
+# Event loop frames say nothing about the page object and only make the
+# stacks deeper.
+IGNORED_FILES = (tracemalloc.__file__, "/asyncio/")
+# The peak snapshot is taken within this fraction of the peak.
+PEAK_STEPS = 20
+
+
+class FieldProfile(NamedTuple):
+    page: str
+    field: str
+    peak: int
+    retained: int
+    stacks: Dict[str, int]
+
+
+def _frame_name(frame) -> str:
+    parts = Path(frame.filename).parts
+    return f"{'/'.join(parts[-2:])}:{frame.lineno}"
+
+
+def _folded(snapshot, before, prefix: str) -> Dict[str, int]:
+    stacks: Dict[str, int] = defaultdict(int)
+    for diff in snapshot.compare_to(before, "traceback"):
+        if diff.size_diff <= 0:
+            continue
+        frames = list(diff.traceback)
+        # Start the stack at the field: drop the caller frames up to here.
+        for position in range(len(frames) - 1, -1, -1):
+            if frames[position].filename == __file__:
+                frames = frames[position + 1 :]
+                break
+        frames = [
+            _frame_name(frame)
+            for frame in frames
+            if not any(ignored in frame.filename for ignored in IGNORED_FILES)
+        ]
+        stacks[";".join([prefix] + frames)] += diff.size_diff
+    return stacks
+
+
+class _PeakSnapshot:
+    """Profile hook that snapshots the traces each time traced memory
+    grows by another step, so the last snapshot is the one closest to the
+    peak. Memory is only sampled on calls and returns, which is where
+    transient allocations of a field are made and released."""
+
+    def __init__(self, growth: int):
+        self.base, _ = tracemalloc.get_traced_memory()
+        self.step = max(growth // PEAK_STEPS, 1)
+        self.taken = 0
+        self.snapshot = None
+
+    def __call__(self, frame, event, arg):
+        growth = tracemalloc.get_traced_memory()[0] - self.base
+        if growth >= self.taken + self.step:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.taken = growth
+
+
+async def _compute(compute):
+    value = compute()
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+async def _measure(page_name: str, field_name: str, prepare) -> FieldProfile:
+    compute = prepare()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    value = await _compute(compute)
+    retained, peak = tracemalloc.get_traced_memory()
+    del value, compute
+
+    compute = prepare()
+    before = tracemalloc.take_snapshot()
+    hook = _PeakSnapshot(peak - current)
+    previous = sys.getprofile()
+    sys.setprofile(hook)
+    try:
+        value = await _compute(compute)
+    finally:
+        sys.setprofile(previous)
+    snapshot = hook.snapshot or tracemalloc.take_snapshot()
+    del value, compute
+    return FieldProfile(
+        page_name,
+        field_name,
+        peak - current,
+        retained - current,
+        _folded(snapshot, before, f"{page_name};{field_name}"),
+    )
+
+
+def _prepare_parse(page_cls: Type, url: str, body: bytes, encoding: Optional[str]):
+    page = build_page(page_cls, url, body, encoding)
+    return lambda: page.selector
+
+
+def _prepare_field(page_cls: Type, url: str, body: bytes, encoding: Optional[str], name: str):
+    page = build_page(page_cls, url, body, encoding)
+    page.selector  # parse outside the measurement
+    return lambda: getattr(page, name)
+
+
+async def profile_page(
+    page_cls: Type,
+    url: str,
+    body: bytes,
+    encoding: Optional[str] = "utf-8",
+    frames: int = DEFAULT_FRAMES,
+) -> List[FieldProfile]:
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        page_name = page_cls.__name__
+        prepare = partial(_prepare_parse, page_cls, url, body, encoding)
+        profiles = [await _measure(page_name, PARSE_FIELD, prepare)]
+        for name in get_fields_dict(page_cls):
+            prepare = partial(_prepare_field, page_cls, url, body, encoding, name)
+            profiles.append(await _measure(page_name, name, prepare))
+        return profiles
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+class AllocationReport:
+    """Accumulates FieldProfile results over many pages."""
+
+    def __init__(self):
+        self.pages: Dict[str, int] = defaultdict(int)
+        self.peak: Dict[tuple, int] = defaultdict(int)
+        self.retained: Dict[tuple, int] = defaultdict(int)
+        self.stacks: Dict[str, int] = defaultdict(int)
+
+    def add(self, profiles: List[FieldProfile]) -> None:
+        if profiles:
+            self.pages[profiles[0].page] += 1
+        for profile in profiles:
+            key = (profile.page, profile.field)
+            self.peak[key] = max(self.peak[key], profile.peak)
+            self.retained[key] += profile.retained
+            for stack, size in profile.stacks.items():
+                self.stacks[stack] += size
+
+    def write_folded(self, path: str | Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, size in sorted(self.stacks.items()):
+                f.write(f"{stack} {size}\n")
+
+    def summary(self, limit: int = 15) -> List[str]:
+        lines = [f"{'page;field':<55} {'max peak KiB':>12} {'avg kept KiB':>12}"]
+        for key in sorted(self.peak, key=self.peak.get, reverse=True)[:limit]:
+            average = self.retained[key] / self.pages[key[0]]
+            lines.append(f"{';'.join(key):<55} {self.peak[key] / 1024:>12.1f} {average / 1024:>12.1f}")
+        return lines
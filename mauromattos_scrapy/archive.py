@@ -0,0 +1,229 @@
+"""Packed page archive: zstd-compressed records plus an offset index.
+
+Layout::
+
+    b"MMPA" version:u16                           header
+    record 0, record 1, ...                       size:u32 raw_size:u32 frame
+    index                                         one entry per record
+    index_offset:u64 count:u64 b"MMPA"           footer
+
+Each record is one checksummed zstd frame, which decompresses to
+``url_len:u32 meta_len:u32 url meta body``, ``meta`` being a JSON object.
+Index entries are ``offset:u64 size:u32 raw_size:u32 url_len:u16 url``
+(``offset`` is that of the frame), so a reader can look pages up by
+position or URL without touching the records, and each record is
+decompressed straight out of the memory map.
+
+Records are written to the archive file as they come and the index only on
+close. An archive without its index, left by a crash or still being
+written, is read by walking the records up to the last complete one; a
+writer opened with ``append=True`` continues such an archive, or a
+completed one, after its last record. Version 1 archives, whose frames have
+no size prefix, are only readable through their index.
+"""
+
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    from compression import zstd
+except ImportError:  # Python < 3.14
+    from backports import zstd
+
+MAGIC = b"MMPA"
+VERSION = 2
+HEADER = struct.Struct("<4sH")
+FOOTER = struct.Struct("<QQ4s")
+INDEX_ENTRY = struct.Struct("<QIIH")
+FRAME_HEADER = struct.Struct("<II")
+RECORD_HEADER = struct.Struct("<II")
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class ArchiveRecord(NamedTuple):
+    url: str
+    meta: dict
+    body: bytes
+
+
+class _IndexEntry(NamedTuple):
+    offset: int
+    size: int
+    raw_size: int
+    url: str
+
+
+def _parse_record(raw: bytes) -> ArchiveRecord:
+    url_len, meta_len = RECORD_HEADER.unpack_from(raw, 0)
+    start = RECORD_HEADER.size
+    url = raw[start : start + url_len].decode("utf-8")
+    meta = json.loads(raw[start + url_len : start + url_len + meta_len])
+    return ArchiveRecord(url, meta, raw[start + url_len + meta_len :])
+
+
+class ArchiveWriter:
+    def __init__(self, path: str | Path, level: int = 9, append: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.level = level
+        self._options = {
+            zstd.CompressionParameter.compression_level: level,
+            zstd.CompressionParameter.checksum_flag: 1,
+        }
+        self._index: List[_IndexEntry] = []
+        if append and self.path.exists() and self.path.stat().st_size >= HEADER.size:
+            with ArchiveReader(self.path) as reader:
+                if reader.version != VERSION:
+                    raise ArchiveError(f"{self.path}: cannot append to a version {reader.version} archive")
+                self._index = list(reader._index)
+                end = reader.records_end
+            # Drop the index (and any incomplete record) and go on after the
+            # last record.
+            self._file = open(self.path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(self.path, "wb")
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+            self._file.flush()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def pack(self, url: str, body: bytes, meta: Optional[dict] = None) -> Tuple[bytes, int]:
+        """The compressed frame of a record and its raw size. Touches no
+        writer state, so it can run in another thread."""
+        url_bytes = url.encode("utf-8")
+        meta_bytes = json.dumps(meta or {}, separators=(",", ":")).encode("utf-8")
+        raw = RECORD_HEADER.pack(len(url_bytes), len(meta_bytes)) + url_bytes + meta_bytes + body
+        return zstd.compress(raw, options=self._options), len(raw)
+
+    def write(self, url: str, frame: bytes, raw_size: int) -> None:
+        """Append a frame made by pack(). It is flushed at once, so it
+        survives a crash of this process."""
+        offset = self._file.tell() + FRAME_HEADER.size
+        self._file.write(FRAME_HEADER.pack(len(frame), raw_size) + frame)
+        self._file.flush()
+        self._index.append(_IndexEntry(offset, len(frame), raw_size, url))
+
+    def add(self, url: str, body: bytes, meta: Optional[dict] = None) -> None:
+        self.write(url, *self.pack(url, body, meta))
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        for entry in self._index:
+            url_bytes = entry.url.encode("utf-8")
+            self._file.write(INDEX_ENTRY.pack(entry.offset, entry.size, entry.raw_size, len(url_bytes)))
+            self._file.write(url_bytes)
+        self._file.write(FOOTER.pack(index_offset, len(self._index), MAGIC))
+        self._file.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ArchiveReader:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ArchiveError(f"{self.path} is empty")
+        if len(self._map) < HEADER.size or HEADER.unpack_from(self._map, 0)[0] != MAGIC:
+            self.close()
+            raise ArchiveError(f"{self.path} is not a page archive")
+        self.version = HEADER.unpack_from(self._map, 0)[1]
+        if self.version not in (1, VERSION):
+            self.close()
+            raise ArchiveError(f"{self.path}: unsupported archive version {self.version}")
+        self.complete = False
+        if len(self._map) >= HEADER.size + FOOTER.size:
+            index_offset, count, magic = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+            self.complete = magic == MAGIC and HEADER.size <= index_offset <= len(self._map) - FOOTER.size
+        if self.complete:
+            self._index = self._read_index(index_offset, count)
+            self.records_end = index_offset
+        elif self.version == VERSION:
+            self._index, self.records_end = self._scan_records()
+        else:
+            self.close()
+            raise ArchiveError(f"{self.path} is truncated")
+        self._by_url: Optional[Dict[str, int]] = None
+
+    def _read_index(self, offset: int, count: int) -> List[_IndexEntry]:
+        entries = []
+        for _ in range(count):
+            record_offset, size, raw_size, url_len = INDEX_ENTRY.unpack_from(self._map, offset)
+            offset += INDEX_ENTRY.size
+            url = self._map[offset : offset + url_len].decode("utf-8")
+            offset += url_len
+            entries.append(_IndexEntry(record_offset, size, raw_size, url))
+        return entries
+
+    def _scan_records(self) -> Tuple[List[_IndexEntry], int]:
+        """Index the records of an archive that has none, up to the first
+        one that is incomplete or does not decompress."""
+        entries = []
+        offset = HEADER.size
+        while offset + FRAME_HEADER.size <= len(self._map):
+            size, raw_size = FRAME_HEADER.unpack_from(self._map, offset)
+            start = offset + FRAME_HEADER.size
+            if size == 0 or start + size > len(self._map):
+                break
+            try:
+                with memoryview(self._map) as view:
+                    raw = zstd.decompress(view[start : start + size])
+                record = _parse_record(raw)
+            except (zstd.ZstdError, struct.error, UnicodeDecodeError, ValueError):
+                break
+            if len(raw) != raw_size:
+                break
+            entries.append(_IndexEntry(start, size, raw_size, record.url))
+            offset = start + size
+        return entries, offset
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def urls(self) -> List[str]:
+        return [entry.url for entry in self._index]
+
+    def __getitem__(self, position: int) -> ArchiveRecord:
+        entry = self._index[position]
+        with memoryview(self._map) as view:
+            raw = zstd.decompress(view[entry.offset : entry.offset + entry.size])
+        return _parse_record(raw)
+
+    def get(self, url: str) -> Optional[ArchiveRecord]:
+        if self._by_url is None:
+            self._by_url = {entry.url: position for position, entry in enumerate(self._index)}
+        position = self._by_url.get(url)
+        return self[position] if position is not None else None
+
+    def __iter__(self) -> Iterator[ArchiveRecord]:
+        for position in range(len(self._index)):
+            yield self[position]
+
+    def close(self) -> None:
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
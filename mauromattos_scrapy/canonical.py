@@ -0,0 +1,216 @@
+"""Canonical request URLs: the same page reached through tracking parameters,
+trailing-slash or slug variants is requested under one URL, so Scrapy's
+duplicate filter coalesces the variants onto a single download.
+
+``normalize_url`` applies generic and per-site rules. ``url_key`` identifies
+the page a normalized URL points to (for americanas, the ``-<id>/p`` product
+id). UrlCanonicalizer maps each key to one URL: a mapping learned from a past
+redirect or ``canonicalUrl``, else the first variant seen in the run.
+Redirects can be temporary, so mappings learned from them expire after
+``redirect_ttl`` seconds; the next request to the old URL checks again.
+"""
+
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Pattern, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Same pattern AmericanasComBrAmericanasProductItemPage.productId reads from og:url.
+AMERICANAS_PRODUCT_ID_RE = re.compile(r"-(\d+)/p/?$")
+
+TRACKING_PARAMS = frozenset(
+    {
+        "gclid",
+        "gclsrc",
+        "dclid",
+        "gbraid",
+        "wbraid",
+        "fbclid",
+        "msclkid",
+        "yclid",
+        "srsltid",
+        "mc_cid",
+        "mc_eid",
+        "_ga",
+        "_gl",
+    }
+)
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Chains of learned mappings (a redirect to a page that later declared another
+# canonical URL) are followed this far.
+MAX_HOPS = 5
+REDIRECT_TTL = 30 * 24 * 3600
+
+
+class SiteRule(NamedTuple):
+    tracking_params: FrozenSet[str] = frozenset()
+    # True adds a trailing slash to the path, False strips it, None keeps it.
+    trailing_slash: Optional[bool] = None
+    # Paths matching this are keyed by the first group instead of the URL.
+    id_re: Optional[Pattern] = None
+
+
+SITE_RULES: Dict[str, SiteRule] = {
+    "americanas.com.br": SiteRule(
+        tracking_params=frozenset({"chave", "opn", "epar"}),
+        trailing_slash=False,
+        id_re=AMERICANAS_PRODUCT_ID_RE,
+    ),
+    "macmagazine.com.br": SiteRule(trailing_slash=True),
+}
+
+
+def _domain(host: str) -> str:
+    return host[4:] if host.startswith("www.") else host
+
+
+def _is_tracking(name: str, rule: SiteRule) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name in rule.tracking_params or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme and host, drop default ports, fragments and tracking
+    parameters, and apply the site's trailing-slash rule. Other query
+    parameters keep their order."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+    host = (parts.hostname or "").lower()
+    rule = SITE_RULES.get(_domain(host), SiteRule())
+    netloc = host
+    if "@" in parts.netloc:
+        netloc = f"{parts.netloc.rsplit('@', 1)[0]}@{host}"
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{parts.port}"
+    path = parts.path or "/"
+    if path != "/" and rule.trailing_slash is False:
+        path = path.rstrip("/") or "/"
+    elif rule.trailing_slash and not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+        path += "/"
+    query = parts.query
+    if query:
+        params = parse_qsl(query, keep_blank_values=True)
+        kept = [(name, value) for name, value in params if not _is_tracking(name, rule)]
+        if len(kept) != len(params):
+            query = urlencode(kept)
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def url_key(normalized_url: str) -> str:
+    """The page a normalized URL points to: slug variants of a product share
+    the key of its id."""
+    parts = urlsplit(normalized_url)
+    domain = _domain(parts.hostname or "")
+    rule = SITE_RULES.get(domain)
+    if rule is not None and rule.id_re is not None:
+        match = rule.id_re.search(parts.path)
+        if match:
+            key = f"{domain}#{match.group(1)}"
+            return f"{key}?{parts.query}" if parts.query else key
+    return normalized_url
+
+
+class UrlCanonicalizer:
+    """Maps request URLs to one canonical URL per page. Mappings learned from
+    responses are kept in a SQLite file (when ``path`` is given) and used by
+    later runs, redirect ones for ``redirect_ttl`` seconds."""
+
+    def __init__(self, path: Optional[str | Path] = None, redirect_ttl: Optional[float] = REDIRECT_TTL):
+        self.learned: Dict[str, str] = {}
+        self.seen: Dict[str, str] = {}
+        self._pending: List[Tuple[str, str, str, float]] = []
+        self.db = None
+        if path:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(path))
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS canonical_urls (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            if redirect_ttl is not None:
+                self.db.execute(
+                    "DELETE FROM canonical_urls WHERE source = 'redirect' AND updated_at < ?",
+                    (time.time() - redirect_ttl,),
+                )
+            self.db.commit()
+            self.learned.update(self.db.execute("SELECT key, url FROM canonical_urls"))
+
+    def canonicalize(self, url: str, remember: bool = True) -> str:
+        """The canonical URL of ``url``. Unless ``remember`` is False, a page
+        with no learned mapping is kept under this variant for the rest of
+        the run (frontier seeds are deduplicated by the frontier instead, and
+        would otherwise all stay in memory)."""
+        normalized = normalize_url(url)
+        key = url_key(normalized)
+        learned = self.learned.get(key)
+        for _ in range(MAX_HOPS):
+            if learned is None:
+                break
+            key, normalized = url_key(learned), learned
+            learned = self.learned.get(key)
+            if learned == normalized:
+                break
+        if not remember:
+            return self.seen.get(key, normalized)
+        return self.seen.setdefault(key, normalized)
+
+    def learn(self, url: str, canonical_url: str, source: str) -> bool:
+        """Remember that ``url`` is the page at ``canonical_url`` (same site
+        only, and the same product id on sites keyed by id). Returns whether
+        this was new."""
+        target = normalize_url(canonical_url)
+        target_parts, source_parts = urlsplit(target), urlsplit(url)
+        domain = _domain(target_parts.hostname or "")
+        if domain != _domain(source_parts.hostname or ""):
+            return False
+        rule = SITE_RULES.get(domain)
+        if rule is not None and rule.id_re is not None:
+            # A product redirected to a listing, a search or another product
+            # (out of stock, replaced) is not the same page.
+            source_id, target_id = rule.id_re.search(source_parts.path), rule.id_re.search(target_parts.path)
+            if source_id is None or target_id is None or source_id.group(1) != target_id.group(1):
+                return False
+        if target_parts.path in ("", "/") and source_parts.path not in ("", "/"):
+            # Soft 404s and removed products often declare the home page.
+            return False
+        key = url_key(normalize_url(url))
+        if key == url_key(target) or self.learned.get(key) == target:
+            return False
+        self.learned[key] = target
+        self._pending.append((key, target, source, time.time()))
+        if len(self._pending) >= 100:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        if self.db is not None and self._pending:
+            with self.db:
+                self.db.executemany(
+                    "INSERT INTO canonical_urls (key, url, source, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET url = excluded.url, source = excluded.source, "
+                    "updated_at = excluded.updated_at",
+                    self._pending,
+                )
+        self._pending = []
+
+    def __len__(self) -> int:
+        return len(self.learned)
+
+    def close(self) -> None:
+        self.flush()
+        if self.db is not None:
+            self.db.close()
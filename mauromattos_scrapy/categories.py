@@ -0,0 +1,85 @@
+import html
+import json
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from mauromattos_scrapy.items import nested_get
+
+CategoryPath = Tuple[Tuple[Optional[str], Optional[str]], ...]
+
+# Breadcrumb names and links repeat on every product of a category, so
+# their unescaped and absolute forms are computed once per process.
+unescape = lru_cache(maxsize=65536)(html.unescape)
+
+
+@lru_cache(maxsize=65536)
+def _urljoin(base: str, url: str) -> str:
+    return urljoin(base, url)
+
+
+def join_url(base_url: str, url: str) -> str:
+    """``urljoin(base_url, url)``, cached. Absolute and root-relative links,
+    what breadcrumbs are made of, only depend on the scheme and host of the
+    page, so they are cached for the whole site rather than per page."""
+    if url.startswith("/") or "://" in url[:8]:
+        parts = urlsplit(base_url)
+        if parts.scheme and parts.netloc:
+            base_url = f"{parts.scheme}://{parts.netloc}/"
+    return _urljoin(base_url, url)
+
+
+def category_path(breadcrumbs) -> CategoryPath:
+    return tuple((nested_get(crumb, "name"), nested_get(crumb, "url")) for crumb in breadcrumbs)
+
+
+class CategoryTable:
+    """Category (breadcrumb) paths interned to small integer ids in an
+    SQLite table, so ids stay stable across runs and spiders."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE)")
+        self.db.commit()
+        self._ids: Dict[CategoryPath, int] = {}
+        for category_id, text in self.db.execute("SELECT id, path FROM categories"):
+            self._ids[self._decode(text)] = category_id
+
+    @staticmethod
+    def _encode(path: CategoryPath) -> str:
+        return json.dumps([{"name": name, "url": url} for name, url in path], ensure_ascii=False)
+
+    @staticmethod
+    def _decode(text: str) -> CategoryPath:
+        return tuple((crumb["name"], crumb["url"]) for crumb in json.loads(text))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def id_for(self, path: CategoryPath) -> Tuple[int, bool]:
+        """The id of ``path`` and whether it was added by this call."""
+        category_id = self._ids.get(path)
+        if category_id is not None:
+            return category_id, False
+        text = self._encode(path)
+        with self.db:
+            cursor = self.db.execute("INSERT OR IGNORE INTO categories (path) VALUES (?)", (text,))
+            (category_id,) = self.db.execute("SELECT id FROM categories WHERE path = ?", (text,)).fetchone()
+        self._ids[path] = category_id
+        return category_id, cursor.rowcount > 0
+
+    def breadcrumbs(self, category_id: int) -> Optional[List[Dict[str, Optional[str]]]]:
+        row = self.db.execute("SELECT path FROM categories WHERE id = ?", (category_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __iter__(self) -> Iterator[Tuple[int, List[Dict[str, Optional[str]]]]]:
+        for category_id, text in self.db.execute("SELECT id, path FROM categories ORDER BY id"):
+            yield category_id, json.loads(text)
+
+    def close(self) -> None:
+        self.db.close()
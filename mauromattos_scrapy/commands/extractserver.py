@@ -0,0 +1,44 @@
+import sys
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from mauromattos_scrapy.extraction_server import ExtractionServer, UnixExtractionServer, warm_up
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Serve the page objects as a resident extraction service"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+        parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+        parser.add_argument("--socket", metavar="PATH", default=None, help="listen on a Unix socket instead")
+        parser.add_argument(
+            "--no-warmup",
+            action="store_true",
+            help="skip running each page object over its fixtures before serving",
+        )
+
+    def run(self, args, opts):
+        if args:
+            raise UsageError()
+        if not opts.no_warmup:
+            print(f"warmed up {warm_up()} page objects", file=sys.stderr)
+        if opts.socket:
+            server = UnixExtractionServer(opts.socket)
+        else:
+            server = ExtractionServer(opts.host, opts.port)
+        print(f"extraction server listening on {server.address}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
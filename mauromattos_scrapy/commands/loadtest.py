@@ -0,0 +1,132 @@
+import time
+
+from scrapy.commands import BaseRunSpiderCommand
+from scrapy.exceptions import UsageError
+from w3lib.url import add_or_replace_parameter
+
+from mauromattos_scrapy.mockapi import MockZyteApiServer
+from mauromattos_scrapy.resp import LocalRespServer
+
+
+class Command(BaseRunSpiderCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] [<spider> ...]"
+
+    def short_desc(self):
+        return "Run spiders one at a time against a local mock Zyte API and report throughput"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--requests", type=int, default=100, help="requests per spider (default: 100)")
+        parser.add_argument("--latency", type=float, default=0.2, help="mock API latency in seconds (default: 0.2)")
+        parser.add_argument("--jitter", type=float, default=0.05, help="uniform latency jitter in seconds")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 520 responses (0-1)")
+        parser.add_argument("--rate-limit", type=float, default=0.0, help="429 above this many req/s (0: off)")
+        parser.add_argument("--port", type=int, default=0, help="mock API port (default: random)")
+        parser.add_argument("--seed", type=int, default=None, help="random seed for errors and jitter")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="crawlers per spider sharing one frontier through a local Redis stand-in (default: 1)",
+        )
+        parser.add_argument(
+            "--shared-rate-limit",
+            type=int,
+            default=0,
+            help="with --workers, requests per second per domain across all workers (0: off)",
+        )
+
+    def process_options(self, args, opts):
+        super().process_options(args, opts)
+        if opts.requests < 1:
+            raise UsageError("--requests must be at least 1")
+        if not 0 <= opts.error_rate <= 1:
+            raise UsageError("--error-rate must be between 0 and 1")
+        if opts.workers < 1:
+            raise UsageError("--workers must be at least 1")
+        self.server = MockZyteApiServer(
+            port=opts.port,
+            latency=opts.latency,
+            jitter=opts.jitter,
+            error_rate=opts.error_rate,
+            rate_limit=opts.rate_limit,
+            seed=opts.seed,
+        )
+        self.settings.set("ZYTE_API_URL", self.server.api_url, priority="cmdline")
+        self.settings.set("ZYTE_API_KEY", "loadtest", priority="cmdline")
+        self.shared_state = None
+        if opts.workers > 1:
+            self.shared_state = LocalRespServer()
+            self.settings.set("SHARED_STATE_URL", self.shared_state.url, priority="cmdline")
+            self.settings.set("SHARED_RATE_LIMIT", opts.shared_rate_limit, priority="cmdline")
+
+    def run(self, args, opts):
+        spider_loader = self.crawler_process.spider_loader
+        names = args or spider_loader.list()
+        groups = []
+        for name in names:
+            spidercls = spider_loader.load(name)
+            seeds = getattr(spidercls, "default_start_urls", None)
+            if not seeds:
+                raise UsageError(f"spider {name} has no default_start_urls to load test with")
+            urls = [
+                add_or_replace_parameter(seeds[i % len(seeds)], "loadtest", str(i))
+                for i in range(opts.requests)
+            ]
+            spargs = {**opts.spargs, "urls": ",".join(urls)}
+            if self.shared_state is not None:
+                spargs["frontier"] = self.shared_state.url
+            groups.append([(self._create_crawler(name), spargs) for _ in range(opts.workers)])
+        crawlers = [crawler for group in groups for crawler, _ in group]
+        self._crawl_groups(groups)
+
+        self.server.start()
+        if self.shared_state is not None:
+            self.shared_state.start()
+        started = time.monotonic()
+        try:
+            self.crawler_process.start()
+        finally:
+            self.server.stop()
+            if self.shared_state is not None:
+                self.shared_state.stop()
+        wall_time = time.monotonic() - started
+
+        print(f"\n{'spider':<28}{'items':>8}{'errors':>8}{'retries':>9}{'seconds':>10}{'items/s':>10}")
+        for crawler in crawlers:
+            stats = crawler.stats.get_stats()
+            items = stats.get("item_scraped_count", 0)
+            elapsed = stats.get("elapsed_time_seconds") or 0.0
+            errors = stats.get("log_count/ERROR", 0)
+            retries = stats.get("retry/count", 0) + stats.get("scrapy-zyte-api/attempts", 0) - stats.get(
+                "scrapy-zyte-api/processed", 0
+            )
+            rate = items / elapsed if elapsed else 0.0
+            print(f"{crawler.spidercls.name:<28}{items:>8}{errors:>8}{retries:>9}{elapsed:>10.2f}{rate:>10.2f}")
+        counts = dict(sorted(self.server.counts.items()))
+        print(f"\nmock API: {counts}")
+        print(f"wall time: {wall_time:.2f}s")
+        if self.crawler_process.bootstrap_failed:
+            self.exitcode = 1
+
+    def _crawl_groups(self, groups):
+        # Spiders run one after another, so each has the mock API to itself
+        # and their rates can be compared; the workers of one spider run
+        # together. The next spider is started from the done callbacks of
+        # the previous one's crawls, which run before the process notices
+        # that no crawl is left and stops.
+        group = groups.pop(0)
+        pending = set()
+
+        def crawl_next(task):
+            pending.discard(task)
+            if not pending and groups:
+                self._crawl_groups(groups)
+
+        for crawler, spargs in group:
+            task = self.crawler_process.crawl(crawler, **spargs)
+            pending.add(task)
+            task.add_done_callback(crawl_next)
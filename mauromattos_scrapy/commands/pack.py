@@ -0,0 +1,49 @@
+import json
+from pathlib import Path
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from mauromattos_scrapy.archive import ArchiveWriter
+from mauromattos_scrapy.registry import FIXTURES_DIR
+
+BODY_PATH = Path("inputs") / "HttpResponse-body.html"
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] <archive>"
+
+    def short_desc(self):
+        return "Pack web-poet fixture bodies into a compressed page archive"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--fixtures", default=str(FIXTURES_DIR), help="fixtures directory to pack")
+        parser.add_argument("--level", type=int, default=19, help="zstd compression level (default: 19)")
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError()
+        fixtures_dir = Path(opts.fixtures)
+        raw_size = 0
+        with ArchiveWriter(args[0], level=opts.level) as writer:
+            for body_path in sorted(fixtures_dir.glob(f"*/*/{BODY_PATH}")):
+                test_dir = body_path.parent.parent
+                page_cls_path = test_dir.parent.name
+                perf_path = test_dir / "perf.json"
+                url = None
+                if perf_path.exists():
+                    url = json.loads(perf_path.read_text(encoding="utf-8")).get("url")
+                body = body_path.read_bytes()
+                raw_size += len(body)
+                writer.add(
+                    url or f"fixture:{page_cls_path}/{test_dir.name}",
+                    body,
+                    {"page_cls": page_cls_path, "fixture": test_dir.name},
+                )
+            count = len(writer)
+        packed_size = Path(args[0]).stat().st_size
+        print(f"packed {count} pages: {raw_size / 1024:.0f} KiB -> {packed_size / 1024:.0f} KiB")
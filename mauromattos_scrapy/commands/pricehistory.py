@@ -0,0 +1,76 @@
+import csv
+import sys
+import time
+from datetime import datetime, timezone
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from mauromattos_scrapy.price_history import PriceHistory, StoreLocked
+from mauromattos_scrapy.state import parse_datetime
+
+
+def _iso(ts) -> str:
+    return datetime.fromtimestamp(int(ts), timezone.utc).isoformat()
+
+
+def _value(value) -> str:
+    if value is None or value != value:  # None or NaN
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] <directory>"
+
+    def short_desc(self):
+        return "Query a price history store (PRICE_HISTORY_DIR) as CSV"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--sku", default=None, help="every observation of this SKU")
+        parser.add_argument(
+            "--changes-since",
+            metavar="DATETIME",
+            default=None,
+            help="price and availability changes observed at or after this ISO date/time",
+        )
+        parser.add_argument("--compact", action="store_true", help="merge the store into a single chunk")
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError()
+        history = PriceHistory(args[0])
+        if opts.compact:
+            started = time.perf_counter()
+            try:
+                merged = history.compact()
+            except StoreLocked as exc:
+                raise UsageError(str(exc), print_help=False) from None
+            finally:
+                history.close()
+            elapsed = time.perf_counter() - started
+            print(f"merged {merged} chunks ({len(history)} observations) in {elapsed:.1f}s", file=sys.stderr)
+            return
+        writer = csv.writer(sys.stdout)
+        if opts.sku is not None or opts.changes_since is not None:
+            if opts.sku is not None:
+                rows = history.history(opts.sku)
+            else:
+                since = parse_datetime(opts.changes_since)
+                if since is None:
+                    raise UsageError(f"invalid --changes-since: {opts.changes_since!r}")
+                rows = history.changes(since.timestamp())
+            writer.writerow(["sku", "observed_at", "old_price", "new_price", "old_availability", "new_availability"])
+            for sku, ts, *values in zip(*rows):
+                writer.writerow([sku, _iso(ts), *map(_value, values)])
+            return
+        summary = history.summary()
+        writer.writerow(summary._fields)
+        for sku, observations, first_seen, last_seen, *values in zip(*summary):
+            writer.writerow([sku, observations, _iso(first_seen), _iso(last_seen), *map(_value, values)])
@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import time
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.exporters import JsonLinesItemExporter
+
+from mauromattos_scrapy.alloc_profile import DEFAULT_FRAMES, AllocationReport, profile_page
+from mauromattos_scrapy.archive import ArchiveReader
+from mauromattos_scrapy.extraction import extract, resolve_page_cls
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] <archive>"
+
+    def short_desc(self):
+        return "Run the page objects over the pages stored in an archive"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("-o", "--output", default=None, help="JSON lines output file (default: stdout)")
+        parser.add_argument("--url", action="append", default=[], help="only this URL (may be repeated)")
+        parser.add_argument(
+            "--alloc-profile",
+            metavar="FILE",
+            default=None,
+            help="profile allocations per page object field and write folded stacks to FILE",
+        )
+        parser.add_argument(
+            "--alloc-frames",
+            type=int,
+            default=DEFAULT_FRAMES,
+            help=f"traceback depth kept by the allocation profile (default: {DEFAULT_FRAMES})",
+        )
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError()
+        report = AllocationReport() if opts.alloc_profile else None
+        output = open(opts.output, "wb") if opts.output else sys.stdout.buffer
+        try:
+            with ArchiveReader(args[0]) as archive:
+                asyncio.run(self._reextract(archive, opts.url, JsonLinesItemExporter(output), report, opts.alloc_frames))
+        finally:
+            if opts.output:
+                output.close()
+        if report is not None:
+            report.write_folded(opts.alloc_profile)
+            print("\n".join(report.summary()), file=sys.stderr)
+            print(f"folded allocation stacks written to {opts.alloc_profile}", file=sys.stderr)
+
+    async def _reextract(self, archive, urls, exporter, report=None, frames=DEFAULT_FRAMES):
+        records = (archive.get(url) for url in urls) if urls else iter(archive)
+        items = skipped = errors = 0
+        started = time.perf_counter()
+        for record in records:
+            if record is None:
+                skipped += 1
+                continue
+            try:
+                page_cls = resolve_page_cls(record.url, record.meta.get("page_cls"))
+                encoding = record.meta.get("encoding", "utf-8")
+                item = await extract(record.url, record.body, page_cls, encoding)
+                if report is not None and item is not None:
+                    report.add(await profile_page(page_cls, record.url, record.body, encoding, frames))
+            except Exception as exc:
+                errors += 1
+                print(f"error extracting {record.url}: {exc!r}", file=sys.stderr)
+                continue
+            if item is None:
+                skipped += 1
+                continue
+            exporter.export_item(item)
+            items += 1
+        elapsed = time.perf_counter() - started
+        rate = items / elapsed if elapsed else 0.0
+        print(f"{items} items, {skipped} skipped, {errors} errors in {elapsed:.2f}s ({rate:.1f} pages/s)", file=sys.stderr)
+        if errors:
+            self.exitcode = 1
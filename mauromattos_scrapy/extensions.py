@@ -0,0 +1,199 @@
+# Define here your extensions
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import TextResponse
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+
+from mauromattos_scrapy import metrics
+from mauromattos_scrapy.archive import ArchiveWriter
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = metrics.REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def _start_http_server(host: str, port: int) -> None:
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
+
+
+def _scheduler_len(crawler) -> int:
+    engine = crawler.engine
+    if engine is None:
+        return 0
+    scheduler = getattr(engine, "scheduler", None)
+    if scheduler is None and getattr(engine, "slot", None) is not None:
+        scheduler = engine.slot.scheduler
+    try:
+        return len(scheduler) if scheduler is not None else 0
+    except TypeError:
+        return 0
+
+
+class MetricsExporter:
+    """Serves the metrics registry over HTTP and/or writes it to a
+    node_exporter textfile every METRICS_INTERVAL seconds."""
+
+    def __init__(self, crawler, port: int, host: str, textfile: str | None, interval: float):
+        self.crawler = crawler
+        self.port = port
+        self.host = host
+        self.textfile = Path(textfile) if textfile else None
+        self.interval = interval
+        self.task = None
+        self._last = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("METRICS_ENABLED"):
+            raise NotConfigured
+        port = settings.getint("METRICS_PORT")
+        textfile = settings.get("METRICS_TEXTFILE")
+        if not port and not textfile:
+            raise NotConfigured
+        o = cls(
+            crawler,
+            port=port,
+            host=settings.get("METRICS_HOST", "127.0.0.1"),
+            textfile=textfile,
+            interval=settings.getfloat("METRICS_INTERVAL", 10.0),
+        )
+        crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    def spider_opened(self, spider):
+        if self.port:
+            _start_http_server(self.host, self.port)
+            spider.logger.info("Metrics available at http://%s:%d/metrics", self.host, self.port)
+        self.task = LoopingCall(self.update, spider)
+        self.task.start(self.interval, now=True)
+
+    def update(self, spider):
+        stats = self.crawler.stats
+        requests = stats.get_value("downloader/request_count", 0)
+        items = stats.get_value("item_scraped_count", 0)
+        now = time.monotonic()
+        if self._last is not None:
+            last_time, last_requests, last_items = self._last
+            elapsed = now - last_time
+            if elapsed > 0:
+                metrics.REQUEST_RATE.set((requests - last_requests) / elapsed, spider.name)
+                metrics.ITEM_RATE.set((items - last_items) / elapsed, spider.name)
+        self._last = (now, requests, items)
+        metrics.QUEUE_DEPTH.set(_scheduler_len(self.crawler), spider.name)
+        downloader = getattr(self.crawler.engine, "downloader", None)
+        metrics.IN_FLIGHT.set(len(downloader.active) if downloader is not None else 0, spider.name)
+        if self.textfile:
+            self.write_textfile()
+
+    def write_textfile(self):
+        self.textfile.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.textfile.with_name(self.textfile.name + ".tmp")
+        tmp_path.write_text(metrics.REGISTRY.render(), encoding="utf-8")
+        tmp_path.replace(self.textfile)
+
+    def spider_closed(self, spider):
+        if self.task and self.task.running:
+            self.task.stop()
+        metrics.REQUEST_RATE.set(0, spider.name)
+        metrics.ITEM_RATE.set(0, spider.name)
+        metrics.QUEUE_DEPTH.set(0, spider.name)
+        metrics.IN_FLIGHT.set(0, spider.name)
+        if self.textfile:
+            self.write_textfile()
+
+
+class PageArchiveExtension:
+    """Stores every successful page response of the crawl in a packed
+    page archive (PAGE_ARCHIVE_FILE) for offline re-extraction with
+    ``scrapy reextract``. ``{spider}`` and ``{time}`` in the file name are
+    replaced by the spider name and the UTC start time; an existing archive
+    is appended to. Pages are compressed in the reactor's thread pool and
+    written as they come, so an interrupted crawl keeps its archive up to
+    the last page written; the index is added when the spider closes."""
+
+    def __init__(self, path: str, level: int):
+        self.path = path
+        self.level = level
+        self.writer = None
+        self.archived_before = 0
+        self.pending = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("PAGE_ARCHIVE_FILE")
+        if not path:
+            raise NotConfigured
+        o = cls(path, crawler.settings.getint("PAGE_ARCHIVE_LEVEL", 9))
+        crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(o.response_received, signal=signals.response_received)
+        crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    def spider_opened(self, spider):
+        started = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M-%S")
+        path = self.path.format(spider=spider.name, time=started)
+        self.writer = ArchiveWriter(path, level=self.level, append=True)
+        self.archived_before = len(self.writer)
+
+    def response_received(self, response, request, spider):
+        if self.writer is None or response.status != 200 or response.url.endswith("/robots.txt"):
+            return
+        # Zyte API httpResponseBody responses without headers are plain
+        # Response objects; the page objects decode those as UTF-8 too.
+        meta = {
+            "spider": spider.name,
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+            "encoding": response.encoding if isinstance(response, TextResponse) else "utf-8",
+        }
+        d = deferToThread(self.writer.pack, response.url, response.body, meta)
+        d.addCallback(lambda packed: self.writer.write(response.url, *packed))
+        d.addErrback(lambda failure: spider.logger.error("Could not archive %s: %s", response.url, failure.value))
+        self.pending.add(d)
+        d.addBoth(lambda _: self.pending.discard(d))
+
+    async def spider_closed(self, spider):
+        if self.writer is None:
+            return
+        await maybe_deferred_to_future(defer.DeferredList(list(self.pending)))
+        archived = len(self.writer) - self.archived_before
+        spider.logger.info("Archived %d pages to %s (%d in total)", archived, self.writer.path, len(self.writer))
+        self.writer.close()
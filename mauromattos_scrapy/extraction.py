@@ -0,0 +1,31 @@
+from typing import Optional, Type
+
+from web_poet import HttpResponse
+
+from mauromattos_scrapy.registry import page_cls_by_path, page_cls_for_url
+
+
+def build_page(page_cls: Type, url: str, body: bytes, encoding: Optional[str] = "utf-8"):
+    return page_cls(response=HttpResponse(url, body=body, encoding=encoding))
+
+
+def resolve_page_cls(url: str, page_cls_path: Optional[str] = None) -> Optional[Type]:
+    """The page object named by ``page_cls_path``, else the one whose
+    @handle_urls rule matches ``url``. Only page objects with a @handle_urls
+    rule can be named: the name may come from a client, and is never
+    imported."""
+    if page_cls_path:
+        page_cls = page_cls_by_path(page_cls_path)
+        if page_cls is None:
+            raise LookupError(f"unknown page object: {page_cls_path}")
+        return page_cls
+    return page_cls_for_url(url)
+
+
+async def extract(url: str, body: bytes, page_cls: Optional[Type] = None, encoding: Optional[str] = "utf-8"):
+    """Run a stored response through its page object, outside Scrapy.
+    Returns None when no page object handles ``url``."""
+    page_cls = page_cls or page_cls_for_url(url)
+    if page_cls is None:
+        return None
+    return await build_page(page_cls, url, body, encoding).to_item()
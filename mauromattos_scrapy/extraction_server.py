@@ -0,0 +1,183 @@
+"""Resident extraction service: page objects over HTTP or a Unix socket.
+
+``POST /extract`` takes a batch of stored responses::
+
+    {"requests": [{"url": "https://...", "html": "<html>..."},
+                  {"url": "https://...", "body": "<base64>", "encoding": "latin-1",
+                   "pageObject": "mauromattos_scrapy.pages....Page"}]}
+
+Each entry is routed through the ``@handle_urls`` registry unless it names
+its page object, and the reply holds one result per request, in order, with
+the item (or ``error``) and the extraction time::
+
+    {"results": [{"url": ..., "pageObject": ..., "item": {...}, "ms": 3.1}], "ms": 7.9}
+
+``GET /health`` lists the page objects being served.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from itemadapter import ItemAdapter
+
+from mauromattos_scrapy.extraction import extract, resolve_page_cls
+from mauromattos_scrapy.registry import fixture_bodies, page_cls_path, page_rules
+
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up() -> int:
+    """Import every page object and run it once over its first fixture, so
+    lazy imports and caches are paid before the first real request."""
+    warmed = 0
+    for rule in page_rules():
+        bodies = fixture_bodies(rule.use)
+        if not bodies:
+            continue
+        url = f"https://{rule.for_patterns.include[0]}/"
+        try:
+            asyncio.run(extract(url, bodies[0].read_bytes(), rule.use))
+        except Exception:
+            logger.exception("Warm-up of %s failed", page_cls_path(rule.use))
+            continue
+        warmed += 1
+    return warmed
+
+
+async def _extract_one(request: Dict[str, Any]) -> Dict[str, Any]:
+    url = request.get("url")
+    result: Dict[str, Any] = {"url": url}
+    started = time.perf_counter()
+    try:
+        if not isinstance(url, str) or not url:
+            raise ValueError("missing url")
+        if "html" in request:
+            body = request["html"].encode("utf-8")
+            encoding = "utf-8"
+        elif "body" in request:
+            body = base64.b64decode(request["body"])
+            encoding = request.get("encoding") or "utf-8"
+        else:
+            raise ValueError("missing html or body")
+        page_cls = resolve_page_cls(url, request.get("pageObject"))
+        if page_cls is None:
+            raise LookupError("no page object handles this URL")
+        result["pageObject"] = page_cls_path(page_cls)
+        result["item"] = ItemAdapter(await extract(url, body, page_cls, encoding)).asdict()
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+async def _extract_batch(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [await _extract_one(request) for request in requests]
+
+
+def extract_batch(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return asyncio.run(_extract_batch(requests))
+
+
+class _ExtractionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        # Unix socket peers have no address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, title: str) -> None:
+        self._send_json(status, {"status": status, "title": title})
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/health":
+            self._send_error(404, "Unknown endpoint")
+            return
+        self._send_json(200, {"status": "ok", "pageObjects": [page_cls_path(rule.use) for rule in page_rules()]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            self._send_error(413, f"Request larger than {MAX_REQUEST_BYTES} bytes")
+            return
+        raw = self.rfile.read(length)
+        if self.path.rstrip("/") != "/extract":
+            self._send_error(404, "Unknown endpoint")
+            return
+        try:
+            query = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_error(400, "Invalid JSON")
+            return
+        requests = query.get("requests") if isinstance(query, dict) else None
+        if not isinstance(requests, list) or not all(isinstance(request, dict) for request in requests):
+            self._send_error(400, "Expected {\"requests\": [{\"url\": ..., \"html\": ...}, ...]}")
+            return
+        started = time.perf_counter()
+        results = extract_batch(requests)
+        self._send_json(200, {"results": results, "ms": round((time.perf_counter() - started) * 1000, 3)})
+
+
+class _ServerMixin:
+    _thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, name="extraction-server", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class ExtractionServer(_ServerMixin, ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765):
+        super().__init__((host, port), _ExtractionHandler)
+
+    @property
+    def address(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+
+class UnixExtractionServer(_ServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _ExtractionHandler)
+
+    @property
+    def address(self) -> str:
+        return f"unix:{self.server_address}"
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
@@ -0,0 +1,142 @@
+"""Fallback chains for fields that try several extraction strategies.
+
+A chain keeps the strategies in their priority order. What it learns, per
+crawl, page object and field, is which strategies keep missing: after
+``skip_after`` consecutive misses a strategy is tried only after the others,
+except on every ``probe_every``-th page, where it is tried in its place again
+and, if it hits, put back in the chain. Once a layout change has made the
+first strategies useless, the common case costs a single lookup again, and
+the drift shows up in the ``page_field_strategy_total`` metric (outcome
+``hit``, ``miss`` or ``skipped`` per strategy).
+
+Skipped strategies are still tried before a chain gives up, so a field is
+never lost to what other pages looked like. The learned state is a
+FallbackState that scrapy-poet injects once per crawler (enable
+FallbackStateProvider in ``SCRAPY_POET_PROVIDERS``); pages built without one,
+like the fixtures and the extraction server's, try every strategy in order
+and learn nothing.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from scrapy_poet.page_input_providers import PageObjectInputProvider
+
+from mauromattos_scrapy import metrics
+
+SKIP_AFTER = 50
+PROBE_EVERY = 100
+
+STRATEGY_OUTCOMES = metrics.REGISTRY.counter(
+    "page_field_strategy_total",
+    "Fallback strategy outcomes per page object field.",
+    ("page", "field", "strategy", "outcome"),
+)
+
+
+class _StrategyStats:
+    __slots__ = ("hits", "misses", "skips", "streak")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.skips = 0
+        self.streak = 0
+
+
+class FallbackState:
+    """Strategy outcomes learned by the fallback chains during one crawl."""
+
+    def __init__(self):
+        self.chains: Dict[Tuple[str, str], List[_StrategyStats]] = {}
+
+    def for_chain(self, chain: "FallbackChain") -> List[_StrategyStats]:
+        key = (chain.page, chain.field)
+        strategies = self.chains.get(key)
+        if strategies is None:
+            strategies = self.chains[key] = [_StrategyStats() for _ in chain.strategies]
+        return strategies
+
+    def stats(self, chain: "FallbackChain") -> List[Dict[str, Any]]:
+        return [
+            {
+                "strategy": name,
+                "hits": stats.hits,
+                "misses": stats.misses,
+                "skips": stats.skips,
+                "skipping": stats.streak >= chain.skip_after,
+            }
+            for (name, _), stats in zip(chain.strategies, self.for_chain(chain))
+        ]
+
+
+class FallbackStateProvider(PageObjectInputProvider):
+    """Gives every page object of a crawler the same FallbackState."""
+
+    provided_classes = {FallbackState}
+
+    def __init__(self, injector):
+        super().__init__(injector)
+        self.state = FallbackState()
+
+    def __call__(self, to_provide: Set[Callable]):
+        return [self.state]
+
+
+class FallbackChain:
+    def __init__(
+        self,
+        page: str,
+        field: str,
+        strategies: Sequence[Tuple[str, Callable[[Any], Any]]],
+        skip_after: int = SKIP_AFTER,
+        probe_every: int = PROBE_EVERY,
+    ):
+        self.page = page
+        self.field = field
+        self.strategies = list(strategies)
+        self.skip_after = skip_after
+        self.probe_every = probe_every
+
+    def _try(self, index: int, page_obj, stats: Optional[_StrategyStats]) -> Any:
+        name, func = self.strategies[index]
+        value = func(page_obj)
+        if value:
+            if stats is not None:
+                stats.hits += 1
+                stats.streak = 0
+            STRATEGY_OUTCOMES.inc(self.page, self.field, name, "hit")
+            return value
+        if stats is not None:
+            stats.misses += 1
+            stats.streak += 1
+        STRATEGY_OUTCOMES.inc(self.page, self.field, name, "miss")
+        return None
+
+    def __call__(self, page_obj) -> Any:
+        """The first truthy value returned by a strategy, else None."""
+        state: Optional[FallbackState] = getattr(page_obj, "fallback_state", None)
+        if state is None:
+            for index in range(len(self.strategies)):
+                value = self._try(index, page_obj, None)
+                if value:
+                    return value
+            return None
+        learned = state.for_chain(self)
+        skipped = []
+        for index, stats in enumerate(learned):
+            if stats.streak >= self.skip_after:
+                stats.skips += 1
+                if stats.skips % self.probe_every:
+                    STRATEGY_OUTCOMES.inc(self.page, self.field, self.strategies[index][0], "skipped")
+                    skipped.append(index)
+                    continue
+            value = self._try(index, page_obj, stats)
+            if value:
+                return value
+        # Every strategy tried so far missed: the skipped ones get their turn,
+        # in priority order, before the field comes back empty.
+        for index in skipped:
+            value = self._try(index, page_obj, learned[index])
+            if value:
+                return value
+        return None
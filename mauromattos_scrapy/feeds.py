@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from lxml import etree
+
+from mauromattos_scrapy.sitemaps import local_name
+from mauromattos_scrapy.state import parse_datetime
+
+
+class FeedEntry(NamedTuple):
+    link: str
+    published: Optional[datetime]
+
+
+def _parse_feed_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    value = value.strip()
+    parsed = parse_datetime(value)
+    if parsed is not None:
+        return parsed
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _rss_entry(elem) -> Optional[FeedEntry]:
+    link = None
+    published = None
+    for child in elem:
+        name = local_name(child.tag)
+        if name == "link" and child.text and not link:
+            link = child.text.strip()
+        elif name in ("pubDate", "date") and child.text and published is None:
+            published = _parse_feed_date(child.text)
+    return FeedEntry(link=link, published=published) if link else None
+
+
+def _atom_entry(elem) -> Optional[FeedEntry]:
+    link = None
+    published = None
+    updated = None
+    for child in elem:
+        name = local_name(child.tag)
+        if name == "link" and child.get("rel", "alternate") == "alternate" and not link:
+            link = (child.get("href") or "").strip() or None
+        elif name == "published":
+            published = _parse_feed_date(child.text)
+        elif name == "updated":
+            updated = _parse_feed_date(child.text)
+    return FeedEntry(link=link, published=published or updated) if link else None
+
+
+def advance_mark(
+    mark: Optional[datetime],
+    done: Iterable[Optional[datetime]],
+    failed: Iterable[Optional[datetime]],
+) -> Optional[datetime]:
+    """Return the new high-water mark after a poll.
+
+    The mark moves to the newest crawled post, but never past the oldest
+    post that failed, so the next poll picks that post up again.
+    """
+    failed_dates = [published for published in failed if published is not None]
+    oldest_failed = min(failed_dates) if failed_dates else None
+    for published in done:
+        if published is None or (oldest_failed is not None and published >= oldest_failed):
+            continue
+        if mark is None or published > mark:
+            mark = published
+    return mark
+
+
+def iter_feed(body: bytes) -> Iterator[FeedEntry]:
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    root = etree.fromstring(body, parser=parser)
+    if root is None:
+        return
+    for elem in root.iter():
+        name = local_name(elem.tag)
+        if name == "item":
+            entry = _rss_entry(elem)
+        elif name == "entry":
+            entry = _atom_entry(elem)
+        else:
+            continue
+        if entry is not None:
+            yield entry
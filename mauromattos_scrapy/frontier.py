@@ -0,0 +1,529 @@
+import math
+import sqlite3
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import scrapy
+from scrapy import signals
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer
+from twisted.internet.task import LoopingCall, deferLater
+from twisted.internet.threads import deferToThread
+
+from mauromattos_scrapy.resp import RespClient
+
+PRIORITY_DEFAULT = 0
+PRIORITY_LISTING = 10
+PRIORITY_RECRAWL = 20
+
+# Seconds a worker of a shared frontier may hold a URL before other workers
+# assume it died and put the URL back in the queue.
+LEASE_SECONDS = 600
+
+PENDING = 0
+IN_PROGRESS = 1
+DONE = 2
+FAILED = 3
+
+
+class FrontierEntry(NamedTuple):
+    url: str
+    domain: str
+    priority: int
+
+
+def _domain(url: str) -> str:
+    host = urlparse(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def iter_url_lines(path: str | Path) -> Iterator[str]:
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+class SqliteFrontier:
+    """Persistent URL frontier: one SQLite table split by domain, ordered by
+    priority then due time, with leases so a crash re-queues in-flight URLs."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                domain TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                due_at REAL NOT NULL DEFAULT 0,
+                state INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS frontier_queue
+                ON frontier (state, domain, priority DESC, due_at);
+            """
+        )
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def push_many(
+        self,
+        urls: Iterable[str | Tuple[str, int]],
+        priority: int = PRIORITY_DEFAULT,
+        due_at: float = 0.0,
+        requeue: bool = False,
+        batch_size: int = 10000,
+    ) -> int:
+        """Add URLs (or ``(url, priority)`` pairs). Known URLs are left alone
+        unless ``requeue`` is set, which makes finished ones pending again."""
+        if requeue:
+            sql = (
+                "INSERT INTO frontier (url, domain, priority, due_at, state, updated_at) VALUES (?, ?, ?, ?, 0, ?) "
+                "ON CONFLICT(url) DO UPDATE SET priority = MAX(priority, excluded.priority), "
+                "due_at = excluded.due_at, state = CASE WHEN state = 1 THEN 1 ELSE 0 END, "
+                "updated_at = excluded.updated_at"
+            )
+        else:
+            sql = (
+                "INSERT OR IGNORE INTO frontier (url, domain, priority, due_at, state, updated_at) "
+                "VALUES (?, ?, ?, ?, 0, ?)"
+            )
+        now = time.time()
+        added = 0
+        batch: List[tuple] = []
+        for value in urls:
+            url, url_priority = value if isinstance(value, tuple) else (value, priority)
+            batch.append((url, _domain(url), url_priority, due_at, now))
+            if len(batch) >= batch_size:
+                added += self._write(sql, batch)
+                batch = []
+        if batch:
+            added += self._write(sql, batch)
+        return added
+
+    def _write(self, sql: str, rows: List[tuple]) -> int:
+        with self.db:
+            cursor = self.db.executemany(sql, rows)
+        return cursor.rowcount
+
+    def pop_batch(self, size: int, now: Optional[float] = None) -> List[FrontierEntry]:
+        """Lease up to ``size`` due URLs, spread evenly over domains."""
+        now = time.time() if now is None else now
+        with self.db:
+            domains = [
+                row[0]
+                for row in self.db.execute(
+                    "SELECT DISTINCT domain FROM frontier WHERE state = ? AND due_at <= ?", (PENDING, now)
+                )
+            ]
+            if not domains:
+                return []
+            per_domain = max(1, math.ceil(size / len(domains)))
+            entries: List[FrontierEntry] = []
+            for domain in domains:
+                rows = self.db.execute(
+                    "SELECT url, domain, priority FROM frontier WHERE state = ? AND domain = ? AND due_at <= ? "
+                    "ORDER BY priority DESC, due_at LIMIT ?",
+                    (PENDING, domain, now, per_domain),
+                ).fetchall()
+                entries.extend(FrontierEntry(*row) for row in rows)
+            entries.sort(key=lambda entry: -entry.priority)
+            entries = entries[:size]
+            self.db.executemany(
+                "UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?",
+                [(IN_PROGRESS, now, entry.url) for entry in entries],
+            )
+        return entries
+
+    def mark(self, urls: Iterable[str], state: int) -> None:
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?",
+                [(state, now, url) for url in urls],
+            )
+
+    def recover(self) -> int:
+        """Return URLs leased by a previous, interrupted run to the queue."""
+        with self.db:
+            cursor = self.db.execute("UPDATE frontier SET state = ? WHERE state = ?", (PENDING, IN_PROGRESS))
+        return cursor.rowcount
+
+    def schedule_recrawls(self, older_than: float, priority: int = PRIORITY_RECRAWL) -> int:
+        """Make URLs finished more than ``older_than`` seconds ago pending
+        again, ahead of never-crawled ones."""
+        now = time.time()
+        with self.db:
+            cursor = self.db.execute(
+                "UPDATE frontier SET state = ?, priority = MAX(priority, ?), due_at = 0 "
+                "WHERE state = ? AND updated_at <= ?",
+                (PENDING, priority, DONE, now - older_than),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> dict:
+        names = {PENDING: "pending", IN_PROGRESS: "in_progress", DONE: "done", FAILED: "failed"}
+        rows = self.db.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall()
+        return {names.get(state, str(state)): count for state, count in rows}
+
+
+class RespFrontier:
+    """Frontier shared by any number of workers through a Redis-protocol
+    server (``redis://`` URL): one list per priority, a seen-set so a URL is
+    only queued once, and leases with a deadline, so the URLs of a worker
+    that dies go back to the queue for the others. Same interface as
+    SqliteFrontier, minus ``due_at``."""
+
+    def __init__(self, url: str, prefix: str = "frontier", lease: float = LEASE_SECONDS):
+        self.client = RespClient(url)
+        self.prefix = prefix
+        self.lease = lease
+        self._leased: dict = {}
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def close(self) -> None:
+        self.client.close()
+
+    def push_many(
+        self,
+        urls: Iterable[str | Tuple[str, int]],
+        priority: int = PRIORITY_DEFAULT,
+        due_at: float = 0.0,
+        requeue: bool = False,
+        batch_size: int = 1000,
+    ) -> int:
+        added = 0
+        batch: List[Tuple[str, int]] = []
+        for value in urls:
+            batch.append(value if isinstance(value, tuple) else (value, priority))
+            if len(batch) >= batch_size:
+                added += self._push(batch, requeue)
+                batch = []
+        if batch:
+            added += self._push(batch, requeue)
+        return added
+
+    def _commit(self, watch, reads, build) -> List:
+        # Retried until no other worker wrote the watched keys in between:
+        # an aborted attempt applied nothing, and each abort means another
+        # worker got its change in.
+        while True:
+            replies = self.client.transaction(watch, reads, build)
+            if replies is not None:
+                return replies
+
+    def _push(self, batch: List[Tuple[str, int]], requeue: bool) -> int:
+        seen = self._key("seen")
+        new: List[str] = []
+
+        def queue(known):
+            new.clear()
+            commands = []
+            for (url, url_priority), is_known in zip(batch, known):
+                if not is_known:
+                    new.append(url)
+                    commands.append(("SADD", seen, url))
+                if requeue or not is_known:
+                    commands.append(("RPUSH", self._key("queue", url_priority), url))
+            if commands:
+                commands.extend(("SADD", self._key("priorities"), p) for p in {p for _, p in batch})
+            return commands
+
+        self._commit([seen], [("SISMEMBER", seen, url) for url, _ in batch], queue)
+        return len(new)
+
+    def _requeue_expired(self, now: float, limit: int = 1000) -> int:
+        leases = self._key("leases")
+        expired: List[bytes] = []
+
+        def requeue(replies):
+            expired[:] = replies[0]
+            commands = [("ZREM", leases, member) for member in expired]
+            for member in expired:
+                url_priority, url = member.decode("utf-8").split(" ", 1)
+                commands.append(("RPUSH", self._key("queue", url_priority), url))
+            return commands
+
+        self._commit([leases], [("ZRANGEBYSCORE", leases, "-inf", now, "LIMIT", 0, limit)], requeue)
+        return len(expired)
+
+    def pop_batch(self, size: int, now: Optional[float] = None) -> List[FrontierEntry]:
+        """Lease up to ``size`` URLs, highest priority first. Taking URLs off
+        the queues and leasing them is one transaction, so a worker dying
+        in between cannot lose them."""
+        now = time.time() if now is None else now
+        self._requeue_expired(now, size)
+        priorities = sorted((int(p) for p in self.client.execute("SMEMBERS", self._key("priorities"))), reverse=True)
+        if not priorities:
+            return []
+        queues = [self._key("queue", url_priority) for url_priority in priorities]
+        deadline = now + self.lease
+        entries: List[FrontierEntry] = []
+
+        def lease(heads):
+            entries.clear()
+            commands = []
+            for url_priority, queue, urls in zip(priorities, queues, heads):
+                taken = urls[: size - len(entries)]
+                if taken:
+                    commands.append(("LTRIM", queue, len(taken), -1))
+                    entries.extend(
+                        FrontierEntry(url.decode("utf-8"), _domain(url.decode("utf-8")), url_priority) for url in taken
+                    )
+                if len(entries) >= size:
+                    break
+            if entries:
+                members = [(deadline, f"{entry.priority} {entry.url}") for entry in entries]
+                commands.append(("ZADD", self._key("leases"), *(arg for pair in members for arg in pair)))
+            return commands
+
+        self._commit(queues, [("LRANGE", queue, 0, size - 1) for queue in queues], lease)
+        self._leased.update((entry.url, f"{entry.priority} {entry.url}") for entry in entries)
+        return entries
+
+    def renew(self, urls: Iterable[str], now: Optional[float] = None) -> int:
+        """Extend this worker's leases on ``urls`` (still queued or being
+        downloaded) by another lease period. A lease that has already been
+        taken back, and maybe handed to another worker, is not revived."""
+        deadline = (time.time() if now is None else now) + self.lease
+        members = [self._leased[url] for url in urls if url in self._leased]
+        if not members:
+            return 0
+        args = (arg for member in members for arg in (deadline, member))
+        return self.client.execute("ZADD", self._key("leases"), "XX", "CH", *args)
+
+    def mark(self, urls: Iterable[str], state: int) -> None:
+        now = time.time()
+        commands = []
+        for url in urls:
+            member = self._leased.pop(url, None)
+            if member is not None:
+                commands.append(("ZREM", self._key("leases"), member))
+            if state == DONE:
+                commands.append(("ZADD", self._key("done"), now, url))
+            elif state == FAILED:
+                commands.append(("SADD", self._key("failed"), url))
+        self.client.pipeline(commands)
+
+    def recover(self) -> int:
+        """Re-queue URLs whose lease expired: their worker died. Leases of
+        live workers are left alone."""
+        requeued = 0
+        while True:
+            count = self._requeue_expired(time.time())
+            requeued += count
+            if not count:
+                return requeued
+
+    def schedule_recrawls(self, older_than: float, priority: int = PRIORITY_RECRAWL) -> int:
+        done_key = self._key("done")
+        done: List[bytes] = []
+
+        def requeue(replies):
+            done[:] = replies[0]
+            if not done:
+                return []
+            commands = [("ZREM", done_key, url) for url in done]
+            commands.extend(("RPUSH", self._key("queue", priority), url) for url in done)
+            commands.append(("SADD", self._key("priorities"), priority))
+            return commands
+
+        self._commit([done_key], [("ZRANGEBYSCORE", done_key, "-inf", time.time() - older_than)], requeue)
+        return len(done)
+
+    def counts(self) -> dict:
+        priorities = self.client.execute("SMEMBERS", self._key("priorities"))
+        replies = self.client.pipeline(
+            [("LLEN", self._key("queue", int(p))) for p in priorities]
+            + [("ZCARD", self._key("leases")), ("ZCARD", self._key("done")), ("SCARD", self._key("failed"))]
+        )
+        in_progress, done, failed = replies[-3:]
+        return {"pending": sum(replies[:-3]), "in_progress": in_progress, "done": done, "failed": failed}
+
+
+def open_frontier(path: str, prefix: str = "frontier"):
+    """A RespFrontier for ``redis://`` URLs, else a SqliteFrontier file."""
+    if str(path).startswith("redis://"):
+        return RespFrontier(str(path), prefix=prefix)
+    return SqliteFrontier(path)
+
+
+class FrontierSpiderMixin:
+    # Spiders mixing this in take ``-a frontier=path.sqlite``: seeds are
+    # streamed into the frontier and start() leases them in batches, so
+    # neither the seed list nor the pending queue has to fit in memory.
+    # A ``redis://`` URL instead shares one queue between many workers.
+
+    frontier = None
+    frontier_priority = PRIORITY_DEFAULT
+    frontier_batch_size = 100
+    # Workers of a shared frontier lease few URLs at a time, so the queue
+    # is split by how fast each worker actually goes.
+    frontier_shared_batch_size = 8
+    frontier_poll_interval = 1.0
+    # Scrapy reads start() as fast as it yields, so leasing waits while this
+    # many times CONCURRENT_REQUESTS leased URLs have no response yet: the
+    # rest of the queue stays in the frontier instead of the scheduler.
+    frontier_in_flight_factor = 2
+    frontier_backout_interval = 0.1
+
+    def init_frontier(
+        self,
+        path: str,
+        urls: Optional[List[str]] = None,
+        urls_file: Optional[str] = None,
+        recrawl_after: Optional[str | float] = None,
+    ) -> None:
+        if urls_file and not Path(urls_file).exists():
+            raise ValueError(f"urls_file not found: {urls_file}")
+        self.frontier = open_frontier(path, prefix=f"frontier:{self.name}")
+        if not urls and not urls_file:
+            urls = list(getattr(self, "default_start_urls", []))
+        self._frontier_seed_urls = urls or []
+        self._frontier_seed_file = urls_file
+        self._frontier_recrawl_after = float(recrawl_after) if recrawl_after else None
+        self._frontier_finished: List[Tuple[str, int]] = []
+        self._frontier_in_flight: Set[str] = set()
+        self._frontier_renewal: Optional[LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if getattr(spider, "frontier", None) is not None:
+            crawler.signals.connect(spider._frontier_item_done, signal=signals.item_scraped)
+            crawler.signals.connect(spider._frontier_item_done, signal=signals.item_dropped)
+            crawler.signals.connect(spider._frontier_request_dropped, signal=signals.request_dropped)
+            crawler.signals.connect(spider._frontier_response_received, signal=signals.response_received)
+            crawler.signals.connect(spider._frontier_closed, signal=signals.spider_closed)
+        return spider
+
+    def frontier_priority_for(self, url: str) -> int:
+        return self.frontier_priority
+
+    def make_frontier_request(self, entry: FrontierEntry) -> Optional[scrapy.Request]:
+        return scrapy.Request(entry.url, callback=self.parse, priority=entry.priority)
+
+    def _frontier_call(self, method, *args) -> defer.Deferred:
+        # A shared frontier blocks on its Redis socket, so it is called from
+        # the thread pool rather than the reactor thread. SqliteFrontier is
+        # local and its connection belongs to the thread that opened it.
+        if isinstance(self.frontier, RespFrontier):
+            return deferToThread(method, *args)
+        return defer.maybeDeferred(method, *args)
+
+    async def frontier_start(self):
+        from twisted.internet import reactor
+
+        async def call(method, *args):
+            return await maybe_deferred_to_future(self._frontier_call(method, *args))
+
+        recovered = await call(self.frontier.recover)
+        if recovered:
+            self.logger.info("Frontier: re-queued %d URLs left in flight by a previous run", recovered)
+        if self._frontier_recrawl_after:
+            await call(self.frontier.schedule_recrawls, self._frontier_recrawl_after)
+        seeds = iter_url_lines(self._frontier_seed_file) if self._frontier_seed_file else self._frontier_seed_urls
+        canonicalizer = getattr(self, "url_canonicalizer", None)
+        if canonicalizer is not None:
+            seeds = (canonicalizer.canonicalize(url, remember=False) for url in seeds)
+        # Seeds are read and canonicalized here, and pushed a batch at a time.
+        seeds = ((url, self.frontier_priority_for(url)) for url in seeds)
+        added = 0
+        while batch := list(islice(seeds, 10000)):
+            added += await call(self.frontier.push_many, batch)
+        self.logger.info("Frontier: %d new seeds, queue %s", added, await call(self.frontier.counts))
+        shared = isinstance(self.frontier, RespFrontier)
+        batch_size = self.frontier_shared_batch_size if shared else self.frontier_batch_size
+        max_in_flight = self.frontier_in_flight_factor * self.crawler.settings.getint("CONCURRENT_REQUESTS")
+        if shared:
+            # A URL waiting in this worker's scheduler or downloader keeps its
+            # lease, so it is not handed to another worker meanwhile.
+            self._frontier_renewal = LoopingCall(self._renew_leases)
+            self._frontier_renewal.start(self.frontier.lease / 3, now=False)
+        while True:
+            while len(self._frontier_in_flight) >= max_in_flight:
+                await maybe_deferred_to_future(deferLater(reactor, self.frontier_backout_interval, lambda: None))
+            await maybe_deferred_to_future(self._flush_frontier())
+            batch = await call(self.frontier.pop_batch, min(batch_size, max_in_flight - len(self._frontier_in_flight)))
+            if not batch:
+                # URLs leased by other workers come back if they die.
+                if shared and (await call(self.frontier.counts))["in_progress"]:
+                    await maybe_deferred_to_future(deferLater(reactor, self.frontier_poll_interval, lambda: None))
+                    continue
+                break
+            for entry in batch:
+                request = self.make_frontier_request(entry)
+                if request is None:
+                    self._finish(entry.url, FAILED)
+                    continue
+                request.meta["frontier_url"] = entry.url
+                request.errback = self._frontier_errback
+                self._frontier_in_flight.add(entry.url)
+                yield request
+
+    def _finish(self, url: Optional[str], state: int) -> None:
+        if not url:
+            return
+        self._frontier_in_flight.discard(url)
+        self._frontier_finished.append((url, state))
+        if len(self._frontier_finished) >= self.frontier_batch_size:
+            self._flush_frontier().addErrback(
+                lambda failure: self.logger.error("Frontier: could not mark finished URLs: %s", failure.value)
+            )
+
+    def _flush_frontier(self) -> defer.Deferred:
+        finished, self._frontier_finished = self._frontier_finished, []
+        marks = []
+        for state in (DONE, FAILED):
+            urls = [url for url, url_state in finished if url_state == state]
+            if urls:
+                marks.append(self._frontier_call(self.frontier.mark, urls, state))
+        return defer.gatherResults(marks, consumeErrors=True)
+
+    def _renew_leases(self) -> defer.Deferred:
+        d = self._frontier_call(self.frontier.renew, list(self._frontier_in_flight))
+        return d.addErrback(lambda failure: self.logger.error("Frontier: could not renew leases: %s", failure.value))
+
+    def _frontier_item_done(self, item, response, spider, **kwargs):
+        if spider is self and response is not None:
+            self._finish(response.meta.get("frontier_url"), DONE)
+
+    def _frontier_response_received(self, response, request, spider):
+        if spider is self:
+            self._frontier_in_flight.discard(request.meta.get("frontier_url"))
+
+    def _frontier_request_dropped(self, request, spider):
+        # A duplicate of a URL already crawled this run (e.g. a variant
+        # coalesced by CanonicalUrlMiddleware) is done too.
+        if spider is self:
+            self._finish(request.meta.get("frontier_url"), DONE)
+
+    def _frontier_errback(self, failure):
+        request = getattr(failure, "request", None)
+        self._finish(request.meta.get("frontier_url") if request is not None else None, FAILED)
+        self.logger.warning("Frontier request failed: %s", failure.value)
+
+    async def _frontier_closed(self, spider, reason):
+        if spider is not self:
+            return
+        if self._frontier_renewal is not None and self._frontier_renewal.running:
+            self._frontier_renewal.stop()
+        try:
+            await maybe_deferred_to_future(self._flush_frontier())
+            counts = await maybe_deferred_to_future(self._frontier_call(self.frontier.counts))
+            self.logger.info("Frontier: queue %s", counts)
+        finally:
+            await maybe_deferred_to_future(self._frontier_call(self.frontier.close))
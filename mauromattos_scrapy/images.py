@@ -0,0 +1,99 @@
+import posixpath
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters image CDNs use to resize or re-encode on the fly.
+RESIZE_PARAMS = frozenset(
+    ("width", "height", "w", "h", "aspect", "fit", "crop", "resize", "quality", "q", "format", "fm", "auto", "dpr")
+)
+# Original formats first; the same picture re-encoded by a CDN or an
+# optimizer plugin (foo.jpg.avif) ranks after it.
+FORMAT_PREFERENCE = ("jpg", "jpeg", "png", "webp", "avif", "gif")
+
+# WordPress: name-1260x788.jpg, name.jpg.avif, name-600x351.jpg.webp, and
+# name-scaled.jpg, the downsized "original" of very large uploads.
+WP_SIZE_RE = re.compile(r"-(\d+)x(\d+)$")
+WP_SCALED_SUFFIX = "-scaled"
+# VTEX: /arquivos/ids/30033373-500-500/slug.jpg
+VTEX_IDS_RE = re.compile(r"^(/arquivos/ids/\d+)(?:-(\d+)-(\d+))?(/.*)?$")
+
+
+class ImageVariant(NamedTuple):
+    key: str
+    url: str
+    width: Optional[int]
+    height: Optional[int]
+    format: str
+    derived: bool
+
+    @property
+    def rank(self) -> tuple:
+        original_size = self.width is None and self.height is None
+        area = (self.width or 0) * (self.height or 0)
+        fmt = FORMAT_PREFERENCE.index(self.format) if self.format in FORMAT_PREFERENCE else len(FORMAT_PREFERENCE)
+        return (original_size, area, not self.derived, -fmt)
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value and value.isdigit() else None
+
+
+@lru_cache(maxsize=65536)
+def parse_image_url(url: str) -> ImageVariant:
+    """Split ``url`` into the identity of the picture (``key``, shared by
+    all its size and format variants) and what makes this variant."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    width = height = None
+    for name, value in query:
+        if name.lower() in ("width", "w"):
+            width = _int(value)
+        elif name.lower() in ("height", "h"):
+            height = _int(value)
+    kept_query = urlencode([(name, value) for name, value in query if name.lower() not in RESIZE_PARAMS])
+    path = parts.path
+
+    vtex = VTEX_IDS_RE.match(path) if parts.netloc.endswith("vtexassets.com") else None
+    if vtex:
+        # Any size of a VTEX file id can be requested, so the variant
+        # served is always the original one.
+        ids, _, _, rest = vtex.groups()
+        path = ids + (rest or "")
+        fmt = posixpath.splitext(rest or "")[1].lstrip(".").lower()
+        canonical = urlunsplit((parts.scheme, parts.netloc, path, kept_query, ""))
+        return ImageVariant(f"{parts.netloc}{ids}", canonical, None, None, fmt, False)
+
+    directory, filename = posixpath.split(path)
+    stem, ext = posixpath.splitext(filename)
+    fmt = ext.lstrip(".").lower()
+    derived = False
+    inner_stem, inner_ext = posixpath.splitext(stem)
+    if inner_ext.lstrip(".").lower() in FORMAT_PREFERENCE:
+        stem, derived = inner_stem, True
+    size = WP_SIZE_RE.search(stem)
+    if size:
+        stem = stem[: size.start()]
+        width, height = int(size.group(1)), int(size.group(2))
+    elif stem.endswith(WP_SCALED_SUFFIX):
+        stem = stem[: -len(WP_SCALED_SUFFIX)]
+    canonical = urlunsplit((parts.scheme, parts.netloc, parts.path, kept_query, ""))
+    return ImageVariant(f"{parts.netloc}{directory}/{stem}", canonical, width, height, fmt, derived)
+
+
+def image_key(url: str) -> str:
+    return parse_image_url(url).key
+
+
+def canonical_images(urls: Iterable[str]) -> List[str]:
+    """One URL per picture, in order of first appearance: the best variant
+    seen (original size, else the largest; original format before
+    re-encoded copies)."""
+    best: Dict[str, ImageVariant] = {}
+    for url in urls:
+        variant = parse_image_url(url)
+        current = best.get(variant.key)
+        if current is None or variant.rank > current.rank:
+            best[variant.key] = variant
+    return [variant.url for variant in best.values()]
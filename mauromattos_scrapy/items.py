@@ -12,4 +12,11 @@ class MauromattosScrapyItem(scrapy.Item):
     pass
 
 class AmericanasProductItem(Product):
-    pass
\ No newline at end of file
+    pass
+
+
+def nested_get(obj, key: str):
+    # The page objects fill breadcrumbs, images and brand with plain dicts;
+    # items built with from_dict() hold attrs objects instead.
+    return obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+
@@ -0,0 +1,215 @@
+import json
+import re
+import sys
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from zyte_common_items import Product, ProductList
+
+from mauromattos_scrapy.items import nested_get
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)?")
+STOPWORDS = frozenset(
+    "a o as os e de da do das dos em na no nas nos com sem para por ou um uma "
+    "oferta ofertas promocao americanas casas bahia casasbahia".split()
+)
+# Tokens shared by more products than this are useless for finding
+# candidates ("smartphone", "preto") and are only used for scoring.
+MAX_POSTINGS = 500
+MAX_CANDIDATES = 20
+
+
+class Offer(NamedTuple):
+    source: str
+    url: str
+    gtin: Optional[str]
+    brand: Optional[str]
+    name: Optional[str]
+    price: Optional[str]
+    currency: Optional[str]
+    availability: Optional[str]
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def make_offer(source, url, gtin, brand, name, price, currency, availability) -> Offer:
+    # The index keeps every offer in memory; source, brand, currency and
+    # availability repeat across offers, so each distinct string is stored once.
+    return Offer(_intern(source), url, gtin, _intern(brand), name, price, _intern(currency), _intern(availability))
+
+
+def normalize_gtin(value) -> Optional[str]:
+    """Digits-only GTIN zero-padded to 14, so UPC-A, EAN-13 and GTIN-14
+    spellings of the same code compare equal."""
+    if not value:
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    if len(digits) not in (8, 12, 13, 14):
+        return None
+    return digits.zfill(14)
+
+
+def normalize_text(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", value)
+    return "".join(ch for ch in value if not unicodedata.combining(ch)).lower()
+
+
+def name_tokens(name: Optional[str], brand: Optional[str] = None) -> FrozenSet[str]:
+    tokens = set(TOKEN_RE.findall(normalize_text(name))) - STOPWORDS
+    if brand:
+        tokens -= set(TOKEN_RE.findall(normalize_text(brand)))
+    return frozenset(tokens)
+
+
+def _model_tokens(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    return frozenset(token for token in tokens if any(ch.isdigit() for ch in token))
+
+
+def offers_from_item(item, source: str) -> List[Offer]:
+    if isinstance(item, ProductList):
+        return [
+            make_offer(source, product.url, None, None, product.name, product.price, product.currency, None)
+            for product in item.products or []
+            if product.url
+        ]
+    if not isinstance(item, Product) or not item.url:
+        return []
+    gtin = None
+    for entry in item.gtin or []:
+        gtin = normalize_gtin(nested_get(entry, "value"))
+        if gtin:
+            break
+    brand = nested_get(item.brand, "name") if item.brand is not None else None
+    return [make_offer(source, item.url, gtin, brand, item.name, item.price, item.currency, item.availability)]
+
+
+class MatchedProduct:
+    __slots__ = ("id", "gtins", "brand", "name", "tokens", "offers")
+
+    def __init__(self, product_id: int, offer: Offer, tokens: FrozenSet[str]):
+        self.id = product_id
+        self.gtins: Set[str] = {offer.gtin} if offer.gtin else set()
+        self.brand = normalize_text(offer.brand) or None
+        self.name = offer.name
+        self.tokens = tokens
+        self.offers: Dict[str, Offer] = {}
+
+    def asdict(self) -> dict:
+        return {
+            "id": self.id,
+            "gtins": sorted(self.gtins),
+            "brand": self.brand,
+            "name": self.name,
+            "offers": [offer._asdict() for offer in self.offers.values()],
+        }
+
+
+class MatchIndex:
+    """Joins offers from several retailers into one MatchedProduct per
+    product: exact match on normalized GTIN, otherwise the best name match
+    (same brand, token Jaccard >= ``min_similarity``, compatible model
+    numbers) found through an inverted token index."""
+
+    def __init__(self, min_similarity: float = 0.6):
+        self.min_similarity = min_similarity
+        self.products: List[MatchedProduct] = []
+        self.by_gtin: Dict[str, MatchedProduct] = {}
+        self.by_url: Dict[str, MatchedProduct] = {}
+        self.postings: Dict[str, List[MatchedProduct]] = {}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def add(self, offer: Offer) -> Tuple[MatchedProduct, str]:
+        """Attach ``offer`` to its product; also returns how it was matched:
+        "gtin", "url" (seen before), "name" or "new"."""
+        tokens = name_tokens(offer.name, offer.brand)
+        matched_by = "gtin"
+        product = self.by_gtin.get(offer.gtin) if offer.gtin else None
+        if product is None:
+            matched_by = "url"
+            product = self.by_url.get(offer.url)
+        if product is None:
+            matched_by = "name"
+            product = self._match_name(offer, tokens)
+        if product is None:
+            matched_by = "new"
+            product = MatchedProduct(len(self.products), offer, tokens)
+            self.products.append(product)
+            for token in tokens:
+                self.postings.setdefault(token, []).append(product)
+        if offer.gtin:
+            product.gtins.add(offer.gtin)
+            self.by_gtin.setdefault(offer.gtin, product)
+        if product.brand is None and offer.brand:
+            product.brand = normalize_text(offer.brand)
+        product.offers[offer.url] = offer
+        self.by_url[offer.url] = product
+        return product, matched_by
+
+    def _match_name(self, offer: Offer, tokens: FrozenSet[str]) -> Optional[MatchedProduct]:
+        if not tokens:
+            return None
+        hits: Counter = Counter()
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting and len(posting) <= MAX_POSTINGS:
+                for product in posting:
+                    hits[product.id] += 1
+        brand = normalize_text(offer.brand) or None
+        models = _model_tokens(tokens)
+        best, best_score = None, self.min_similarity
+        for product_id, _ in hits.most_common(MAX_CANDIDATES):
+            product = self.products[product_id]
+            if brand and product.brand and brand != product.brand:
+                continue
+            if offer.gtin and product.gtins and offer.gtin not in product.gtins:
+                continue
+            other_models = _model_tokens(product.tokens)
+            if models and other_models and not (models <= other_models or other_models <= models):
+                continue
+            score = len(tokens & product.tokens) / len(tokens | product.tokens)
+            if score >= best_score:
+                best, best_score = product, score
+        return best
+
+
+def load_offers(path: Path) -> Iterator[Offer]:
+    if not path.exists():
+        return
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                yield make_offer(**json.loads(line))
+
+
+def compact_offers(path: Path) -> List[Offer]:
+    """The latest offer for each (source, url) in the log, in first-seen
+    order. Re-crawled products append their offer again, so the log is
+    rewritten without the older copies when there are any."""
+    latest: Dict[Tuple[str, str], Offer] = {}
+    logged = 0
+    for offer in load_offers(path):
+        latest[(offer.source, offer.url)] = offer
+        logged += 1
+    offers = list(latest.values())
+    if len(offers) < logged:
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as lines:
+            for offer in offers:
+                lines.write(json.dumps(offer._asdict(), ensure_ascii=False) + "\n")
+        tmp_path.replace(path)
+    return offers
+
+
+def build_index(offers: Iterable[Offer], min_similarity: float = 0.6) -> MatchIndex:
+    index = MatchIndex(min_similarity)
+    for offer in offers:
+        index.add(offer)
+    return index
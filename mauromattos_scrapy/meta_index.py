@@ -0,0 +1,48 @@
+from typing import Dict, Optional, Tuple
+
+# Attributes a <meta> element is looked up by.
+META_KEYS = ("property", "name", "itemprop")
+
+
+class MetaIndex:
+    """All ``<meta>`` and ``<link>`` elements of a document, read in one
+    pass. Lookups return what ``css('meta[<attr>="<value>"]::attr(content)')
+    .get()`` and ``css('link[rel="<rel>"]::attr(href)').get()`` would: the
+    first matching element, in document order, that has the attribute."""
+
+    __slots__ = ("_meta", "_links")
+
+    def __init__(self, root):
+        self._meta: Dict[Tuple[str, str], str] = {}
+        self._links: Dict[str, str] = {}
+        for element in root.iter("meta", "link"):
+            attrib = element.attrib
+            if element.tag == "link":
+                rel, href = attrib.get("rel"), attrib.get("href")
+                if rel is not None and href is not None:
+                    self._links.setdefault(rel, href)
+                continue
+            content = attrib.get("content")
+            if content is None:
+                continue
+            for key in META_KEYS:
+                value = attrib.get(key)
+                if value is not None:
+                    self._meta.setdefault((key, value), content)
+
+    def get(self, attr: str, value: str) -> Optional[str]:
+        return self._meta.get((attr, value))
+
+    def link(self, rel: str) -> Optional[str]:
+        return self._links.get(rel)
+
+
+class MetaIndexMixin:
+    """Gives a page object a ``meta_index`` built on first use."""
+
+    @property
+    def meta_index(self) -> MetaIndex:
+        index = getattr(self, "_meta_index", None)
+        if index is None:
+            index = self._meta_index = MetaIndex(self.selector.root)
+        return index
@@ -3,98 +3,625 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import logging
+import time
+import weakref
+from urllib.parse import urlparse
 
-# useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy import Request, signals
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy_poet.injection import get_callback
+from twisted.internet.task import deferLater
+from twisted.internet.threads import deferToThread
+from zyte_api import RequestError
+
+from mauromattos_scrapy import metrics
+from mauromattos_scrapy.canonical import REDIRECT_TTL, UrlCanonicalizer
+from mauromattos_scrapy.resp import RespClient
+from mauromattos_scrapy.throttling import CircuitBreaker, DomainHealth, RetryBudget, backoff_delay
+from mauromattos_scrapy.tracing import Tracer
+from mauromattos_scrapy.zyte_profiles import fallback_profile, missing_fields, profiled_page_cls
+
+logger = logging.getLogger(__name__)
+
+
+def _domain(url: str) -> str:
+    host = urlparse(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
 
 
 class MauromattosScrapySpiderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the spider middleware does not modify the
-    # passed objects.
+    # Records items and callback (extraction) time per spider into the
+    # process-wide metrics registry.
+
+    def __init__(self, crawler):
+        self.crawler = crawler
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if not crawler.settings.getbool("METRICS_ENABLED"):
+            raise NotConfigured
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
-    def process_spider_input(self, response, spider):
-        # Called for each response that goes through the spider
-        # middleware and into the spider.
-
-        # Should return None or raise an exception.
+    def process_spider_input(self, response, spider=None):
+        response.meta["_metrics_callback_started"] = time.perf_counter()
         return None
 
-    def process_spider_output(self, response, result, spider):
-        # Called with the results returned from the Spider, after
-        # it has processed the response.
-
-        # Must return an iterable of Request, or item objects.
-        for i in result:
-            yield i
+    def _record(self, item_or_request):
+        if not isinstance(item_or_request, Request):
+            metrics.ITEMS.inc(self.crawler.spider.name)
 
-    def process_spider_exception(self, response, exception, spider):
-        # Called when a spider or process_spider_input() method
-        # (from other spider middleware) raises an exception.
+    def _observe_extraction(self, response):
+        started = response.meta.pop("_metrics_callback_started", None)
+        if started is not None:
+            metrics.EXTRACTION_TIME.observe(time.perf_counter() - started, self.crawler.spider.name)
 
-        # Should return either None or an iterable of Request or item objects.
-        pass
+    def process_spider_output(self, response, result, spider=None):
+        for item_or_request in result:
+            self._record(item_or_request)
+            yield item_or_request
+        self._observe_extraction(response)
 
-    async def process_start(self, start):
-        # Called with an async iterator over the spider start() method or the
-        # matching method of an earlier spider middleware.
-        async for item_or_request in start:
+    async def process_spider_output_async(self, response, result, spider=None):
+        async for item_or_request in result:
+            self._record(item_or_request)
             yield item_or_request
+        self._observe_extraction(response)
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
 class MauromattosScrapyDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    # Records request counts, per-domain download latency, response codes
+    # and Zyte API errors into the process-wide metrics registry.
+
+    def __init__(self, crawler):
+        self.crawler = crawler
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if not crawler.settings.getbool("METRICS_ENABLED"):
+            raise NotConfigured
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+    def process_request(self, request, spider=None):
+        # A retry carries the meta of the attempt before it.
+        request.meta.pop("download_latency", None)
+        metrics.REQUESTS.inc(self.crawler.spider.name, _domain(request.url))
         return None
 
-    def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+    def _observe_latency(self, request):
+        # Set by the download handler, so it leaves out DOWNLOAD_DELAY and
+        # the wait for a free slot, which this middleware runs before.
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            metrics.DOWNLOAD_LATENCY.observe(latency, self.crawler.spider.name, _domain(request.url))
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+    def process_response(self, request, response, spider=None):
+        self._observe_latency(request)
+        metrics.RESPONSES.inc(self.crawler.spider.name, _domain(request.url), str(response.status))
         return response
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def process_exception(self, request, exception, spider=None):
+        self._observe_latency(request)
+        name = self.crawler.spider.name
+        if isinstance(exception, RequestError):
+            error_type = exception.parsed.type or "unknown"
+            metrics.ZYTE_API_ERRORS.inc(name, str(exception.status), error_type)
+        metrics.DOWNLOAD_EXCEPTIONS.inc(name, _domain(request.url), type(exception).__name__)
+        return None
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class DomainRetryBudgetMiddleware(RetryMiddleware):
+    # Drop-in replacement for Scrapy's RetryMiddleware. Retries are paid from
+    # a per-domain budget, failing domains get an exponentially growing
+    # download delay, and after CIRCUIT_BREAKER_THRESHOLD consecutive
+    # failures the domain's slot is paused: only one request per cooldown
+    # goes out, acting as a probe, and its success restores the slot.
+    # Zyte API requests use BUDGETED_RETRY_POLICY, so download errors reach
+    # process_exception as RequestError instead of being retried inside the
+    # client where the budget cannot see them.
+
+    retry_policy = "mauromattos_scrapy.throttling.BUDGETED_RETRY_POLICY"
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.budget_ratio = settings.getfloat("RETRY_BUDGET_RATIO", 0.2)
+        self.budget_min_tokens = settings.getfloat("RETRY_BUDGET_MIN_TOKENS", 10)
+        self.budget_max_tokens = settings.getfloat("RETRY_BUDGET_MAX_TOKENS", 100)
+        self.backoff_base = settings.getfloat("RETRY_BACKOFF_BASE", 1.0)
+        self.backoff_max = settings.getfloat("RETRY_BACKOFF_MAX", 60.0)
+        self.breaker_threshold = settings.getint("CIRCUIT_BREAKER_THRESHOLD", 10)
+        self.breaker_cooldown = settings.getfloat("CIRCUIT_BREAKER_COOLDOWN", 60.0)
+        self.breaker_max_cooldown = settings.getfloat("CIRCUIT_BREAKER_MAX_COOLDOWN", 600.0)
+        self.domains = {}
+
+    def _health(self, request):
+        domain = _domain(request.url)
+        health = self.domains.get(domain)
+        if health is None:
+            health = self.domains[domain] = DomainHealth(
+                RetryBudget(self.budget_ratio, self.budget_min_tokens, self.budget_max_tokens),
+                CircuitBreaker(self.breaker_threshold, self.breaker_cooldown, self.breaker_max_cooldown),
+            )
+        return domain, health
+
+    def _slot(self, request):
+        downloader = self.crawler.engine.downloader
+        return downloader.slots.get(downloader.get_slot_key(request))
+
+    def _apply_delay(self, request, health):
+        slot = self._slot(request)
+        if slot is None:
+            return
+        if health.base_delay is None:
+            health.base_delay = slot.delay
+        if health.breaker.is_open:
+            slot.delay = max(health.base_delay, health.breaker.cooldown)
+        else:
+            backoff = backoff_delay(health.breaker.failures, self.backoff_base, self.backoff_max)
+            slot.delay = max(health.base_delay, backoff)
+
+    def _record(self, request, failed):
+        domain, health = self._health(request)
+        stats = self.crawler.stats
+        if failed:
+            was_open = health.breaker.is_open
+            if health.breaker.record_failure():
+                if was_open:
+                    stats.inc_value(f"circuit_breaker/{domain}/failed_probes")
+                    logger.info("Probe failed for %s, next probe in %.0fs", domain, health.breaker.cooldown)
+                else:
+                    stats.inc_value(f"circuit_breaker/{domain}/opened")
+                    logger.warning(
+                        "Circuit open for %s after %d consecutive failures, next probe in %.0fs",
+                        domain,
+                        health.breaker.failures,
+                        health.breaker.cooldown,
+                    )
+        else:
+            health.budget.deposit()
+            if health.breaker.record_success():
+                stats.inc_value(f"circuit_breaker/{domain}/closed")
+                logger.info("Circuit closed for %s, resuming normal rate", domain)
+        self._apply_delay(request, health)
+
+    def process_request(self, request, spider=None):
+        request.meta.setdefault("zyte_api_retry_policy", self.retry_policy)
+        return None
+
+    def process_response(self, request, response, spider=None):
+        self._record(request, failed=response.status in self.retry_http_codes)
+        args = () if spider is None else (spider,)
+        return super().process_response(request, response, *args)
+
+    def process_exception(self, request, exception, spider=None):
+        if isinstance(exception, RequestError):
+            domain = _domain(request.url)
+            self.crawler.stats.inc_value(f"retry_budget/{domain}/zyte_api_{exception.status}")
+            # 4xx means the API rejected our request, not that the site failed.
+            if exception.status < 500:
+                return None
+            self._record(request, failed=True)
+            if request.meta.get("dont_retry", False):
+                return None
+            return self._retry(request, f"Zyte API error {exception.status}")
+        if isinstance(exception, self.exceptions_to_retry):
+            self._record(request, failed=True)
+        args = () if spider is None else (spider,)
+        return super().process_exception(request, exception, *args)
+
+    def _retry(self, request, reason, *args):
+        domain, health = self._health(request)
+        stats = self.crawler.stats
+        if health.breaker.is_open:
+            stats.inc_value(f"retry_budget/{domain}/skipped_circuit_open")
+            logger.debug("Not retrying %s (circuit open for %s): %s", request, domain, reason)
+            return None
+        if not health.budget.withdraw():
+            stats.inc_value(f"retry_budget/{domain}/exhausted")
+            logger.debug("Not retrying %s (retry budget for %s exhausted): %s", request, domain, reason)
+            return None
+        return super()._retry(request, reason, *args)
+
+
+class SharedRateLimitMiddleware:
+    # Caps requests per domain across all workers sharing SHARED_STATE_URL
+    # (a Redis-protocol server): at most SHARED_RATE_LIMIT requests per
+    # second window per domain. Requests over the limit wait for the next
+    # window instead of being sent.
+
+    def __init__(self, crawler, url: str, limit: int):
+        self.crawler = crawler
+        self.client = RespClient(url)
+        self.limit = limit
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        url = crawler.settings.get("SHARED_STATE_URL")
+        limit = crawler.settings.getint("SHARED_RATE_LIMIT", 0)
+        if not url or limit <= 0:
+            raise NotConfigured
+        o = cls(crawler, url, limit)
+        crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    async def process_request(self, request, spider=None):
+        from twisted.internet import reactor
+
+        domain = _domain(request.url)
+        while True:
+            now = time.time()
+            window = int(now)
+            key = f"rate:{domain}:{window}"
+            # RespClient blocks on its socket: keep it off the reactor thread.
+            count, _ = await maybe_deferred_to_future(
+                deferToThread(self.client.pipeline, [("INCR", key), ("EXPIRE", key, 2)])
+            )
+            if count <= self.limit:
+                return None
+            self.crawler.stats.inc_value(f"shared_rate_limit/{domain}/delayed")
+            await maybe_deferred_to_future(deferLater(reactor, window + 1 - now, lambda: None))
+
+    def spider_closed(self, spider):
+        self.client.close()
+
+
+class CanonicalUrlMiddleware:
+    # Rewrites requests to their canonical URL before they are scheduled, so
+    # tracking-parameter, trailing-slash and slug variants of a page share a
+    # fingerprint and the duplicate filter lets only one download through
+    # (see canonical.py). Redirects and item canonicalUrl values teach it the
+    # site's own canonical URLs, kept in CANONICAL_DB across runs.
+
+    def __init__(self, crawler, canonicalizer: UrlCanonicalizer):
+        self.crawler = crawler
+        self.canonicalizer = canonicalizer
+        self.start_urls = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("URL_CANONICALIZATION_ENABLED", True):
+            raise NotConfigured
+        canonicalizer = UrlCanonicalizer(
+            crawler.settings.get("CANONICAL_DB"),
+            redirect_ttl=crawler.settings.getfloat("CANONICAL_REDIRECT_TTL", REDIRECT_TTL) or None,
+        )
+        o = cls(crawler, canonicalizer)
+        crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    def _canonical(self, request):
+        canonical_url = self.canonicalizer.canonicalize(request.url)
+        if canonical_url == request.url:
+            return request
+        self.crawler.stats.inc_value("canonical/rewritten")
+        return request.replace(url=canonical_url)
+
+    def _learn(self, url, canonical_url, source):
+        if canonical_url and url != canonical_url and self.canonicalizer.learn(url, canonical_url, source):
+            self.crawler.stats.inc_value(f"canonical/learned/{source}")
+
+    def process_spider_input(self, response, spider=None):
+        if response.status == 200 and response.request is not None:
+            for url in response.meta.get("redirect_urls", []) + [response.request.url]:
+                self._learn(url, response.url, "redirect")
+        return None
+
+    def _process(self, response, item_or_request):
+        if isinstance(item_or_request, Request):
+            return self._canonical(item_or_request)
+        if response is not None:
+            self._learn(response.url, ItemAdapter(item_or_request).get("canonicalUrl"), "canonical")
+        return item_or_request
+
+    async def process_start(self, start):
+        # Start requests skip the duplicate filter (dont_filter), so variants
+        # in a seed list are coalesced here.
+        async for item_or_request in start:
+            item_or_request = self._process(None, item_or_request)
+            if isinstance(item_or_request, Request) and item_or_request.dont_filter:
+                if item_or_request.url in self.start_urls:
+                    self.crawler.stats.inc_value("canonical/coalesced")
+                    self.crawler.signals.send_catch_log(
+                        signals.request_dropped, request=item_or_request, spider=self.crawler.spider
+                    )
+                    continue
+                self.start_urls.add(item_or_request.url)
+            yield item_or_request
+
+    def process_spider_output(self, response, result, spider=None):
+        for item_or_request in result:
+            yield self._process(response, item_or_request)
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        async for item_or_request in result:
+            yield self._process(response, item_or_request)
+
+    def spider_opened(self, spider):
+        # Frontier spiders canonicalize their seeds before queueing them.
+        spider.url_canonicalizer = self.canonicalizer
+
+    def spider_closed(self, spider):
+        self.crawler.stats.set_value("canonical/known", len(self.canonicalizer))
+        self.canonicalizer.close()
+
+
+class ZyteApiProfileMiddleware:
+    # Sends each request with the Zyte API parameters declared by the page
+    # object its callback needs (see zyte_profiles), and re-requests with
+    # the page's fallback profile when required fields come back empty.
+
+    ESCALATED = "zyte_api_profile_escalated"
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ZYTE_API_PROFILES_ENABLED", True) or not settings.getbool(
+            "ZYTE_API_TRANSPARENT_MODE"
+        ):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _page_cls(self, request):
+        return profiled_page_cls(get_callback(request, self.crawler.spider))
+
+    def _apply_profile(self, request):
+        if not isinstance(request, Request) or "zyte_api_automap" in request.meta or "zyte_api" in request.meta:
+            return
+        page_cls = self._page_cls(request)
+        if page_cls is None:
+            return
+        request.meta["zyte_api_automap"] = dict(page_cls.zyte_api_automap)
+        self.crawler.stats.inc_value(f"zyte_api_profile/{page_cls.__name__}/default")
+
+    def _escalate(self, response, item):
+        request = response.request
+        if request is None or request.meta.get(self.ESCALATED):
+            return None
+        page_cls = self._page_cls(request)
+        if page_cls is None:
+            return None
+        missing = missing_fields(page_cls, item)
+        if not missing:
+            return None
+        self.crawler.stats.inc_value(f"zyte_api_profile/{page_cls.__name__}/fallback")
+        logger.debug("Missing %s on %s, retrying with %s", ", ".join(missing), response.url, fallback_profile(page_cls))
+        meta = {**request.meta, "zyte_api_automap": fallback_profile(page_cls), self.ESCALATED: True}
+        return request.replace(meta=meta, dont_filter=True)
+
+    def _process(self, response, item_or_request):
+        if isinstance(item_or_request, Request):
+            self._apply_profile(item_or_request)
+            return item_or_request
+        return self._escalate(response, item_or_request) or item_or_request
+
+    async def process_start(self, start):
+        async for item_or_request in start:
+            self._apply_profile(item_or_request)
+            yield item_or_request
+
+    def process_spider_output(self, response, result, spider=None):
+        for item_or_request in result:
+            yield self._process(response, item_or_request)
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        async for item_or_request in result:
+            yield self._process(response, item_or_request)
+
+
+class RequestTracingMiddleware:
+    # Writes per-request lifecycle spans to TRACE_FILE (Chrome trace event
+    # format, see tracing.py): scheduler queue, download slot wait, download,
+    # downloader middlewares and scrapy-poet injection, the callback (page
+    # object extraction) and each item's pipelines. Downloader stages come
+    # from engine signals; runs first on the way in and last on the way out
+    # so the callback span covers the other spider middlewares too. It is
+    # also a downloader middleware (the same instance), to end the traces of
+    # requests a downloader middleware drops before they are downloaded,
+    # which no signal reports.
+
+    META_KEY = "_trace_id"
+    _instances = weakref.WeakKeyDictionary()
+
+    def __init__(self, crawler, tracer: Tracer):
+        self.crawler = crawler
+        self.tracer = tracer
+        self.items = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler in cls._instances:
+            return cls._instances[crawler]
+        settings = crawler.settings
+        path = settings.get("TRACE_FILE")
+        if not path:
+            raise NotConfigured
+        name = crawler.spidercls.name
+        tracer = Tracer(
+            path.format(spider=name),
+            sample_rate=settings.getfloat("TRACE_SAMPLE_RATE", 0.01),
+            slow_threshold=settings.getfloat("TRACE_SLOW_THRESHOLD", 10.0),
+            process_name=name,
+        )
+        o = cls(crawler, tracer)
+        connect = crawler.signals.connect
+        connect(o.request_scheduled, signal=signals.request_scheduled)
+        connect(o.request_dropped, signal=signals.request_dropped)
+        connect(o.request_reached_downloader, signal=signals.request_reached_downloader)
+        connect(o.response_downloaded, signal=signals.response_downloaded)
+        connect(o.request_left_downloader, signal=signals.request_left_downloader)
+        connect(o.response_received, signal=signals.response_received)
+        connect(o.item_done, signal=signals.item_scraped)
+        connect(o.item_done, signal=signals.item_dropped)
+        connect(o.item_done, signal=signals.item_error)
+        connect(o.spider_error, signal=signals.spider_error)
+        connect(o.spider_closed, signal=signals.spider_closed)
+        cls._instances[crawler] = o
+        return o
+
+    def _trace(self, request):
+        if request is None:
+            return None
+        return self.tracer.get(request.meta.get(self.META_KEY))
+
+    def request_scheduled(self, request, spider=None):
+        trace = self.tracer.start(request.url, request.meta.get(self.META_KEY))
+        for stage in list(trace.marks):
+            # A retry scheduled from a downloader middleware.
+            self.tracer.end(trace, stage, retried=True)
+        request.meta[self.META_KEY] = trace.trace_id
+        self.tracer.mark(trace, "queue")
+
+    def request_dropped(self, request, spider=None):
+        trace = self._trace(request)
+        if trace is not None and not trace.spans:
+            self.tracer.discard(trace)
+
+    def request_reached_downloader(self, request, spider=None):
+        trace = self._trace(request)
+        if trace is not None:
+            self.tracer.end(trace, "queue")
+            self.tracer.mark(trace, "download")
+
+    def response_downloaded(self, response, request, spider=None):
+        trace = self._trace(request)
+        if trace is None:
+            return
+        now = self.tracer.now()
+        started = trace.marks.pop("download", None)
+        if started is not None:
+            # download_latency excludes the wait for a free slot (delay and
+            # concurrency limits), which is reported on its own.
+            latency = request.meta.get("download_latency")
+            if latency is not None and started < now - latency:
+                self.tracer.span(trace, "slot", started, now - latency)
+                started = now - latency
+            self.tracer.span(trace, "download", started, now, status=response.status)
+        self.tracer.mark(trace, "inject", now)
+
+    def request_left_downloader(self, request, spider=None):
+        trace = self._trace(request)
+        if trace is not None and "download" in trace.marks:
+            self.tracer.end(trace, "download", error=True)
+            trace.error = "download failed"
+
+    def response_received(self, response, request, spider=None):
+        trace = self._trace(request)
+        if trace is not None:
+            self.tracer.end(trace, "inject")
+
+    def process_exception(self, request, exception, spider=None):
+        # Only exceptions no downloader middleware turned into a retry or a
+        # response get here. A trace still in "queue" never reached the
+        # downloader, so request_left_downloader will not end it.
+        trace = self._trace(request)
+        if trace is None or "queue" not in trace.marks:
+            return None
+        if isinstance(exception, IgnoreRequest):
+            self.tracer.end(trace, "queue", ignored=True)
+            self.tracer.finish(trace)
+        else:
+            self.tracer.end(trace, "queue", error=True)
+            self.tracer.finish(trace, f"{type(exception).__name__}: {exception}")
+        return None
+
+    def process_spider_input(self, response, spider=None):
+        trace = self._trace(response.request)
+        if trace is not None:
+            self.tracer.mark(trace, "extract")
+        return None
+
+    def _record(self, trace, item_or_request):
+        if isinstance(item_or_request, Request):
+            if item_or_request.meta.get(self.META_KEY) != trace.trace_id:
+                return False
+            if item_or_request.dont_filter:
+                # The same page requested again (e.g. a Zyte API profile
+                # fallback): keep it on this trace.
+                return True
+            del item_or_request.meta[self.META_KEY]
+            return False
+        trace.pending_items += 1
+        self.items[id(item_or_request)] = (trace, self.tracer.now())
+        return False
+
+    def _output_done(self, trace, items, continued):
+        self.tracer.end(trace, "extract", items=items)
+        if continued:
+            return
+        trace.output_done = True
+        if not trace.pending_items:
+            self.tracer.finish(trace)
+
+    def process_spider_output(self, response, result, spider=None):
+        trace = self._trace(response.request)
+        if trace is None:
+            yield from result
+            return
+        items = 0
+        continued = False
+        for item_or_request in result:
+            continued |= self._record(trace, item_or_request)
+            items += not isinstance(item_or_request, Request)
+            yield item_or_request
+        self._output_done(trace, items, continued)
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        trace = self._trace(response.request)
+        items = 0
+        continued = False
+        async for item_or_request in result:
+            if trace is not None:
+                continued |= self._record(trace, item_or_request)
+                items += not isinstance(item_or_request, Request)
+            yield item_or_request
+        if trace is not None:
+            self._output_done(trace, items, continued)
+
+    def item_done(self, item, response=None, spider=None):
+        entry = self.items.pop(id(item), None)
+        if entry is None:
+            return
+        trace, yielded = entry
+        self.tracer.span(trace, "pipeline", yielded, self.tracer.now())
+        trace.pending_items -= 1
+        if trace.output_done and not trace.pending_items:
+            self.tracer.finish(trace)
+
+    def spider_error(self, failure, response, spider=None):
+        trace = self._trace(getattr(response, "request", None))
+        if trace is not None:
+            self.tracer.end(trace, "extract", error=True)
+            self.tracer.finish(trace, f"{failure.type.__name__}: {failure.value}")
+
+    def spider_closed(self, spider):
+        self.tracer.close()
+        stats = self.crawler.stats
+        stats.set_value("tracing/requests", self.tracer.started)
+        stats.set_value("tracing/written", self.tracer.written)
+        stats.set_value("tracing/slow", self.tracer.slow)
+        stats.set_value("tracing/errors", self.tracer.errors)
+        for stage, count in self.tracer.slow_stages.items():
+            stats.set_value(f"tracing/slow_stage/{stage}", count)
+        if self.tracer.slow:
+            stages = ", ".join(f"{stage} {count}" for stage, count in self.tracer.slow_stages.most_common())
+            spider.logger.info(
+                "%d requests over %.1fs, by slowest stage: %s", self.tracer.slow, self.tracer.slow_threshold, stages
+            )
+        spider.logger.info("Wrote %d request traces to %s", self.tracer.written, self.tracer.writer.path)
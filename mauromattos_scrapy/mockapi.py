@@ -0,0 +1,161 @@
+import base64
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from mauromattos_scrapy.registry import fixture_bodies, page_cls_for_url, page_rules
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class MockZyteApiServer(ThreadingHTTPServer):
+    """Serves fixture bodies through the Zyte API /extract contract."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        super().__init__((host, port), _MockZyteApiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = _TokenBucket(rate_limit) if rate_limit > 0 else None
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.counts: Counter = Counter()
+        self.counts_lock = threading.Lock()
+        self.bodies: Dict[type, List[bytes]] = {}
+        for rule in page_rules():
+            bodies = [path.read_bytes() for path in fixture_bodies(rule.use)]
+            if bodies:
+                self.bodies[rule.use] = bodies
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-zyte-api", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def count(self, key: str) -> None:
+        with self.counts_lock:
+            self.counts[key] += 1
+
+    def roll(self) -> Tuple[float, float]:
+        with self.random_lock:
+            return self.random.random(), self.random.uniform(-self.jitter, self.jitter)
+
+    def body_for(self, url: str) -> Optional[bytes]:
+        if urlparse(url).path == "/robots.txt":
+            return None
+        page_cls = page_cls_for_url(url)
+        bodies = self.bodies.get(page_cls) if page_cls else None
+        if not bodies:
+            return None
+        return bodies[zlib.crc32(url.encode("utf-8")) % len(bodies)]
+
+
+class _MockZyteApiHandler(BaseHTTPRequestHandler):
+    server: MockZyteApiServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, content_type: str = "application/json") -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, error_type: str, title: str) -> None:
+        self.server.count(f"error_{status}")
+        self._send_json(
+            status,
+            {"type": error_type, "title": title, "status": status, "detail": title},
+            content_type="application/problem+json",
+        )
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path.rstrip("/") != "/v1/extract":
+            self._send_error(404, "/not-found", "Unknown endpoint")
+            return
+        try:
+            query = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_error(400, "/request/invalid", "Invalid JSON")
+            return
+        url = query.get("url")
+        if not isinstance(url, str) or not url:
+            self._send_error(400, "/request/invalid", "Missing url")
+            return
+
+        self.server.count("requests")
+        if self.server.bucket is not None and not self.server.bucket.take():
+            self._send_error(429, "/limits/over-user-limit", "User has too many concurrent requests")
+            return
+
+        error_roll, jitter = self.server.roll()
+        delay = self.server.latency + jitter
+        if delay > 0:
+            time.sleep(delay)
+        if error_roll < self.server.error_rate:
+            self._send_error(520, "/download/temporary-error", "Temporary download error")
+            return
+
+        body = self.server.body_for(url)
+        status_code = 200 if body is not None else 404
+        body = body or b""
+        self.server.count(f"status_{status_code}")
+        payload = {"url": url, "statusCode": status_code}
+        if query.get("browserHtml"):
+            payload["browserHtml"] = body.decode("utf-8", errors="replace")
+        else:
+            payload["httpResponseBody"] = base64.b64encode(body).decode("ascii")
+        if query.get("httpResponseHeaders"):
+            payload["httpResponseHeaders"] = [{"name": "content-type", "value": "text/html; charset=utf-8"}]
+        self._send_json(200, payload)
@@ -1,24 +1,33 @@
 import html
 import json
-import re
 from typing import Dict, List, Optional
 
 from html_text import extract_text
 from zyte_parsers.gtin import extract_gtin
 
+from mauromattos_scrapy.canonical import AMERICANAS_PRODUCT_ID_RE
+from mauromattos_scrapy.categories import join_url, unescape
+from mauromattos_scrapy.images import canonical_images
 from mauromattos_scrapy.items import AmericanasProductItem
+from mauromattos_scrapy.meta_index import MetaIndexMixin
+from mauromattos_scrapy.parsers import LD_JSON, ParserBackendMixin
+from mauromattos_scrapy.zyte_profiles import HTTP_RESPONSE_BODY
 from web_poet import Returns, WebPage, field, handle_urls
 
 
 @handle_urls("americanas.com.br")
-class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProductItem]):
+class AmericanasComBrAmericanasProductItemPage(MetaIndexMixin, ParserBackendMixin, WebPage, Returns[AmericanasProductItem]):
+    zyte_api_automap = HTTP_RESPONSE_BODY
+    zyte_api_required_fields = ("name",)
+    parser_backend = "lxml"
+
     @field
     def url(self) -> str:
         return str(self.response.url)
 
     @field
     def availability(self) -> Optional[str]:
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         found = set()
         for text in scripts:
             if not text:
@@ -55,7 +64,7 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def brand(self) -> Optional[dict]:
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         parsed: list[dict] = []
         for text in scripts:
             if not text:
@@ -97,7 +106,7 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def breadcrumbs(self) -> Optional[List[Dict[str, Optional[str]]]]:
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         for text in scripts:
             try:
                 data = json.loads(text)
@@ -123,13 +132,13 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
                         continue
                     name = elem.get("name")
                     if isinstance(name, str):
-                        name = html.unescape(name)
+                        name = unescape(name)
                     url = elem.get("item")
                     if isinstance(url, dict):
                         url = url.get("@id") or url.get("id")
                     if url:
                         try:
-                            url = self.urljoin(url)
+                            url = join_url(self.base_url, str(url))
                         except Exception:
                             pass
                     result.append({"name": name if name is not None else None, "url": url if url is not None else None})
@@ -139,19 +148,19 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def canonicalUrl(self) -> Optional[str]:
-        og_url = self.css('meta[property="og:url"]::attr(content)').get()
+        og_url = self.meta_index.get("property", "og:url")
         if og_url:
             return self.urljoin(og_url)
-        canonical_href = self.css('link[rel="canonical"]::attr(href)').get()
+        canonical_href = self.meta_index.link("canonical")
         if canonical_href:
             return self.urljoin(canonical_href)
         return str(self.response.url) or None
 
     @field
     def currency(self) -> Optional[str]:
-        currency = self.css('meta[property="product:price:currency"]::attr(content)').get()
+        currency = self.meta_index.get("property", "product:price:currency")
         if not currency:
-            currency = self.css('meta[itemprop="priceCurrency"]::attr(content)').get()
+            currency = self.meta_index.get("itemprop", "priceCurrency")
         if not currency:
             return None
         currency = currency.strip()
@@ -159,11 +168,11 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def currencyRaw(self) -> Optional[str]:
-        value = self.css('meta[property="product:price:currency"]::attr(content)').get()
+        value = self.meta_index.get("property", "product:price:currency")
         if not value:
-            value = self.css('meta[itemprop="priceCurrency"]::attr(content)').get()
+            value = self.meta_index.get("itemprop", "priceCurrency")
         if not value:
-            value = self.css('meta[name="currency"]::attr(content)').get()
+            value = self.meta_index.get("name", "currency")
         if not value:
             return None
         value = value.strip()
@@ -171,7 +180,7 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def description(self) -> Optional[str]:
-        ld_texts = self.css('script[type="application/ld+json"]::text').getall()
+        ld_texts = self.parser.getall(LD_JSON)
         for ld in ld_texts:
             if not ld:
                 continue
@@ -194,12 +203,12 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
                         if out:
                             return out
 
-        meta_desc = self.css('meta[name="description"]::attr(content)').get()
+        meta_desc = self.meta_index.get("name", "description")
         if meta_desc:
             out = extract_text(meta_desc).strip()
             if out:
                 return out
-        og_desc = self.css('meta[property="og:description"]::attr(content)').get()
+        og_desc = self.meta_index.get("property", "og:description")
         if og_desc:
             out = extract_text(og_desc).strip()
             if out:
@@ -208,7 +217,7 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def gtin(self) -> Optional[List[Dict[str, str]]]:
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
 
         def _find_gtin(node):
             if isinstance(node, dict):
@@ -239,7 +248,7 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def images(self) -> Optional[List[Dict[str, str]]]:
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         for text in scripts:
             try:
                 data = json.loads(text)
@@ -260,9 +269,9 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
                     clean = html.unescape(value).strip()
                     if not clean:
                         continue
-                    result.append({"url": self.urljoin(clean)})
+                    result.append(self.urljoin(clean))
                 if result:
-                    return result
+                    return [{"url": url} for url in canonical_images(result)]
         return None
 
     @field
@@ -270,23 +279,23 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
         image_list = self.images
         if image_list:
             return image_list[0]
-        img = self.css('meta[property="og:image"]::attr(content)').get()
+        img = self.meta_index.get("property", "og:image")
         if not img:
             return None
         img = html.unescape(img).strip()
         if not img or img.lower().startswith("data:"):
             return None
-        return {"url": self.urljoin(img)}
+        return {"url": canonical_images([self.urljoin(img)])[0]}
 
     @field
     def name(self) -> Optional[str]:
-        og_title = self.css('meta[property="og:title"]::attr(content)').get()
+        og_title = self.meta_index.get("property", "og:title")
         if og_title:
             value = extract_text(og_title).strip()
             if value:
                 return value
 
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         for text in scripts:
             try:
                 data = json.loads(text)
@@ -303,14 +312,14 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
 
     @field
     def price(self) -> Optional[str]:
-        price = self.css('meta[property="product:price:amount"]::attr(content)').get()
+        price = self.meta_index.get("property", "product:price:amount")
         if price:
             parsed = price.strip()
             if "," in parsed and "." not in parsed:
                 parsed = parsed.replace(",", ".")
             return parsed
 
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         for script in scripts:
             try:
                 data = json.loads(script)
@@ -340,16 +349,16 @@ class AmericanasComBrAmericanasProductItemPage(WebPage, Returns[AmericanasProduc
         sku = self.sku
         if sku:
             return sku
-        og_url = self.css('meta[property="og:url"]::attr(content)').get() or ""
+        og_url = self.meta_index.get("property", "og:url") or ""
         if og_url:
-            match = re.search(r"-(\d+)/p/?$", og_url)
+            match = AMERICANAS_PRODUCT_ID_RE.search(og_url)
             if match:
                 return match.group(1)
         return None
 
     @field
     def sku(self) -> Optional[str]:
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         for script in scripts:
             if not script:
                 continue
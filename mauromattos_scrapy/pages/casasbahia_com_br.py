@@ -1,12 +1,41 @@
 from typing import Optional, List, Dict
-import html
 
+import attrs
 from web_poet import Returns, WebPage, field, handle_urls
 from zyte_common_items import ProductList
 
+from mauromattos_scrapy.categories import join_url, unescape
+from mauromattos_scrapy.fallbacks import FallbackChain, FallbackState
+from mauromattos_scrapy.zyte_profiles import HTTP_RESPONSE_BODY
+
+BREADCRUMBS_CHAIN = FallbackChain(
+    "CasasbahiaComBrProductListPage",
+    "breadcrumbs",
+    [
+        (
+            "categorias-breadcrumb",
+            lambda page: page.css('div.dsvia-breadcrumb[data-testid="categorias-breadcrumb"] a'),
+        ),
+        ("dsvia-breadcrumb", lambda page: page.css('div.dsvia-breadcrumb a')),
+    ],
+)
+CATEGORY_NAME_CHAIN = FallbackChain(
+    "CasasbahiaComBrProductListPage",
+    "categoryName",
+    [
+        ("h1 TermSearch", lambda page: page.css('h1[class*="TermSearch"]::text').get()),
+        ("h1", lambda page: page.css('h1::text').get()),
+    ],
+)
+
 
 @handle_urls("casasbahia.com.br")
+@attrs.define
 class CasasbahiaComBrProductListPage(WebPage, Returns[ProductList]):
+    zyte_api_automap = HTTP_RESPONSE_BODY
+    zyte_api_required_fields = ("breadcrumbs",)
+    fallback_state: Optional[FallbackState] = None
+
     @field
     def url(self) -> Optional[str]:
         if not hasattr(self, "response") or self.response is None:
@@ -18,10 +47,7 @@ class CasasbahiaComBrProductListPage(WebPage, Returns[ProductList]):
 
     @field
     def breadcrumbs(self) -> Optional[List[Dict[str, Optional[str]]]]:
-        selector = 'div.dsvia-breadcrumb[data-testid="categorias-breadcrumb"] a'
-        links = self.css(selector)
-        if not links:
-            links = self.css('div.dsvia-breadcrumb a')
+        links = BREADCRUMBS_CHAIN(self)
         if not links:
             return None
 
@@ -32,9 +58,9 @@ class CasasbahiaComBrProductListPage(WebPage, Returns[ProductList]):
 
             href = link.attrib.get('href')
             if href:
-                href = html.unescape(href)
+                href = unescape(href)
                 try:
-                    href = self.urljoin(href)
+                    href = join_url(self.base_url, href)
                 except Exception:
                     href = None
 
@@ -44,9 +70,7 @@ class CasasbahiaComBrProductListPage(WebPage, Returns[ProductList]):
 
     @field
     def categoryName(self) -> Optional[str]:
-        text = self.css('h1[class*="TermSearch"]::text').get()
-        if not text:
-            text = self.css('h1::text').get()
+        text = CATEGORY_NAME_CHAIN(self)
         if text:
             return text.strip()
         return None
@@ -1,18 +1,23 @@
 from typing import Optional, Any, List, Dict
 import json
-import re
 import html
-from urllib.parse import urlparse
-import posixpath
 
+import attrs
 from web_poet import Returns, WebPage, field, handle_urls
 from zyte_common_items.items.article import Article
-from extruct.jsonld import JsonLdExtractor
 from parsel import Selector
 
+from mauromattos_scrapy.fallbacks import FallbackChain, FallbackState
+from mauromattos_scrapy.images import canonical_images, image_key
+from mauromattos_scrapy.meta_index import MetaIndexMixin
+from mauromattos_scrapy.parsers import LD_JSON, ParserBackendMixin
+from mauromattos_scrapy.zyte_profiles import HTTP_RESPONSE_BODY
+
 
 def _extract_urls_from_srcset(srcset: str) -> List[str]:
-    if not srcset:
+    # Lazy-loading placeholders are data: URIs, whose commas are not
+    # srcset separators.
+    if not srcset or srcset.lstrip().lower().startswith("data:"):
         return []
     parts = [p.strip() for p in srcset.split(",") if p.strip()]
     urls = []
@@ -35,42 +40,54 @@ def _normalize_url(url: Optional[str], page) -> Optional[str]:
         return None
 
 
-def _group_key_from_url(url: str) -> str:
-    parsed = urlparse(url)
-    filename = posixpath.basename(parsed.path)
-    filename_nosize = re.sub(r"-\d+x\d+(?=\.)", "", filename)
-    key = filename_nosize.split(".", 1)[0]
-    return key
+HEADLINE_CHAIN = FallbackChain(
+    "MacmagazineComBrArticlePage",
+    "headline",
+    [
+        ("h1.cs-entry__title span", lambda page: page.parser.get("h1.cs-entry__title span::text")),
+        ("h1.cs-entry__title", lambda page: page.parser.get("h1.cs-entry__title::text")),
+        ("h1", lambda page: page.parser.get("h1::text")),
+        ("title", lambda page: page.parser.get("title::text")),
+    ],
+)
+CANONICAL_URL_CHAIN = FallbackChain(
+    "MacmagazineComBrArticlePage",
+    "canonicalUrl",
+    [
+        ("link canonical", lambda page: page.meta_index.link("canonical")),
+        ("og:url", lambda page: page.meta_index.get("property", "og:url")),
+        ("json-ld", lambda page: page._extract_url_from_jsonld()),
+    ],
+)
 
 
 @handle_urls("macmagazine.com.br")
-class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
+@attrs.define
+class MacmagazineComBrArticlePage(MetaIndexMixin, ParserBackendMixin, WebPage, Returns[Article]):
+    zyte_api_automap = HTTP_RESPONSE_BODY
+    zyte_api_required_fields = ("headline", "articleBody")
+    fallback_state: Optional[FallbackState] = None
+    parser_backend = "lxml"
+
     @field
     def url(self) -> str:
         return str(self.response.url)
 
     @field
     def headline(self) -> Optional[str]:
-        title = self.css("h1.cs-entry__title span::text").get()
-        if not title:
-            title = self.css("h1.cs-entry__title::text").get()
-        if not title:
-            title = self.css("h1::text").get()
-        if not title:
-            title = self.css("title::text").get()
+        title = HEADLINE_CHAIN(self)
         if title:
             return title.strip()
         return None
 
     @field
     def datePublished(self) -> Optional[str]:
-        meta_time = self.css('meta[property="article:published_time"]::attr(content)').get()
+        meta_time = self.meta_index.get("property", "article:published_time")
         if meta_time:
             return meta_time
 
         try:
-            jslde = JsonLdExtractor()
-            data = jslde.extract(self.response.body)
+            data = self.parser.json_ld()
         except Exception:
             data = None
 
@@ -87,8 +104,8 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
                             return g.get("datePublished")
 
         time_val = (
-            self.css("time.post-date::attr(data-published)").get()
-            or self.css("time.post-date::attr(datetime)").get()
+            self.parser.get("time.post-date::attr(data-published)")
+            or self.parser.get("time.post-date::attr(datetime)")
         )
         if time_val:
             return time_val
@@ -104,15 +121,15 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
 
     @field
     def datePublishedRaw(self) -> Optional[str]:
-        dt = self.css("time.post-date::attr(datetime)").get()
+        dt = self.parser.get("time.post-date::attr(datetime)")
         if dt:
             return dt.strip()
 
-        dt = self.css('meta[property="article:published_time"]::attr(content)').get()
+        dt = self.meta_index.get("property", "article:published_time")
         if dt:
             return dt.strip()
 
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         for script in scripts:
             if not script:
                 continue
@@ -141,8 +158,7 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
 
     @field
     def dateModified(self) -> Optional[str]:
-        extractor = JsonLdExtractor()
-        data = extractor.extract(self.response.body) or []
+        data = self.parser.json_ld() or []
         for entry in data:
             if isinstance(entry, dict):
                 dm = entry.get("dateModified")
@@ -155,23 +171,23 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
                             dm2 = node.get("dateModified")
                             if isinstance(dm2, str) and dm2:
                                 return dm2
-        meta = self.css('meta[property="article:modified_time"]::attr(content)').get()
+        meta = self.meta_index.get("property", "article:modified_time")
         if meta:
             return meta
-        og = self.css('meta[property="og:updated_time"]::attr(content)').get()
+        og = self.meta_index.get("property", "og:updated_time")
         if og:
             return og
         return None
 
     @field
     def dateModifiedRaw(self) -> Optional[str]:
-        meta = self.css('meta[property="article:modified_time"]::attr(content)').get()
+        meta = self.meta_index.get("property", "article:modified_time")
         if meta:
             meta = meta.strip()
             if meta:
                 return meta
 
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         for script in scripts:
             if not script or not script.strip():
                 continue
@@ -237,7 +253,7 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
             if authors:
                 return authors
 
-        meta_author = self.css('meta[name="author"]::attr(content)').get()
+        meta_author = self.meta_index.get("name", "author")
         if meta_author:
             name_raw = _clean(meta_author)
             return [{"email": None, "url": None, "name": name_raw, "nameRaw": name_raw}]
@@ -246,7 +262,7 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
 
     @field
     def breadcrumbs(self) -> Optional[List[Dict[str, Optional[str]]]]:
-        scripts = self.css('script[type="application/ld+json"]::text').getall()
+        scripts = self.parser.getall(LD_JSON)
         if not scripts:
             return None
 
@@ -312,19 +328,18 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
             return None
 
         try:
-            extractor = JsonLdExtractor()
-            data = extractor.extract(self.response.body)
+            data = self.parser.json_ld()
             lang = _find_in_language(data)
         except Exception:
             lang = None
 
         if not lang:
-            og_locale = self.css('meta[property="og:locale"]::attr(content)').get()
+            og_locale = self.meta_index.get("property", "og:locale")
             if og_locale:
                 lang = og_locale
 
         if not lang:
-            html_lang = self.css("html::attr(lang)").get()
+            html_lang = self.parser.get("html::attr(lang)")
             if html_lang:
                 lang = html_lang
 
@@ -339,15 +354,21 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
 
     @field
     def mainImage(self) -> Optional[Dict[str, str]]:
-        content = self.css('meta[property="og:image"]::attr(content)').get()
+        content = self.meta_index.get("property", "og:image")
         if not content:
             return None
         content = html.unescape(content).strip()
         if not content or content.lower().startswith("data:"):
             return None
-        return {"url": self.urljoin(content)}
-
-    @field
+        url = self.urljoin(content)
+        # Prefer the best variant of the same picture found in the article.
+        key = image_key(url)
+        for image in self.images or []:
+            if image_key(image["url"]) == key:
+                return image
+        return {"url": canonical_images([url])[0]}
+
+    @field(cached=True)
     def images(self) -> Optional[List[Dict[str, str]]]:
         selectors = (
             "picture source, picture img, "
@@ -356,22 +377,12 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
             ".entry-content source, .entry-content img"
         )
         elems = self.css(selectors)
-        groups: Dict[str, Dict[str, List[str]]] = {}
-        order: List[str] = []
+        candidates: List[str] = []
 
         def add_candidate(raw_url: Optional[str]):
             final = _normalize_url(raw_url, self)
-            if not final:
-                return
-            key = _group_key_from_url(final)
-            if key not in groups:
-                groups[key] = {}
-                order.append(key)
-            m = re.search(r"\.([a-zA-Z0-9]+)(?:$|\?)", final)
-            ext = m.group(1).lower() if m else ""
-            lst = groups[key].setdefault(ext, [])
-            if final not in lst:
-                lst.append(final)
+            if final:
+                candidates.append(final)
 
         for el in elems:
             tag = getattr(el.root, "tag", "").lower()
@@ -380,7 +391,7 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
                 for u in _extract_urls_from_srcset(srcset or ""):
                     add_candidate(u)
             else:
-                candidates = [
+                attr_values = [
                     el.attrib.get("data-orig-file"),
                     el.attrib.get("data-large-file"),
                     el.attrib.get("data-medium-file"),
@@ -389,7 +400,7 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
                     el.attrib.get("srcset"),
                     el.attrib.get("src"),
                 ]
-                for cand in candidates:
+                for cand in attr_values:
                     if not cand:
                         continue
                     if "," in cand:
@@ -398,44 +409,19 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
                     else:
                         add_candidate(cand)
 
-        if not order:
-            og = self.css('meta[property="og:image"]::attr(content)').get()
-            final = _normalize_url(og, self)
-            if final:
-                key = _group_key_from_url(final)
-                groups[key] = {final.split(".")[-1].lower(): [final]}
-                order = [key]
-
-        if not order:
-            return None
-
-        images: List[Dict[str, str]] = []
-        preferred_ext_order = ("avif", "jpg", "jpeg", "png", "webp", "gif")
-        for key in order:
-            ext_map = groups.get(key, {})
-
-            def sort_pref(urls: List[str]) -> List[str]:
-                no_size = [u for u in urls if not re.search(r"-\d+x\d+(?:[\.\?]|$)", u)]
-                sized = [u for u in urls if re.search(r"-\d+x\d+(?:[\.\?]|$)", u)]
-                return no_size + sized
-
-            for ext in preferred_ext_order:
-                urls = ext_map.get(ext, [])
-                for u in sort_pref(urls):
-                    images.append({"url": u})
-            for ext in sorted(k for k in ext_map.keys() if k not in preferred_ext_order):
-                for u in sort_pref(ext_map[ext]):
-                    images.append({"url": u})
+        if not candidates:
+            add_candidate(self.meta_index.get("property", "og:image"))
 
+        images = [{"url": url} for url in canonical_images(candidates)]
         return images or None
 
     @field
     def description(self) -> Optional[str]:
-        desc = self.css('meta[name="description"]::attr(content)').get()
+        desc = self.meta_index.get("name", "description")
         if not desc:
-            desc = self.css('meta[property="og:description"]::attr(content)').get()
+            desc = self.meta_index.get("property", "og:description")
         if not desc:
-            desc = self.css('meta[itemprop="description"]::attr(content)').get()
+            desc = self.meta_index.get("itemprop", "description")
         if not desc:
             return None
         cleaned = html.unescape(desc).strip()
@@ -476,23 +462,13 @@ class MacmagazineComBrArticlePage(WebPage, Returns[Article]):
 
     @field
     def canonicalUrl(self) -> Optional[str]:
-        href = self.css('link[rel="canonical"]::attr(href)').get()
-        if href:
-            return self.urljoin(href)
-
-        og_url = self.css('meta[property="og:url"]::attr(content)').get()
-        if og_url:
-            return self.urljoin(og_url)
-
-        jsonld_url = self._extract_url_from_jsonld()
-        if jsonld_url:
-            return self.urljoin(jsonld_url)
-
+        url = CANONICAL_URL_CHAIN(self)
+        if url:
+            return self.urljoin(url)
         return None
 
     def _extract_url_from_jsonld(self) -> Optional[str]:
-        extractor = JsonLdExtractor()
-        data = extractor.extract(self.response.body) or []
+        data = self.parser.json_ld() or []
         for entry in data:
             if not isinstance(entry, dict):
                 continue
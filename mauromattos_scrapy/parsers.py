@@ -0,0 +1,96 @@
+"""Parser backends for page object lookups that return strings.
+
+Page objects mixing in ParserBackendMixin query through ``self.parser``:
+``get``/``getall`` take a CSS query ending in ``::text`` or
+``::attr(name)``, and ``json_ld()`` returns the JSON-LD entries as
+extruct's JsonLdExtractor does. The backend is picked per page class with
+``parser_backend``:
+
+- ``"parsel"`` runs every query through ``WebPage.css`` and parses the body
+  again for JSON-LD, as page objects always did.
+- ``"lxml"`` evaluates queries as XPath compiled once per process directly
+  on the lxml tree parsel already built, without Selector wrappers, and
+  memoizes results per page, so fields sharing a query (the JSON-LD scripts)
+  pay for it once.
+
+``"lxml"`` is not a separate parser: the page is still parsed once, by
+parsel, into the same lxml tree, and the backend only saves work in the
+query layer. Output is therefore identical; fields that need elements or
+XPath keep using ``self.css``/``self.xpath``.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from extruct.jsonld import JsonLdExtractor
+from lxml import etree
+from parsel.csstranslator import css2xpath
+
+# The EXSLT namespaces parsel registers for its XPath queries.
+NAMESPACES = {"re": "http://exslt.org/regular-expressions", "set": "http://exslt.org/sets"}
+
+LD_JSON = 'script[type="application/ld+json"]::text'
+
+
+@lru_cache(maxsize=1024)
+def compile_css(query: str) -> etree.XPath:
+    return etree.XPath(css2xpath(query), namespaces=NAMESPACES, smart_strings=False)
+
+
+class ParselBackend:
+    name = "parsel"
+
+    def __init__(self, page):
+        self.page = page
+
+    def get(self, query: str) -> Optional[str]:
+        return self.page.css(query).get()
+
+    def getall(self, query: str) -> List[str]:
+        return self.page.css(query).getall()
+
+    def json_ld(self) -> List[Any]:
+        return JsonLdExtractor().extract(self.page.response.body)
+
+
+class LxmlBackend:
+    name = "lxml"
+
+    def __init__(self, page):
+        self.root = page.selector.root
+        self._results: Dict[str, List[str]] = {}
+        self._json_ld: Optional[List[Any]] = None
+
+    def _strings(self, query: str) -> List[str]:
+        results = self._results.get(query)
+        if results is None:
+            results = self._results[query] = [str(value) for value in compile_css(query)(self.root)]
+        return results
+
+    def get(self, query: str) -> Optional[str]:
+        results = self._strings(query)
+        return results[0] if results else None
+
+    def getall(self, query: str) -> List[str]:
+        return list(self._strings(query))
+
+    def json_ld(self) -> List[Any]:
+        if self._json_ld is None:
+            self._json_ld = JsonLdExtractor().extract_items(self.root)
+        return self._json_ld
+
+
+PARSER_BACKENDS = {backend.name: backend for backend in (ParselBackend, LxmlBackend)}
+
+
+class ParserBackendMixin:
+    """Gives a page object a ``parser`` backend built on first use."""
+
+    parser_backend = "parsel"
+
+    @property
+    def parser(self):
+        backend = getattr(self, "_parser", None)
+        if backend is None:
+            backend = self._parser = PARSER_BACKENDS[self.parser_backend](self)
+        return backend
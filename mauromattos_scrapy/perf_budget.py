@@ -0,0 +1,113 @@
+"""pytest plugin enforcing per-fixture performance budgets.
+
+Each fixture directory (``fixtures/<page class>/test-N/``) may hold a
+``perf.json`` next to ``inputs/``::
+
+    {"url": "https://...", "max_ms": 12.5, "max_alloc_kib": 900}
+
+``max_ms`` bounds the median wall time of ``to_item()`` over several rounds
+and ``max_alloc_kib`` the peak memory traced while it runs. Run pytest with
+``--perf-update`` to (re)write the budgets from the current timings.
+"""
+
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Type
+
+import pytest
+from web_poet import HttpResponse
+from web_poet.serialization import load_class
+
+PERF_FILE_NAME = "perf.json"
+BODY_PATH = Path("inputs") / "HttpResponse-body.html"
+ROUNDS = 7
+# Budgets written by --perf-update. The time budget is purely relative, so
+# a page fails at the same slowdown (TIME_FACTOR) however fast it is; the
+# median over ROUNDS keeps timer noise well below that.
+TIME_FACTOR = 2.0
+ALLOC_FACTOR = 1.5
+ALLOC_SLACK_KIB = 256
+
+
+class PerfBudgetExceeded(AssertionError):
+    pass
+
+
+def _to_item(page_cls: Type, url: str, body: bytes):
+    page = page_cls(response=HttpResponse(url, body=body, encoding="utf-8"))
+    return asyncio.run(page.to_item())
+
+
+def measure(page_cls: Type, url: str, body: bytes, rounds: int = ROUNDS) -> Dict[str, float]:
+    _to_item(page_cls, url, body)  # warm up imports and caches
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        _to_item(page_cls, url, body)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        _to_item(page_cls, url, body)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": statistics.median(timings), "alloc_kib": peak / 1024}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("perf budgets")
+    group.addoption(
+        "--perf-update",
+        action="store_true",
+        default=False,
+        help=f"Rewrite {PERF_FILE_NAME} budgets from the current measurements",
+    )
+
+
+def pytest_collect_file(file_path: Path, parent):
+    if file_path.name == PERF_FILE_NAME and (file_path.parent / BODY_PATH).exists():
+        return PerfBudgetFile.from_parent(parent, path=file_path)
+    return None
+
+
+class PerfBudgetFile(pytest.File):
+    def collect(self):
+        yield PerfBudgetItem.from_parent(self, name="PERF_BUDGET")
+
+
+class PerfBudgetItem(pytest.Item):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fixture_dir = self.path.parent
+        self.page_cls = load_class(self.fixture_dir.parent.name)
+
+    def runtest(self):
+        budget = json.loads(self.path.read_text(encoding="utf-8"))
+        body = (self.fixture_dir / BODY_PATH).read_bytes()
+        result = measure(self.page_cls, budget["url"], body)
+        if self.config.getoption("perf_update"):
+            budget["max_ms"] = round(result["ms"] * TIME_FACTOR, 2)
+            budget["max_alloc_kib"] = round(result["alloc_kib"] * ALLOC_FACTOR + ALLOC_SLACK_KIB)
+            self.path.write_text(json.dumps(budget, indent=2) + "\n", encoding="utf-8")
+            return
+        if "max_ms" not in budget and "max_alloc_kib" not in budget:
+            pytest.skip(f"no budget in {self.path}, run with --perf-update")
+        errors = []
+        if "max_ms" in budget and result["ms"] > budget["max_ms"]:
+            errors.append(f"to_item() took {result['ms']:.1f} ms, budget {budget['max_ms']} ms")
+        if "max_alloc_kib" in budget and result["alloc_kib"] > budget["max_alloc_kib"]:
+            errors.append(f"to_item() peaked at {result['alloc_kib']:.0f} KiB, budget {budget['max_alloc_kib']} KiB")
+        if errors:
+            raise PerfBudgetExceeded("; ".join(errors))
+
+    def repr_failure(self, excinfo, style=None):
+        if isinstance(excinfo.value, PerfBudgetExceeded):
+            return f"{self.page_cls.__name__}/{self.fixture_dir.name}: {excinfo.value}"
+        return super().repr_failure(excinfo, style)
+
+    def reportinfo(self):
+        return self.path, 0, f"{self.page_cls.__name__}/{self.fixture_dir.name}: perf budget"
@@ -4,10 +4,333 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 
+import asyncio
+import hashlib
+import json
+import logging
+import mimetypes
+import posixpath
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import aiohttp
+
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.reactor import is_asyncio_reactor_installed
+from zyte_common_items import Product
+
+from mauromattos_scrapy.categories import CategoryTable, category_path
+from mauromattos_scrapy.items import nested_get
+from mauromattos_scrapy.matching import build_index, compact_offers, offers_from_item
+from mauromattos_scrapy.price_history import PriceHistory
+from mauromattos_scrapy.recrawl import RecrawlPlanner, fingerprint
+
+logger = logging.getLogger(__name__)
 
 
 class MauromattosScrapyPipeline:
     def process_item(self, item, spider):
         return item
+
+
+class ProductMatchingPipeline:
+    # Streams every product (and casasbahia listing entry) into a GTIN/name
+    # match index shared by all spiders. MATCHING_DIR keeps the offers log
+    # the index is rebuilt from, so runs of different spiders merge, and
+    # products.jsonl: one matched-offer record per product, rewritten on close.
+
+    def __init__(self, crawler, directory: str, min_similarity: float):
+        self.crawler = crawler
+        self.directory = Path(directory)
+        self.min_similarity = min_similarity
+        self.stats = crawler.stats
+        self.index = None
+        self.offers_file = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get("MATCHING_DIR")
+        if not directory:
+            raise NotConfigured
+        return cls(crawler, directory, crawler.settings.getfloat("MATCHING_MIN_SIMILARITY", 0.6))
+
+    def open_spider(self, spider=None):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        offers_path = self.directory / "offers.jsonl"
+        offers = compact_offers(offers_path)
+        self.stats.set_value("matching/offers_loaded", len(offers))
+        self.index = build_index(offers, self.min_similarity)
+        self.offers_file = open(offers_path, "a", encoding="utf-8")
+
+    def process_item(self, item, spider=None):
+        for offer in offers_from_item(item, self.crawler.spider.name):
+            _, matched_by = self.index.add(offer)
+            self.stats.inc_value(f"matching/{matched_by}")
+            self.offers_file.write(json.dumps(offer._asdict(), ensure_ascii=False) + "\n")
+        return item
+
+    def close_spider(self, spider=None):
+        self.offers_file.close()
+        products_path = self.directory / "products.jsonl"
+        tmp_path = products_path.with_name(products_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as products:
+            for product in self.index.products:
+                products.write(json.dumps(product.asdict(), ensure_ascii=False) + "\n")
+        tmp_path.replace(products_path)
+        self.stats.set_value("matching/products", len(self.index))
+
+
+class RecrawlObservationPipeline:
+    # Records each product's price and availability in the RECRAWL_DB
+    # planner, which learns per-URL change rates from consecutive visits.
+
+    batch_size = 200
+
+    def __init__(self, path: str, stats):
+        self.path = path
+        self.stats = stats
+        self.planner = None
+        self.pending = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("RECRAWL_DB")
+        if not path:
+            raise NotConfigured
+        return cls(path, crawler.stats)
+
+    def open_spider(self, spider=None):
+        self.planner = RecrawlPlanner(self.path)
+
+    def process_item(self, item, spider=None):
+        if isinstance(item, Product) and item.url:
+            self.pending.append((item.url, fingerprint(item.price, item.availability), time.time()))
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+        return item
+
+    def _flush(self):
+        new, changed = self.planner.observe_many(self.pending)
+        self.stats.inc_value("recrawl/new", new)
+        self.stats.inc_value("recrawl/changed", changed)
+        self.stats.inc_value("recrawl/unchanged", len(self.pending) - new - changed)
+        self.pending = []
+
+    def close_spider(self, spider=None):
+        if self.pending:
+            self._flush()
+        self.planner.close()
+
+
+class PriceHistoryPipeline:
+    # Appends each product's price and availability to the columnar
+    # PRICE_HISTORY_DIR store, one observation per item.
+
+    def __init__(self, directory: str, stats):
+        self.directory = directory
+        self.stats = stats
+        self.history = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get("PRICE_HISTORY_DIR")
+        if not directory:
+            raise NotConfigured
+        return cls(directory, crawler.stats)
+
+    def open_spider(self, spider=None):
+        self.history = PriceHistory(self.directory)
+        self.history.lock()
+
+    def process_item(self, item, spider=None):
+        if isinstance(item, Product):
+            sku = item.sku or item.productId or item.url
+            if sku:
+                self.history.append(sku, time.time(), item.price, item.availability)
+                self.stats.inc_value("price_history/observations")
+        return item
+
+    def close_spider(self, spider=None):
+        self.history.close()
+        self.stats.set_value("price_history/skus", len(self.history.skus))
+
+
+class CategoryDictionaryPipeline:
+    # Export mode for large catalog crawls: replaces the breadcrumbs of each
+    # item with a categoryId from the CATEGORIES_DB side table, shared by all
+    # runs and spiders. Items leave this pipeline as plain dicts, so it goes
+    # after every pipeline that expects the item classes.
+
+    def __init__(self, path: str, stats):
+        self.path = path
+        self.stats = stats
+        self.table = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("CATEGORIES_DB")
+        if not path:
+            raise NotConfigured
+        return cls(path, crawler.stats)
+
+    def open_spider(self, spider=None):
+        self.table = CategoryTable(self.path)
+
+    def process_item(self, item, spider=None):
+        adapter = ItemAdapter(item)
+        breadcrumbs = adapter.get("breadcrumbs")
+        if not breadcrumbs:
+            return item
+        category_id, added = self.table.id_for(category_path(breadcrumbs))
+        if added:
+            self.stats.inc_value("categories/new")
+        data = adapter.asdict()
+        del data["breadcrumbs"]
+        data["categoryId"] = category_id
+        return data
+
+    def close_spider(self, spider=None):
+        self.stats.set_value("categories/total", len(self.table))
+        self.table.close()
+
+
+def _image_urls(item):
+    adapter = ItemAdapter(item)
+    urls = []
+    for image in [adapter.get("mainImage")] + list(adapter.get("images") or []):
+        url = nested_get(image, "url") if image is not None else None
+        if url and url.startswith(("http://", "https://")) and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def _extension(url: str, content_type: str | None) -> str:
+    ext = posixpath.splitext(urlsplit(url).path)[1].lower()
+    if not ext or len(ext) > 6:
+        ext = mimetypes.guess_extension((content_type or "").split(";")[0].strip()) or ""
+    return ext
+
+
+class ImageDownloadPipeline:
+    # Downloads item images in the background on the asyncio loop Scrapy
+    # runs on: items are returned at once and only wait for image I/O when
+    # IMAGES_MAX_PENDING downloads are already queued, which holds the
+    # scraper back instead of piling up tasks.
+    # Files are stored by SHA-256 under IMAGES_STORE_DIR, so the same picture
+    # behind different URLs is kept once; index.jsonl maps URLs to hashes
+    # and is reloaded on start, so URLs fetched by earlier runs are skipped.
+
+    def __init__(self, store_dir: str, concurrency: int, per_host: int, timeout: float, max_pending: int, stats):
+        self.store_dir = Path(store_dir)
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.stats = stats
+        self.known = {}
+        self.hashes = set()
+        self.pending = set()
+        self.session = None
+        self.index_file = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        store_dir = settings.get("IMAGES_STORE_DIR")
+        if not store_dir:
+            raise NotConfigured
+        if not is_asyncio_reactor_installed():
+            raise NotConfigured("ImageDownloadPipeline requires the asyncio reactor")
+        return cls(
+            store_dir,
+            concurrency=settings.getint("IMAGES_CONCURRENCY", 32),
+            per_host=settings.getint("IMAGES_CONCURRENCY_PER_HOST", 8),
+            timeout=settings.getfloat("IMAGES_TIMEOUT", 30.0),
+            max_pending=settings.getint("IMAGES_MAX_PENDING", 256),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, spider=None):
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        index_path = self.store_dir / "index.jsonl"
+        if index_path.exists():
+            with open(index_path, encoding="utf-8") as lines:
+                for line in lines:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.known[entry["url"]] = entry["sha256"]
+                        self.hashes.add(entry["sha256"])
+        self.index_file = open(index_path, "a", encoding="utf-8")
+
+    def _session(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    async def process_item(self, item, spider=None):
+        for url in _image_urls(item):
+            if url in self.known:
+                self.stats.inc_value("images/already_stored")
+                continue
+            while len(self.pending) >= self.max_pending:
+                self.stats.inc_value("images/backpressure_waits")
+                await asyncio.wait(self.pending, return_when=asyncio.FIRST_COMPLETED)
+            if url in self.known:
+                self.stats.inc_value("images/already_stored")
+                continue
+            self.known[url] = None
+            task = asyncio.ensure_future(self._download(url))
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+        return item
+
+    async def _download(self, url: str):
+        try:
+            async with self._session().get(url) as response:
+                response.raise_for_status()
+                body = await response.read()
+                content_type = response.headers.get("Content-Type")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            del self.known[url]
+            self.stats.inc_value("images/failed")
+            logger.debug("Image download failed for %s: %s", url, exc)
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        if digest in self.hashes:
+            self.stats.inc_value("images/duplicate_content")
+        else:
+            self.hashes.add(digest)
+            path = self.store_dir / digest[:2] / (digest + _extension(url, content_type))
+            try:
+                await asyncio.to_thread(self._write, path, body)
+            except OSError as exc:
+                self.hashes.discard(digest)
+                del self.known[url]
+                self.stats.inc_value("images/failed")
+                logger.warning("Could not store image %s: %s", url, exc)
+                return
+            self.stats.inc_value("images/downloaded")
+            self.stats.inc_value("images/bytes", len(body))
+        self.known[url] = digest
+        self.index_file.write(json.dumps({"url": url, "sha256": digest}) + "\n")
+
+    @staticmethod
+    def _write(path: Path, body: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(body)
+        tmp_path.replace(path)
+
+    async def close_spider(self, spider=None):
+        if self.pending:
+            logger.info("Waiting for %d image downloads", len(self.pending))
+            await asyncio.gather(*self.pending, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+        self.index_file.close()
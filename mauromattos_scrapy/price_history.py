@@ -0,0 +1,369 @@
+"""Append-only price/availability history in columnar NumPy chunks.
+
+A store is a directory::
+
+    skus.txt                    one SKU per line; the line number is its id
+    chunk-<ns>-<pid>/sku.npy    int32 SKU id
+                     ts.npy     int64 observation time, Unix seconds
+                     price.npy  int64 price * PRICE_SCALE (MISSING_PRICE if none)
+                     avail.npy  int8 index into AVAILABILITY
+
+Chunks are written whole into a temporary directory and renamed, so readers
+never see a partial chunk, and are loaded with ``mmap_mode="r"``. A chunk
+already in (sku, ts) order, as a compacted one is, is used as mapped; any
+other chunk is sorted on its own. history() reads only the SKU's rows of each
+chunk; summary() and changes() merge the chunks in (sku, ts) order once, and
+answer with whole-array operations, one entry per SKU.
+
+A store has one writer at a time: the first write takes an exclusive
+``flock`` on ``.lock`` in the directory and holds it until close(), and a
+second writer gets StoreLocked instead of assigning SKU ids that clash with
+the first one's. Readers take no lock, and leave the removal of chunks merged
+by an interrupted compact() to the writer.
+"""
+
+import fcntl
+import os
+import shutil
+import time
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+PRICE_SCALE = 100
+MISSING_PRICE = np.iinfo(np.int64).min
+# schema.org ItemAvailability values; anything else is stored as None (0).
+AVAILABILITY = (
+    None,
+    "InStock",
+    "OutOfStock",
+    "PreOrder",
+    "BackOrder",
+    "Discontinued",
+    "LimitedAvailability",
+    "SoldOut",
+    "OnlineOnly",
+    "InStoreOnly",
+    "PreSale",
+)
+AVAILABILITY_CODES = {name: code for code, name in enumerate(AVAILABILITY)}
+COLUMNS = {"sku": np.int32, "ts": np.int64, "price": np.int64, "avail": np.int8}
+CHUNK_ROWS = 1_000_000
+LOCK_FILE_NAME = ".lock"
+
+
+class StoreLocked(RuntimeError):
+    pass
+
+
+def scale_price(price) -> int:
+    """``price`` (a decimal string or number) as an integer number of
+    1/PRICE_SCALE units, or MISSING_PRICE."""
+    if price is None or price == "":
+        return MISSING_PRICE
+    try:
+        value = Decimal(str(price)) * PRICE_SCALE
+        return int(value.to_integral_value(ROUND_HALF_EVEN))
+    except (InvalidOperation, ValueError):
+        return MISSING_PRICE
+
+
+def availability_code(availability: Optional[str]) -> int:
+    if not availability:
+        return 0
+    return AVAILABILITY_CODES.get(availability.rsplit("/", 1)[-1], 0)
+
+
+def _is_sorted(sku: np.ndarray, ts: np.ndarray) -> bool:
+    same_sku = sku[1:] == sku[:-1]
+    return bool(np.all((sku[1:] > sku[:-1]) | (same_sku & (ts[1:] >= ts[:-1]))))
+
+
+def _load_chunk(path: Path) -> Dict[str, np.ndarray]:
+    """A chunk's columns in (sku, ts) order: memory-mapped when the chunk
+    is already in that order, else a sorted copy of this chunk alone."""
+    columns = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in COLUMNS}
+    if _is_sorted(columns["sku"], columns["ts"]):
+        return columns
+    order = np.lexsort((columns["ts"], columns["sku"]))
+    return {name: values[order] for name, values in columns.items()}
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _prices(scaled: np.ndarray) -> np.ndarray:
+    prices = scaled.astype(np.float64) / PRICE_SCALE
+    prices[scaled == MISSING_PRICE] = np.nan
+    return prices
+
+
+def _availability(codes: np.ndarray) -> np.ndarray:
+    return np.array(AVAILABILITY, dtype=object)[codes]
+
+
+class PriceSummary(NamedTuple):
+    """One entry per SKU, in SKU id order. Prices are floats, NaN when the
+    SKU never had one."""
+
+    sku: np.ndarray
+    observations: np.ndarray
+    first_seen: np.ndarray
+    last_seen: np.ndarray
+    min_price: np.ndarray
+    max_price: np.ndarray
+    last_price: np.ndarray
+    last_availability: np.ndarray
+    price_changes: np.ndarray
+    availability_changes: np.ndarray
+
+
+class Changes(NamedTuple):
+    """Observations whose price or availability differ from the previous
+    observation of the same SKU, ordered by SKU then time."""
+
+    sku: np.ndarray
+    ts: np.ndarray
+    old_price: np.ndarray
+    new_price: np.ndarray
+    old_availability: np.ndarray
+    new_availability: np.ndarray
+
+
+class PriceHistory:
+    def __init__(self, directory: str | Path, chunk_rows: int = CHUNK_ROWS):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self.skus_path = self.directory / "skus.txt"
+        self._load_skus()
+        self._new_skus: List[str] = []
+        self._buffer: Dict[str, List[int]] = {name: [] for name in COLUMNS}
+        self._chunks: Optional[Tuple[Tuple[str, ...], List[Dict[str, np.ndarray]]]] = None
+        self._sorted: Optional[Tuple[Tuple[str, ...], Dict[str, np.ndarray]]] = None
+        self._lock_file = None
+
+    def _load_skus(self) -> None:
+        self.skus: List[str] = []
+        if self.skus_path.exists():
+            self.skus = self.skus_path.read_text(encoding="utf-8").splitlines()
+        self.sku_ids: Dict[str, int] = {sku: sku_id for sku_id, sku in enumerate(self.skus)}
+
+    # Writing
+
+    def lock(self) -> None:
+        """Become the store's writer, until close(). Raises StoreLocked if
+        another PriceHistory holds the store. Writes call this first."""
+        if self._lock_file is not None:
+            return
+        lock_file = open(self.directory / LOCK_FILE_NAME, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise StoreLocked(f"price history {self.directory} is open for writing elsewhere") from None
+        self._lock_file = lock_file
+        # SKUs added by the previous writer since this store was opened.
+        self._load_skus()
+        self.chunks()
+
+    def sku_id(self, sku: str) -> int:
+        if self._lock_file is None:
+            self.lock()
+        # skus.txt has one SKU per line.
+        sku = sku.replace("\n", " ").replace("\r", " ")
+        sku_id = self.sku_ids.get(sku)
+        if sku_id is None:
+            sku_id = self.sku_ids[sku] = len(self.skus)
+            self.skus.append(sku)
+            self._new_skus.append(sku)
+        return sku_id
+
+    def append(self, sku: str, ts: float, price=None, availability: Optional[str] = None) -> None:
+        buffer = self._buffer
+        buffer["sku"].append(self.sku_id(str(sku)))
+        buffer["ts"].append(int(ts))
+        buffer["price"].append(scale_price(price))
+        buffer["avail"].append(availability_code(availability))
+        if len(buffer["sku"]) >= self.chunk_rows:
+            self.flush()
+
+    def append_many(self, rows: Iterable[Tuple[str, float, Optional[str], Optional[str]]]) -> None:
+        for sku, ts, price, availability in rows:
+            self.append(sku, ts, price, availability)
+
+    def flush(self) -> None:
+        if not self._buffer["sku"]:
+            return
+        columns = {name: np.array(values, dtype=COLUMNS[name]) for name, values in self._buffer.items()}
+        self._write_chunk(columns)
+        self._buffer = {name: [] for name in COLUMNS}
+
+    def _write_chunk(self, columns: Dict[str, np.ndarray], replaces: Iterable[str] = ()) -> Path:
+        # SKU names go first: a chunk must never refer to an unknown id.
+        if self._new_skus:
+            with open(self.skus_path, "a", encoding="utf-8") as skus_file:
+                skus_file.write("".join(f"{sku}\n" for sku in self._new_skus))
+            self._new_skus = []
+        name = f"chunk-{time.time_ns():020d}-{os.getpid()}"
+        tmp = self.directory / f".{name}.tmp"
+        tmp.mkdir()
+        for column, values in columns.items():
+            np.save(tmp / f"{column}.npy", values)
+        replaces = list(replaces)
+        if replaces:
+            (tmp / "replaces.txt").write_text("".join(f"{chunk}\n" for chunk in replaces), encoding="utf-8")
+        final = self.directory / name
+        os.replace(tmp, final)
+        return final
+
+    def close(self) -> None:
+        self.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the flock
+            self._lock_file = None
+
+    # Reading
+
+    def chunks(self) -> List[Path]:
+        chunks = sorted(path for path in self.directory.glob("chunk-*") if path.is_dir())
+        replaced = set()
+        for path in chunks:
+            if (path / "replaces.txt").exists():
+                replaced.update((path / "replaces.txt").read_text(encoding="utf-8").split())
+        if self._lock_file is not None:
+            # Chunks merged by an interrupted compact() are removed by the
+            # writer; a reader may still have them mapped.
+            for path in chunks:
+                if path.name in replaced:
+                    shutil.rmtree(path, ignore_errors=True)
+        return [path for path in chunks if path.name not in replaced]
+
+    def _load(self) -> List[Dict[str, np.ndarray]]:
+        chunks = self.chunks()
+        key = tuple(path.name for path in chunks)
+        if self._chunks is None or self._chunks[0] != key:
+            loaded = dict(zip(*self._chunks)) if self._chunks is not None else {}
+            self._chunks = (key, [loaded[path.name] if path.name in loaded else _load_chunk(path) for path in chunks])
+            if self._lock_file is None:
+                # A reader picks up the SKUs of chunks written since it opened
+                # the store (skus.txt is written before the chunks).
+                self._load_skus()
+        return self._chunks[1]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """All flushed observations as column arrays, chunk by chunk, each
+        chunk in (sku, ts) order (memory-mapped when the store has a single
+        sorted chunk)."""
+        chunks = self._load()
+        if len(chunks) == 1:
+            return chunks[0]
+        if not chunks:
+            return _empty_columns()
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS}
+
+    def __len__(self) -> int:
+        return sum(len(chunk["sku"]) for chunk in self._load())
+
+    def _by_sku(self) -> Dict[str, np.ndarray]:
+        chunks = self._load()
+        key = self._chunks[0]
+        if self._sorted is None or self._sorted[0] != key:
+            columns = self.columns()
+            if len(chunks) > 1 and not _is_sorted(columns["sku"], columns["ts"]):
+                order = np.lexsort((columns["ts"], columns["sku"]))
+                columns = {name: values[order] for name, values in columns.items()}
+            self._sorted = (key, columns)
+        return self._sorted[1]
+
+    def _names(self, sku_ids: np.ndarray) -> np.ndarray:
+        return np.array(self.skus, dtype=object)[sku_ids] if len(sku_ids) else np.empty(0, dtype=object)
+
+    def history(self, sku: str) -> Changes:
+        """Every observation of ``sku`` in time order, each with the previous
+        one as its old value (NaN/None for the first)."""
+        chunks = self._load()
+        sku_id = self.sku_ids.get(sku, -1)
+        columns = _empty_columns()
+        for chunk in chunks:
+            start, end = np.searchsorted(chunk["sku"], [sku_id, sku_id + 1])
+            for name in COLUMNS:
+                columns[name] = np.concatenate([columns[name], chunk[name][start:end]])
+        order = np.argsort(columns["ts"], kind="stable")
+        columns = {name: values[order] for name, values in columns.items()}
+        price, avail = columns["price"], columns["avail"]
+        old_price = np.r_[np.int64(MISSING_PRICE), price[:-1]] if len(price) else price
+        old_avail = np.r_[np.int8(0), avail[:-1]] if len(avail) else avail
+        return Changes(
+            sku=self._names(columns["sku"]),
+            ts=columns["ts"],
+            old_price=_prices(old_price),
+            new_price=_prices(price),
+            old_availability=_availability(old_avail),
+            new_availability=_availability(avail),
+        )
+
+    def summary(self) -> PriceSummary:
+        columns = self._by_sku()
+        sku, ts, price, avail = columns["sku"], columns["ts"], columns["price"], columns["avail"]
+        if not len(sku):
+            counts, prices, names = np.empty(0, np.int64), np.empty(0), np.empty(0, object)
+            return PriceSummary(names, counts, counts, counts, prices, prices, prices, names, counts, counts)
+        starts = np.flatnonzero(np.r_[True, sku[1:] != sku[:-1]])
+        ends = np.r_[starts[1:], len(sku)] - 1
+        has_price = price != MISSING_PRICE
+        low = np.minimum.reduceat(np.where(has_price, price, np.iinfo(np.int64).max), starts)
+        high = np.maximum.reduceat(price, starts)
+        priced = np.add.reduceat(has_price.astype(np.int64), starts) > 0
+        low = np.where(priced, low, MISSING_PRICE)
+        high = np.where(priced, high, MISSING_PRICE)
+        same_sku = sku[1:] == sku[:-1]
+        price_changed = np.r_[False, same_sku & (price[1:] != price[:-1])]
+        avail_changed = np.r_[False, same_sku & (avail[1:] != avail[:-1])]
+        return PriceSummary(
+            sku=self._names(sku[starts]),
+            observations=ends - starts + 1,
+            first_seen=ts[starts],
+            last_seen=ts[ends],
+            min_price=_prices(low),
+            max_price=_prices(high),
+            last_price=_prices(price[ends]),
+            last_availability=_availability(avail[ends]),
+            price_changes=np.add.reduceat(price_changed.astype(np.int64), starts),
+            availability_changes=np.add.reduceat(avail_changed.astype(np.int64), starts),
+        )
+
+    def changes(self, since: Optional[float] = None) -> Changes:
+        """Price or availability changes, optionally only those observed at
+        or after ``since``."""
+        columns = self._by_sku()
+        sku, ts, price, avail = columns["sku"], columns["ts"], columns["price"], columns["avail"]
+        changed = (sku[1:] == sku[:-1]) & ((price[1:] != price[:-1]) | (avail[1:] != avail[:-1]))
+        if since is not None:
+            changed &= ts[1:] >= since
+        new = np.flatnonzero(changed) + 1
+        old = new - 1
+        return Changes(
+            sku=self._names(sku[new]),
+            ts=ts[new],
+            old_price=_prices(price[old]),
+            new_price=_prices(price[new]),
+            old_availability=_availability(avail[old]),
+            new_availability=_availability(avail[new]),
+        )
+
+    def compact(self) -> int:
+        """Merge all chunks into one, sorted by (sku, ts). Returns the number
+        of chunks merged."""
+        self.lock()
+        self.flush()
+        chunks = self.chunks()
+        if len(chunks) < 2:
+            return 0
+        self._write_chunk(self._by_sku(), replaces=[path.name for path in chunks])
+        self._chunks = self._sorted = None
+        self.chunks()
+        return len(chunks)
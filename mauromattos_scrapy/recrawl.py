@@ -0,0 +1,118 @@
+import heapq
+import math
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+DAY = 86400.0
+# Rate assumed for a catalogue with no observed revisits yet: one change a week.
+DEFAULT_RATE = 1 / (7 * DAY)
+# Weight of the catalogue-wide rate in each URL's estimate, in observed
+# seconds: a URL seen for less than this is mostly judged by the catalogue.
+PRIOR_WEIGHT = 7 * DAY
+
+
+class PlannedUrl(NamedTuple):
+    url: str
+    change_probability: float
+    rate_per_day: float
+
+
+def fingerprint(price: Optional[str], availability: Optional[str]) -> str:
+    return f"{price}|{availability}"
+
+
+class RecrawlPlanner:
+    """Learns how often each URL's price/availability changes and picks the
+    URLs most likely to have changed since they were last fetched.
+
+    Changes are modelled as a Poisson process per URL. Its rate is estimated
+    from the changes seen between consecutive observations, shrunk towards
+    the catalogue-wide rate (a Gamma prior worth PRIOR_WEIGHT of observation
+    time), so new and rarely seen URLs get a sensible rate. A URL last seen
+    ``t`` seconds ago has changed with probability ``1 - exp(-rate * t)``;
+    taking the ``budget`` URLs with the highest probability maximizes the
+    expected number of changes a run of that size detects."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS observations (
+                url TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                observed REAL NOT NULL DEFAULT 0,
+                checks INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def observe_many(self, observations: Iterable[Tuple[str, str, float]]) -> Tuple[int, int]:
+        """Record ``(url, fingerprint, seen_at)`` observations; returns how
+        many URLs were new and how many had changed."""
+        observations = list(observations)
+        new = changed = 0
+        known = {}
+        with self.db:
+            for start in range(0, len(observations), 500):
+                chunk = observations[start : start + 500]
+                urls = [url for url, _, _ in chunk if url not in known]
+                known.update(
+                    self.db.execute(
+                        f"SELECT url, fingerprint FROM observations WHERE url IN ({','.join('?' * len(urls))})", urls
+                    )
+                )
+                for url, value, _ in chunk:
+                    if url not in known:
+                        new += 1
+                    elif known[url] != value:
+                        changed += 1
+                    known[url] = value
+            self.db.executemany(
+                "INSERT INTO observations (url, fingerprint, first_seen, last_seen) VALUES (?1, ?2, ?3, ?3) "
+                "ON CONFLICT(url) DO UPDATE SET "
+                "observed = observed + MAX(excluded.last_seen - last_seen, 0), "
+                "checks = checks + 1, "
+                "changes = changes + (fingerprint != excluded.fingerprint), "
+                "fingerprint = excluded.fingerprint, "
+                "last_seen = MAX(last_seen, excluded.last_seen)",
+                observations,
+            )
+        return new, changed
+
+    def catalogue_rate(self) -> float:
+        changes, observed = self.db.execute("SELECT SUM(changes), SUM(observed) FROM observations").fetchone()
+        if not observed:
+            return DEFAULT_RATE
+        return max(changes / observed, DEFAULT_RATE / 10)
+
+    def plan(self, budget: int, now: Optional[float] = None) -> List[PlannedUrl]:
+        """The ``budget`` URLs most likely to have changed, best first."""
+        now = time.time() if now is None else now
+        prior_rate = self.catalogue_rate()
+        prior_changes = prior_rate * PRIOR_WEIGHT
+
+        def scored():
+            for url, last_seen, observed, changes in self.db.execute(
+                "SELECT url, last_seen, observed, changes FROM observations"
+            ):
+                rate = (changes + prior_changes) / (observed + PRIOR_WEIGHT)
+                probability = 1 - math.exp(-rate * max(now - last_seen, 0))
+                yield PlannedUrl(url, probability, rate * DAY)
+
+        return heapq.nlargest(budget, scored(), key=lambda planned: planned.change_probability)
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
@@ -0,0 +1,51 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple, Type
+
+from url_matcher import URLMatcher
+from web_poet import ApplyRule, consume_modules, default_registry
+
+PAGES_MODULE = "mauromattos_scrapy.pages"
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = PROJECT_ROOT / "fixtures"
+
+
+@lru_cache(maxsize=1)
+def _page_rules() -> Tuple[URLMatcher, List[ApplyRule]]:
+    consume_modules(PAGES_MODULE)
+    rules = [rule for rule in default_registry.get_rules() if rule.instead_of is None and rule.to_return is not None]
+    matcher = URLMatcher()
+    for rule_id, rule in enumerate(rules):
+        matcher.add_or_update(rule_id, rule.for_patterns)
+    return matcher, rules
+
+
+def page_rules() -> List[ApplyRule]:
+    return list(_page_rules()[1])
+
+
+def page_cls_for_url(url: str) -> Optional[Type]:
+    matcher, rules = _page_rules()
+    rule_id = matcher.match(url)
+    if rule_id is None:
+        return None
+    return rules[rule_id].use
+
+
+def page_cls_path(page_cls: Type) -> str:
+    return f"{page_cls.__module__}.{page_cls.__qualname__}"
+
+
+def page_cls_by_path(path: str) -> Optional[Type]:
+    """The registered page object named ``path``; anything else is None."""
+    for rule in page_rules():
+        if page_cls_path(rule.use) == path:
+            return rule.use
+    return None
+
+
+def fixture_bodies(page_cls: Type, fixtures_dir: Path = FIXTURES_DIR) -> List[Path]:
+    base = fixtures_dir / page_cls_path(page_cls)
+    if not base.is_dir():
+        return []
+    return sorted(base.glob("*/inputs/HttpResponse-body.html"))
@@ -0,0 +1,509 @@
+"""Minimal Redis protocol (RESP2) client, and an in-process stand-in server
+implementing the few commands the shared frontier and rate limiter use, so
+multi-worker crawls can be tested without a Redis installation."""
+
+import fnmatch
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+
+class RespError(Exception):
+    pass
+
+
+def _encode(args: Sequence[Any]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def _read_reply(stream) -> Any:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        return RespError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(rest)
+        if count < 0:
+            return None
+        return [_read_reply(stream) for _ in range(count)]
+    raise RespError(f"unexpected reply: {line!r}")
+
+
+class RespClient:
+    """Blocking client for ``redis://[:password@]host[:port][/db]`` URLs.
+    Bulk replies are returned as bytes."""
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", timeout: float = 10.0):
+        parts = urlsplit(url)
+        if parts.scheme != "redis":
+            raise ValueError(f"not a redis:// URL: {url}")
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for reply in self._send(setup):
+            if isinstance(reply, RespError):
+                self.close()
+                raise reply
+
+    def _send(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        if self._sock is None:
+            self._connect()
+        self._sock.sendall(b"".join(_encode(command) for command in commands))
+        return [_read_reply(self._stream) for _ in commands]
+
+    def _locked(self, func: Callable[[], Any]) -> Any:
+        # One reconnect attempt: the server may have closed an idle connection.
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    return func()
+                except (ConnectionError, OSError):
+                    self.close()
+                    if attempt == 2:
+                        raise
+        return None
+
+    def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """Send ``commands`` in one round trip. Command errors are returned
+        in place as RespError instances rather than raised."""
+        if not commands:
+            return []
+        return self._locked(lambda: self._send(commands))
+
+    def transaction(
+        self,
+        watch: Sequence[Any],
+        reads: Sequence[Sequence[Any]],
+        build: Callable[[List[Any]], Sequence[Sequence[Any]]],
+    ) -> Optional[List[Any]]:
+        """Optimistic transaction: WATCH ``watch``, send ``reads``, then run
+        the commands ``build`` makes from their replies in MULTI/EXEC, all on
+        one connection. Returns the EXEC replies, [] if ``build`` returned no
+        commands, or None if another client changed a watched key in
+        between, in which case nothing was applied."""
+
+        def run():
+            replies = self._send([("WATCH", *watch), *reads])
+            for reply in replies:
+                if isinstance(reply, RespError):
+                    self._send([("UNWATCH",)])
+                    raise reply
+            commands = build(replies[1:])
+            if not commands:
+                self._send([("UNWATCH",)])
+                return []
+            result = self._send([("MULTI",), *commands, ("EXEC",)])[-1]
+            if isinstance(result, RespError):
+                raise result
+            return result
+
+        return self._locked(run)
+
+    def execute(self, *args: Any) -> Any:
+        (reply,) = self.pipeline([args])
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class _Simple(str):
+    pass
+
+
+OK = _Simple("OK")
+WRONGTYPE = RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+
+def _reply(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, _Simple):
+        return b"+%s\r\n" % value.encode("utf-8")
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(_reply(item) for item in value)
+    if isinstance(value, float):
+        value = repr(value)
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _score(value: bytes) -> float:
+    text = value.decode().lower()
+    if text in ("-inf", "+inf", "inf"):
+        return float(text)
+    return float(text.lstrip("("))
+
+
+class _Store:
+    """The keyspace of one database; every command runs under one lock."""
+
+    # Commands that modify their key(s), for WATCH.
+    WRITES = frozenset("del expire set incrby incr rpush lpush lpop ltrim sadd srem zadd zrem".split())
+
+    def __init__(self):
+        self.data: Dict[bytes, Any] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.versions: Dict[bytes, int] = {}
+        self.lock = threading.Lock()
+
+    def _get(self, key: bytes, kind: type, create: bool = False):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            del self.expires[key]
+            self.data.pop(key, None)
+        value = self.data.get(key)
+        if value is None:
+            if not create:
+                return None
+            value = self.data[key] = kind()
+        elif not isinstance(value, kind):
+            raise WRONGTYPE
+        return value
+
+    def _drop_empty(self, key: bytes) -> None:
+        if not self.data.get(key):
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    def check(self, args: List[bytes]) -> Optional[RespError]:
+        name = args[0].decode().upper()
+        if not hasattr(self, f"cmd_{name.lower()}"):
+            return RespError(f"ERR unknown command '{name}'")
+        return None
+
+    def _run(self, args: List[bytes]) -> Any:
+        name = args[0].decode().lower()
+        handler = getattr(self, f"cmd_{name}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name.upper()}'")
+        try:
+            return handler(*args[1:])
+        except RespError as exc:
+            return exc
+        except (TypeError, ValueError, IndexError):
+            return RespError(f"ERR wrong arguments for '{name.upper()}' command")
+        finally:
+            if name in self.WRITES:
+                for key in args[1:] if name == "del" else args[1:2]:
+                    self.versions[key] = self.versions.get(key, 0) + 1
+
+    def execute(self, args: List[bytes]) -> Any:
+        with self.lock:
+            return self._run(args)
+
+    def version(self, key: bytes) -> int:
+        with self.lock:
+            return self.versions.get(key, 0)
+
+    def execute_transaction(self, watched: Dict[bytes, int], queued: List[List[bytes]]) -> Any:
+        """EXEC: run ``queued`` as one step, or nothing (None) if a watched
+        key was written since WATCH."""
+        with self.lock:
+            if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                return None
+            return [self._run(args) for args in queued]
+
+    def cmd_ping(self, message: Optional[bytes] = None):
+        return message if message is not None else _Simple("PONG")
+
+    def cmd_auth(self, *args):
+        return OK
+
+    def cmd_select(self, db):
+        return OK
+
+    def cmd_flushdb(self):
+        for key in self.data:
+            self.versions[key] = self.versions.get(key, 0) + 1
+        self.data.clear()
+        self.expires.clear()
+        return OK
+
+    def cmd_keys(self, pattern):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, pattern) and self._get(key, object)]
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._get(key, object) is not None:
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._get(key, object) is not None)
+
+    def cmd_expire(self, key, seconds):
+        if self._get(key, object) is None:
+            return 0
+        self.expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def cmd_get(self, key):
+        return self._get(key, bytes)
+
+    def cmd_set(self, key, value):
+        self.data[key] = value
+        self.expires.pop(key, None)
+        return OK
+
+    def cmd_incrby(self, key, amount):
+        value = int(self._get(key, bytes) or 0) + int(amount)
+        self.data[key] = str(value).encode()
+        return value
+
+    def cmd_incr(self, key):
+        return self.cmd_incrby(key, 1)
+
+    def cmd_rpush(self, key, *values):
+        items = self._get(key, deque, create=True)
+        items.extend(values)
+        return len(items)
+
+    def cmd_lpush(self, key, *values):
+        items = self._get(key, deque, create=True)
+        items.extendleft(values)
+        return len(items)
+
+    def cmd_lpop(self, key, count=None):
+        items = self._get(key, deque)
+        if not items:
+            return None
+        if count is None:
+            value = items.popleft()
+        else:
+            value = [items.popleft() for _ in range(min(int(count), len(items)))]
+        self._drop_empty(key)
+        return value
+
+    def _range(self, items, start, stop) -> slice:
+        start, stop, length = int(start), int(stop), len(items)
+        start = max(0, start + length if start < 0 else start)
+        stop = stop + length if stop < 0 else stop
+        return slice(start, max(start, stop + 1))
+
+    def cmd_lrange(self, key, start, stop):
+        items = self._get(key, deque) or deque()
+        return list(items)[self._range(items, start, stop)]
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self._get(key, deque)
+        if items is not None:
+            self.data[key] = deque(list(items)[self._range(items, start, stop)])
+            self._drop_empty(key)
+        return OK
+
+    def cmd_llen(self, key):
+        return len(self._get(key, deque) or ())
+
+    def cmd_sadd(self, key, *members):
+        items = self._get(key, set, create=True)
+        before = len(items)
+        items.update(members)
+        return len(items) - before
+
+    def cmd_srem(self, key, *members):
+        items = self._get(key, set) or set()
+        before = len(items)
+        items.difference_update(members)
+        self._drop_empty(key)
+        return before - len(items)
+
+    def cmd_sismember(self, key, member):
+        return member in (self._get(key, set) or ())
+
+    def cmd_smembers(self, key):
+        return sorted(self._get(key, set) or ())
+
+    def cmd_scard(self, key):
+        return len(self._get(key, set) or ())
+
+    def cmd_zadd(self, key, *args):
+        options = set()
+        while args and args[0].upper() in (b"NX", b"XX", b"CH"):
+            options.add(args[0].upper())
+            args = args[1:]
+        items = self._get(key, dict, create=True)
+        added = changed = 0
+        for position in range(0, len(args), 2):
+            score, member = float(args[position]), args[position + 1]
+            exists = member in items
+            if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                continue
+            added += not exists
+            changed += not exists or items[member] != score
+            items[member] = score
+        self._drop_empty(key)
+        return changed if b"CH" in options else added
+
+    def cmd_zrem(self, key, *members):
+        items = self._get(key, dict) or {}
+        removed = sum(1 for member in members if items.pop(member, None) is not None)
+        self._drop_empty(key)
+        return removed
+
+    def cmd_zcard(self, key):
+        return len(self._get(key, dict) or ())
+
+    def cmd_zscore(self, key, member):
+        score = (self._get(key, dict) or {}).get(member)
+        return None if score is None else repr(score)
+
+    def cmd_zrangebyscore(self, key, low, high, *options):
+        low_value, high_value = _score(low), _score(high)
+        low_open, high_open = low.startswith(b"("), high.startswith(b"(")
+        members = sorted(
+            (score, member)
+            for member, score in (self._get(key, dict) or {}).items()
+            if (score > low_value if low_open else score >= low_value)
+            and (score < high_value if high_open else score <= high_value)
+        )
+        result = [member for _, member in members]
+        if options and options[0].upper() == b"LIMIT":
+            offset, count = int(options[1]), int(options[2])
+            result = result[offset:] if count < 0 else result[offset : offset + count]
+        return result
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    server: "LocalRespServer"
+
+    def _read_command(self) -> Optional[List[bytes]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _execute(self, args: List[bytes]) -> Any:
+        # WATCH/MULTI/EXEC state belongs to the connection.
+        store = self.server.store
+        name = args[0].decode().upper()
+        if name == "WATCH":
+            if self.queued is not None:
+                return RespError("ERR WATCH inside MULTI is not allowed")
+            for key in args[1:]:
+                self.watched.setdefault(key, store.version(key))
+            return OK
+        if name == "UNWATCH":
+            self.watched = {}
+            return OK
+        if name == "MULTI":
+            if self.queued is not None:
+                return RespError("ERR MULTI calls can not be nested")
+            self.queued = []
+            return OK
+        if name in ("EXEC", "DISCARD"):
+            if self.queued is None:
+                return RespError(f"ERR {name} without MULTI")
+            queued, watched, self.queued, self.watched = self.queued, self.watched, None, {}
+            if name == "DISCARD":
+                return OK
+            if any(isinstance(command, RespError) for command in queued):
+                return RespError("EXECABORT Transaction discarded because of previous errors.")
+            return store.execute_transaction(watched, queued)
+        if self.queued is not None:
+            error = store.check(args)
+            self.queued.append(error or args)
+            return error or _Simple("QUEUED")
+        return store.execute(args)
+
+    def handle(self):
+        self.watched: Dict[bytes, int] = {}
+        self.queued: Optional[List[Any]] = None
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            self.wfile.write(_reply(self._execute(args)))
+            self.wfile.flush()
+
+
+class LocalRespServer(socketserver.ThreadingTCPServer):
+    """In-process stand-in for a Redis server (one database, no
+    persistence), for tests and single-machine multi-worker runs."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _RespHandler)
+        self.store = _Store()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, name="local-resp", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -11,6 +11,7 @@ BOT_NAME = "mauromattos_scrapy"
 
 SPIDER_MODULES = ["mauromattos_scrapy.spiders"]
 NEWSPIDER_MODULE = "mauromattos_scrapy.spiders"
+COMMANDS_MODULE = "mauromattos_scrapy.commands"
 
 import os
 from dotenv import load_dotenv
@@ -26,6 +27,13 @@ ADDONS = {
 }
 
 SCRAPY_POET_DISCOVER = ["mauromattos_scrapy.pages"]
+# Page objects with fallback chains share what they learn per crawler.
+SCRAPY_POET_PROVIDERS = {"mauromattos_scrapy.fallbacks.FallbackStateProvider": 1000}
+
+# Page objects pick their own Zyte API parameters (zyte_api_automap) and fall
+# back to browser rendering when required fields are empty; set to False to
+# send every request with the add-on defaults.
+#ZYTE_API_PROFILES_ENABLED = True
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -53,28 +61,110 @@ DOWNLOAD_DELAY = 1
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "mauromattos_scrapy.middlewares.MauromattosScrapySpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    "mauromattos_scrapy.middlewares.RequestTracingMiddleware": 45,
+    "mauromattos_scrapy.middlewares.MauromattosScrapySpiderMiddleware": 543,
+    "mauromattos_scrapy.middlewares.ZyteApiProfileMiddleware": 550,
+    "mauromattos_scrapy.middlewares.CanonicalUrlMiddleware": 560,
+}
+
+# Requests are rewritten to canonical URLs before scheduling, so variants of
+# one page are downloaded once (CanonicalUrlMiddleware). Mappings learned from
+# redirects and canonicalUrl are kept in CANONICAL_DB for later runs; redirect
+# mappings expire after CANONICAL_REDIRECT_TTL seconds (0 keeps them).
+#URL_CANONICALIZATION_ENABLED = True
+#CANONICAL_DB = "data/canonical.db"
+#CANONICAL_REDIRECT_TTL = 30 * 24 * 3600
+
+# Per-request lifecycle traces (RequestTracingMiddleware, only active when
+# TRACE_FILE is set), in Chrome trace event format for ui.perfetto.dev. A
+# TRACE_SAMPLE_RATE fraction of requests is written, plus every request
+# slower than TRACE_SLOW_THRESHOLD seconds or ending in an error.
+#TRACE_FILE = "data/traces/{spider}.json"
+#TRACE_SAMPLE_RATE = 0.01
+#TRACE_SLOW_THRESHOLD = 10.0
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "mauromattos_scrapy.middlewares.MauromattosScrapyDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # The tracing spider middleware also ends the traces of requests dropped
+    # by downloader middlewares; it sees their exceptions last.
+    "mauromattos_scrapy.middlewares.RequestTracingMiddleware": 10,
+    "mauromattos_scrapy.middlewares.MauromattosScrapyDownloaderMiddleware": 543,
+    "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+    "mauromattos_scrapy.middlewares.DomainRetryBudgetMiddleware": 550,
+    "mauromattos_scrapy.middlewares.SharedRateLimitMiddleware": 560,
+}
+
+# Shared state for multi-worker crawls: a Redis-protocol server holding the
+# per-domain rate windows (SharedRateLimitMiddleware, off unless both are
+# set). Workers share a queue with `-a frontier=redis://...`.
+#SHARED_STATE_URL = "redis://127.0.0.1:6379/0"
+#SHARED_RATE_LIMIT = 10
+
+# Per-domain retry budget, backoff and circuit breaker (DomainRetryBudgetMiddleware)
+#RETRY_BUDGET_RATIO = 0.2
+#RETRY_BUDGET_MIN_TOKENS = 10
+#RETRY_BUDGET_MAX_TOKENS = 100
+#RETRY_BACKOFF_BASE = 1.0
+#RETRY_BACKOFF_MAX = 60.0
+#CIRCUIT_BREAKER_THRESHOLD = 10
+#CIRCUIT_BREAKER_COOLDOWN = 60.0
+#CIRCUIT_BREAKER_MAX_COOLDOWN = 600.0
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "mauromattos_scrapy.extensions.MetricsExporter": 500,
+    "mauromattos_scrapy.extensions.PageArchiveExtension": 510,
+}
+
+# Live crawl metrics (Prometheus text format). The middlewares above only
+# record when METRICS_ENABLED is set; the exporter serves them on
+# METRICS_PORT and/or rewrites METRICS_TEXTFILE every METRICS_INTERVAL seconds.
+METRICS_ENABLED = False
+#METRICS_PORT = 9410
+#METRICS_HOST = "127.0.0.1"
+#METRICS_TEXTFILE = "/var/lib/node_exporter/textfile/mauromattos_scrapy.prom"
+#METRICS_INTERVAL = 10
+
+# Keep the crawled pages in a packed archive for `scrapy reextract`
+# (PageArchiveExtension, only active when PAGE_ARCHIVE_FILE is set).
+#PAGE_ARCHIVE_FILE = "data/archive/{spider}-{time}.mmpa"
+#PAGE_ARCHIVE_LEVEL = 9
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 #ITEM_PIPELINES = {
 #    "mauromattos_scrapy.pipelines.MauromattosScrapyPipeline": 300,
+#    "mauromattos_scrapy.pipelines.RecrawlObservationPipeline": 700,
+#    "mauromattos_scrapy.pipelines.PriceHistoryPipeline": 710,
+#    "mauromattos_scrapy.pipelines.ProductMatchingPipeline": 800,
+#    "mauromattos_scrapy.pipelines.ImageDownloadPipeline": 900,
+#    "mauromattos_scrapy.pipelines.CategoryDictionaryPipeline": 950,
 #}
 
+# Price/availability change history for recrawl planning
+# (RecrawlObservationPipeline, americanas `-a recrawl_budget=N`)
+#RECRAWL_DB = "data/recrawl.db"
+
+# Columnar price/availability history per SKU (PriceHistoryPipeline, `scrapy pricehistory`)
+#PRICE_HISTORY_DIR = "data/price_history"
+
+# Cross-retailer product matching (ProductMatchingPipeline)
+#MATCHING_DIR = "data/matching"
+#MATCHING_MIN_SIMILARITY = 0.6
+
+# Breadcrumbs exported as a categoryId into this side table (CategoryDictionaryPipeline)
+#CATEGORIES_DB = "data/categories.db"
+
+# Background image downloads (ImageDownloadPipeline)
+#IMAGES_STORE_DIR = "data/images"
+#IMAGES_CONCURRENCY = 32
+#IMAGES_CONCURRENCY_PER_HOST = 8
+#IMAGES_TIMEOUT = 30
+#IMAGES_MAX_PENDING = 256
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 #AUTOTHROTTLE_ENABLED = True
@@ -0,0 +1,87 @@
+import gzip
+import io
+from datetime import datetime
+from typing import IO, Iterator, NamedTuple, Optional
+
+from lxml import etree
+
+from mauromattos_scrapy.state import parse_datetime
+
+_CHUNK_SIZE = 64 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class SitemapEntry(NamedTuple):
+    loc: str
+    lastmod: Optional[datetime]
+    is_sitemap: bool
+
+
+class SitemapTooLarge(ValueError):
+    pass
+
+
+def local_name(tag) -> str:
+    if not isinstance(tag, str):
+        return ""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _open_body(body: bytes) -> IO[bytes]:
+    stream = io.BytesIO(body)
+    if body[:2] == _GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def _entry_from_element(elem) -> Optional[SitemapEntry]:
+    loc = None
+    lastmod = None
+    for child in elem:
+        name = local_name(child.tag)
+        if name == "loc" and child.text:
+            loc = child.text.strip()
+        elif name == "lastmod" and child.text:
+            lastmod = parse_datetime(child.text)
+    if not loc:
+        return None
+    return SitemapEntry(loc=loc, lastmod=lastmod, is_sitemap=local_name(elem.tag) == "sitemap")
+
+
+def _drain(parser) -> Iterator[SitemapEntry]:
+    for _, elem in parser.read_events():
+        if local_name(elem.tag) not in ("url", "sitemap"):
+            continue
+        entry = _entry_from_element(elem)
+        # Drop the element and everything parsed before it so a 50k-URL
+        # sitemap never materializes as a full tree.
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+        if entry is not None:
+            yield entry
+
+
+def iter_sitemap(body: bytes, max_size: int = 0) -> Iterator[SitemapEntry]:
+    parser = etree.XMLPullParser(
+        events=("end",),
+        resolve_entities=False,
+        no_network=True,
+        huge_tree=True,
+        recover=True,
+    )
+    read = 0
+    with _open_body(body) as stream:
+        while True:
+            chunk = stream.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            read += len(chunk)
+            if max_size and read > max_size:
+                raise SitemapTooLarge(f"sitemap exceeds {max_size} bytes once decompressed")
+            parser.feed(chunk)
+            yield from _drain(parser)
+    parser.close()
+    yield from _drain(parser)
@@ -1,11 +1,20 @@
+import re
+from datetime import datetime, timezone
 from pathlib import Path
+from urllib.parse import urlparse
 
 import scrapy
 
+from mauromattos_scrapy.frontier import PRIORITY_RECRAWL, FrontierSpiderMixin
 from mauromattos_scrapy.pages.americanas_com_br import AmericanasComBrAmericanasProductItemPage
+from mauromattos_scrapy.recrawl import RecrawlPlanner
+from mauromattos_scrapy.sitemaps import SitemapTooLarge, iter_sitemap
+from mauromattos_scrapy.state import load_state, parse_datetime, save_state
 
+PRODUCT_PATH_RE = re.compile(r"/p/?$")
 
-class AmericanasProductsPageObjectSpider(scrapy.Spider):
+
+class AmericanasProductsPageObjectSpider(FrontierSpiderMixin, scrapy.Spider):
     name = "americanas_products_po"
     allowed_domains = ["americanas.com.br"]
     default_start_urls = [
@@ -13,10 +22,45 @@ class AmericanasProductsPageObjectSpider(scrapy.Spider):
         "https://www.americanas.com.br/smartphone-motorola-moto-g15-256gb-12gb-ram-boost-camera-50mp-com-ai-tela-6-7-nfc-verde-7513301760/p",
         "https://www.americanas.com.br/sofa-3-lugares-retratil-e-reclinavel-pascal-linho-cinza-7476291132/p",
     ]
+    default_sitemap_url = "https://www.americanas.com.br/sitemap.xml"
 
-    def __init__(self, urls: str | None = None, urls_file: str | None = None, *args, **kwargs):
+    def __init__(
+        self,
+        urls: str | None = None,
+        urls_file: str | None = None,
+        discover: str | None = None,
+        sitemap_url: str | None = None,
+        since: str | None = None,
+        state_file: str | None = None,
+        frontier: str | None = None,
+        recrawl_after: str | None = None,
+        recrawl_budget: str | None = None,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
-        if urls:
+        if discover not in (None, "sitemap"):
+            raise ValueError(f"unsupported discover mode: {discover}")
+        self.discover = discover
+        self.sitemap_url = sitemap_url or self.default_sitemap_url
+        self.state_file = state_file
+        self.recrawl_budget = int(recrawl_budget) if recrawl_budget else None
+        self.run_started_at = datetime.now(timezone.utc)
+        self.since = None
+        if since:
+            self.since = parse_datetime(since)
+            if self.since is None:
+                raise ValueError(f"since is not an ISO 8601 date: {since}")
+        elif state_file:
+            self.since = parse_datetime(load_state(state_file).get("sitemap_last_run"))
+
+        if discover or (self.recrawl_budget and not frontier):
+            self.start_urls = []
+        elif frontier:
+            self.start_urls = []
+            seeds = [url.strip() for url in urls.split(",") if url.strip()] if urls else None
+            self.init_frontier(frontier, urls=seeds, urls_file=urls_file, recrawl_after=recrawl_after)
+        elif urls:
             self.start_urls = [url.strip() for url in urls.split(",") if url.strip()]
         elif urls_file:
             file_path = Path(urls_file)
@@ -31,5 +75,63 @@ class AmericanasProductsPageObjectSpider(scrapy.Spider):
         else:
             self.start_urls = list(self.default_start_urls)
 
+    async def start(self):
+        if self.discover == "sitemap":
+            yield scrapy.Request(self.sitemap_url, callback=self.parse_sitemap)
+            return
+        if self.recrawl_budget:
+            planned = self.plan_recrawl()
+            if self.frontier is None:
+                for planned_url in planned:
+                    yield scrapy.Request(planned_url.url, callback=self.parse)
+                return
+            self.frontier.push_many((planned_url.url for planned_url in planned), PRIORITY_RECRAWL, requeue=True)
+        if self.frontier is not None:
+            async for request in self.frontier_start():
+                yield request
+            return
+        async for item_or_request in super().start():
+            yield item_or_request
+
+    def plan_recrawl(self):
+        # Recrawl mode: the RECRAWL_DB URLs most likely to have changed price
+        # or availability since their last visit, best first.
+        path = self.settings.get("RECRAWL_DB")
+        if not path:
+            raise ValueError("recrawl_budget needs the RECRAWL_DB setting")
+        planner = RecrawlPlanner(path)
+        try:
+            planned = planner.plan(self.recrawl_budget)
+        finally:
+            planner.close()
+        expected = sum(planned_url.change_probability for planned_url in planned)
+        self.logger.info("Recrawl plan: %d URLs, %.1f expected changes", len(planned), expected)
+        self.crawler.stats.set_value("recrawl/planned", len(planned))
+        return planned
+
+    def parse_sitemap(self, response):
+        max_size = self.settings.getint("DOWNLOAD_MAXSIZE")
+        try:
+            for entry in iter_sitemap(response.body, max_size=max_size):
+                if self.since and entry.lastmod and entry.lastmod <= self.since:
+                    self.crawler.stats.inc_value("sitemap/unchanged")
+                    continue
+                if entry.is_sitemap:
+                    # Child sitemaps go after the product pages already queued,
+                    # so at most one sitemap's worth of URLs waits in the scheduler.
+                    yield scrapy.Request(entry.loc, callback=self.parse_sitemap, priority=-1)
+                elif PRODUCT_PATH_RE.search(urlparse(entry.loc).path):
+                    self.crawler.stats.inc_value("sitemap/product_urls")
+                    yield scrapy.Request(entry.loc, callback=self.parse)
+        except SitemapTooLarge as exc:
+            self.logger.warning("Stopped reading %s: %s", response.url, exc)
+
     async def parse(self, response, page: AmericanasComBrAmericanasProductItemPage):
-        yield await page.to_item()
\ No newline at end of file
+        yield await page.to_item()
+
+    def closed(self, reason):
+        if self.discover != "sitemap" or not self.state_file or reason != "finished":
+            return
+        state = load_state(self.state_file)
+        state["sitemap_last_run"] = self.run_started_at.isoformat()
+        save_state(self.state_file, state)
@@ -2,10 +2,11 @@ from pathlib import Path
 
 import scrapy
 
+from mauromattos_scrapy.frontier import PRIORITY_LISTING, FrontierSpiderMixin
 from mauromattos_scrapy.pages.casasbahia_com_br import CasasbahiaComBrProductListPage
 
 
-class CasasbahiaProductsPageObjectSpider(scrapy.Spider):
+class CasasbahiaProductsPageObjectSpider(FrontierSpiderMixin, scrapy.Spider):
     name = "casasbahia_products_po"
     allowed_domains = ["casasbahia.com.br"]
     default_start_urls = [
@@ -13,10 +14,23 @@ class CasasbahiaProductsPageObjectSpider(scrapy.Spider):
         "https://www.casasbahia.com.br/c/moveis?filtro=categoria-c93",
         "https://www.casasbahia.com.br/c/telefones-e-celulares?filtro=categoria-c38",
     ]
+    frontier_priority = PRIORITY_LISTING
 
-    def __init__(self, urls: str | None = None, urls_file: str | None = None, *args, **kwargs):
+    def __init__(
+        self,
+        urls: str | None = None,
+        urls_file: str | None = None,
+        frontier: str | None = None,
+        recrawl_after: str | None = None,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
-        if urls:
+        if frontier:
+            self.start_urls = []
+            seeds = [url.strip() for url in urls.split(",") if url.strip()] if urls else None
+            self.init_frontier(frontier, urls=seeds, urls_file=urls_file, recrawl_after=recrawl_after)
+        elif urls:
             self.start_urls = [url.strip() for url in urls.split(",") if url.strip()]
         elif urls_file:
             file_path = Path(urls_file)
@@ -31,5 +45,13 @@ class CasasbahiaProductsPageObjectSpider(scrapy.Spider):
         else:
             self.start_urls = list(self.default_start_urls)
 
+    async def start(self):
+        if self.frontier is not None:
+            async for request in self.frontier_start():
+                yield request
+            return
+        async for item_or_request in super().start():
+            yield item_or_request
+
     async def parse(self, response, page: CasasbahiaComBrProductListPage):
         yield await page.to_item()
@@ -1,22 +1,66 @@
 from pathlib import Path
+from urllib.parse import urlencode
 
 import scrapy
 
+from mauromattos_scrapy.feeds import FeedEntry, advance_mark, iter_feed
+from mauromattos_scrapy.frontier import FrontierSpiderMixin
 from mauromattos_scrapy.pages.macmagazine_com_br import MacmagazineComBrArticlePage
+from mauromattos_scrapy.state import load_state, parse_datetime, save_state
 
 
-class MacmagazineArticlesPageObjectSpider(scrapy.Spider):
+class MacmagazineArticlesPageObjectSpider(FrontierSpiderMixin, scrapy.Spider):
     name = "macmagazine_articles_po"
+    # Feed entries without a date cannot be compared with the high-water
+    # mark, so the links of the latest ones crawled are kept in the state.
+    max_undated_links = 500
     allowed_domains = ["macmagazine.com.br"]
     default_start_urls = [
         "https://macmagazine.com.br/post/2026/02/26/instagram-alertara-pais-sobre-buscas-de-adolescentes-envolvendo-suicidio/",
         "https://macmagazine.com.br/post/2026/02/25/apple-pode-lancar-um-macbook-mais-barato-com-chip-a18-pro-em-2026/",
         "https://macmagazine.com.br/post/2026/02/25/mercado-brasileiro-de-futebol-eletroeafc-25-e-fifa-25/",
     ]
+    default_feed_url = "https://macmagazine.com.br/feed/"
 
-    def __init__(self, urls: str | None = None, urls_file: str | None = None, *args, **kwargs):
+    def __init__(
+        self,
+        urls: str | None = None,
+        urls_file: str | None = None,
+        discover: str | None = None,
+        feed_url: str | None = None,
+        state_file: str | None = None,
+        max_feed_pages: str | int = 10,
+        frontier: str | None = None,
+        recrawl_after: str | None = None,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
-        if urls:
+        if discover not in (None, "feed"):
+            raise ValueError(f"unsupported discover mode: {discover}")
+        self.discover = discover
+        self.feed_url = feed_url or self.default_feed_url
+        self.state_file = state_file
+        self.max_feed_pages = int(max_feed_pages)
+        self.high_water_mark = None
+        self.undated_links: list[str] = []
+        if state_file:
+            state = load_state(state_file)
+            self.high_water_mark = parse_datetime(state.get("feed_high_water_mark"))
+            self.undated_links = list(state.get("feed_undated_links") or [])
+        # Feed entries are pending from the moment they are followed until
+        # their article is parsed; whatever is left when the spider closes
+        # failed and holds the high-water mark back.
+        self.feed_pending: dict[str, FeedEntry] = {}
+        self.feed_done: list[FeedEntry] = []
+
+        if discover:
+            self.start_urls = []
+        elif frontier:
+            self.start_urls = []
+            seeds = [url.strip() for url in urls.split(",") if url.strip()] if urls else None
+            self.init_frontier(frontier, urls=seeds, urls_file=urls_file, recrawl_after=recrawl_after)
+        elif urls:
             self.start_urls = [url.strip() for url in urls.split(",") if url.strip()]
         elif urls_file:
             file_path = Path(urls_file)
@@ -31,5 +75,80 @@ class MacmagazineArticlesPageObjectSpider(scrapy.Spider):
         else:
             self.start_urls = list(self.default_start_urls)
 
+    async def start(self):
+        if self.discover == "feed":
+            yield self._feed_request(1)
+            return
+        if self.frontier is not None:
+            async for request in self.frontier_start():
+                yield request
+            return
+        async for item_or_request in super().start():
+            yield item_or_request
+
+    def _feed_request(self, page_number: int) -> scrapy.Request:
+        url = self.feed_url
+        if page_number > 1:
+            separator = "&" if "?" in url else "?"
+            url = f"{url}{separator}{urlencode({'paged': page_number})}"
+        return scrapy.Request(
+            url,
+            callback=self.parse_feed,
+            cb_kwargs={"page_number": page_number},
+            dont_filter=True,
+        )
+
+    def parse_feed(self, response, page_number: int):
+        entries = list(iter_feed(response.body))
+        reached_known = False
+        undated_links = set(self.undated_links)
+        for entry in entries:
+            link = response.urljoin(entry.link)
+            if entry.published is None:
+                known = link in undated_links
+            else:
+                known = bool(self.high_water_mark and entry.published <= self.high_water_mark)
+            if known:
+                reached_known = reached_known or entry.published is not None
+                self.crawler.stats.inc_value("feed/known_posts")
+                continue
+            if link in self.feed_pending:
+                continue
+            self.crawler.stats.inc_value("feed/new_posts")
+            self.feed_pending[link] = FeedEntry(link=link, published=entry.published)
+            yield scrapy.Request(link, callback=self.parse, meta={"feed_link": link})
+
+        # Only walk back through older feed pages while every post is still
+        # unseen; a first run without a mark just takes the newest page.
+        if entries and not reached_known and self.high_water_mark and page_number < self.max_feed_pages:
+            yield self._feed_request(page_number + 1)
+
     async def parse(self, response, page: MacmagazineComBrArticlePage):
-        yield await page.to_item()
\ No newline at end of file
+        item = await page.to_item()
+        entry = self.feed_pending.pop(response.meta.get("feed_link"), None)
+        if entry is not None:
+            self.feed_done.append(entry)
+        yield item
+
+    def closed(self, reason):
+        if self.discover != "feed" or not self.state_file or reason != "finished":
+            return
+        if self.feed_pending:
+            self.crawler.stats.set_value("feed/failed_posts", len(self.feed_pending))
+        mark = advance_mark(
+            self.high_water_mark,
+            (entry.published for entry in self.feed_done),
+            (entry.published for entry in self.feed_pending.values()),
+        )
+        new_undated = [
+            entry.link
+            for entry in self.feed_done
+            if entry.published is None and entry.link not in self.undated_links
+        ]
+        if mark == self.high_water_mark and not new_undated:
+            return
+        state = load_state(self.state_file)
+        if mark is not None:
+            state["feed_high_water_mark"] = mark.isoformat()
+        state["feed_undated_links"] = (self.undated_links + new_undated)[-self.max_undated_links :]
+        save_state(self.state_file, state)
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from itertools import zip_longest
+from pathlib import Path
+from urllib.parse import urlparse
+
+import scrapy
+from scrapy_poet import callback_for
+from web_poet.pages import get_item_cls
+from zyte_common_items import ProductList
+
+from mauromattos_scrapy.frontier import PRIORITY_DEFAULT, PRIORITY_LISTING, FrontierSpiderMixin
+from mauromattos_scrapy.registry import page_cls_for_url, page_rules
+from mauromattos_scrapy.spiders.americanas_products_po import AmericanasProductsPageObjectSpider
+from mauromattos_scrapy.spiders.casasbahia_products_po import CasasbahiaProductsPageObjectSpider
+from mauromattos_scrapy.spiders.macmagazine_articles_po import MacmagazineArticlesPageObjectSpider
+
+ZYTE_API_SLOT_PREFIX = "zyte-api@"
+
+
+def _rule_domains():
+    domains = []
+    for rule in page_rules():
+        for domain in rule.for_patterns.get_domains():
+            if domain and domain not in domains:
+                domains.append(domain)
+    return domains
+
+
+def _slot_domain(url: str, domains) -> str:
+    host = urlparse(url).hostname or ""
+    for domain in domains:
+        if host == domain or host.endswith("." + domain):
+            return domain
+    return host
+
+
+def _parse_domain_limits(value: str | None) -> dict:
+    limits = {}
+    if not value:
+        return limits
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        domain, sep, concurrency = part.partition("=")
+        if not sep or not concurrency.strip().isdigit() or int(concurrency) < 1:
+            raise ValueError(f"invalid domain limit {part!r}, expected domain=concurrency")
+        limits[domain.strip()] = int(concurrency)
+    return limits
+
+
+class MultiSitePageObjectSpider(FrontierSpiderMixin, scrapy.Spider):
+    name = "multisite_po"
+    default_start_urls = (
+        AmericanasProductsPageObjectSpider.default_start_urls
+        + CasasbahiaProductsPageObjectSpider.default_start_urls
+        + MacmagazineArticlesPageObjectSpider.default_start_urls
+    )
+    custom_settings = {
+        # Pick the next request from the download slot with the fewest
+        # requests in flight, so one large site cannot starve the others.
+        "SCHEDULER_PRIORITY_QUEUE": "scrapy.pqueues.DownloaderAwarePriorityQueue",
+    }
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        limits = _parse_domain_limits(kwargs.get("domain_limits"))
+        if limits:
+            slots = dict(crawler.settings.getdict("DOWNLOAD_SLOTS"))
+            for domain, concurrency in limits.items():
+                for key in (domain, ZYTE_API_SLOT_PREFIX + domain):
+                    slots[key] = {**slots.get(key, {}), "concurrency": concurrency}
+            crawler.settings.set("DOWNLOAD_SLOTS", slots, priority="spider")
+        return super().from_crawler(crawler, *args, **kwargs)
+
+    def __init__(
+        self,
+        urls: str | None = None,
+        urls_file: str | None = None,
+        domain_limits: str | None = None,
+        frontier: str | None = None,
+        recrawl_after: str | None = None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.allowed_domains = _rule_domains()
+        self._callbacks = {}
+        if frontier:
+            self.start_urls = []
+            seeds = [url.strip() for url in urls.split(",") if url.strip()] if urls else None
+            self.init_frontier(frontier, urls=seeds, urls_file=urls_file, recrawl_after=recrawl_after)
+        elif urls:
+            self.start_urls = [url.strip() for url in urls.split(",") if url.strip()]
+        elif urls_file:
+            file_path = Path(urls_file)
+            if not file_path.is_absolute():
+                file_path = Path.cwd() / file_path
+            if not file_path.exists():
+                raise ValueError(f"urls_file not found: {file_path}")
+            file_urls = [line.strip() for line in file_path.read_text(encoding="utf-8").splitlines()]
+            self.start_urls = [line for line in file_urls if line and not line.startswith("#")]
+            if not self.start_urls:
+                raise ValueError(f"urls_file has no valid URLs: {file_path}")
+        else:
+            self.start_urls = list(self.default_start_urls)
+
+    def _callback_for(self, page_cls):
+        callback = self._callbacks.get(page_cls)
+        if callback is None:
+            callback = self._callbacks[page_cls] = callback_for(page_cls)
+        return callback
+
+    def _interleaved_urls(self):
+        by_domain = OrderedDict()
+        for url in self.start_urls:
+            by_domain.setdefault(_slot_domain(url, self.allowed_domains), []).append(url)
+        for batch in zip_longest(*by_domain.values()):
+            for url in batch:
+                if url is not None:
+                    yield url
+
+    def _request(self, url: str, priority: int = 0) -> scrapy.Request | None:
+        page_cls = page_cls_for_url(url)
+        if page_cls is None:
+            self.crawler.stats.inc_value("multisite/unrouted_urls")
+            self.logger.warning("No page object handles %s, skipping", url)
+            return None
+        return scrapy.Request(
+            url,
+            callback=self._callback_for(page_cls),
+            meta={"download_slot": _slot_domain(url, self.allowed_domains)},
+            priority=priority,
+        )
+
+    def frontier_priority_for(self, url: str) -> int:
+        page_cls = page_cls_for_url(url)
+        item_cls = get_item_cls(page_cls) if page_cls is not None else None
+        if isinstance(item_cls, type) and issubclass(item_cls, ProductList):
+            return PRIORITY_LISTING
+        return PRIORITY_DEFAULT
+
+    def make_frontier_request(self, entry):
+        return self._request(entry.url, entry.priority)
+
+    async def start(self):
+        if self.frontier is not None:
+            async for request in self.frontier_start():
+                yield request
+            return
+        for url in self._interleaved_urls():
+            request = self._request(url)
+            if request is not None:
+                yield request
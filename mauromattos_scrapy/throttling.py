@@ -0,0 +1,105 @@
+import random
+import time
+from typing import Callable, Optional
+
+from tenacity import stop_after_attempt
+from zyte_api import RetryFactory
+
+
+class RetryBudget:
+    """Per-domain token bucket for retries: successes deposit ``ratio``
+    tokens, each retry withdraws one, so retries stay a bounded fraction
+    of useful traffic once the initial allowance is spent."""
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10, max_tokens: float = 100):
+        self.ratio = ratio
+        self.max_tokens = max(max_tokens, min_tokens)
+        self.tokens = float(min_tokens)
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 10,
+        cooldown: float = 60.0,
+        max_cooldown: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max(max_cooldown, cooldown)
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def record_success(self) -> bool:
+        """Return True when this success closes an open breaker."""
+        self.failures = 0
+        if self.state == self.OPEN:
+            self.state = self.CLOSED
+            self.cooldown = self.base_cooldown
+            self.opened_at = None
+            return True
+        return False
+
+    def record_failure(self) -> bool:
+        """Return True when this failure (re)opens the breaker."""
+        self.failures += 1
+        if self.state == self.OPEN:
+            # A failed probe: stay open and wait longer before the next one.
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self.opened_at = self.clock()
+            return True
+        if self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = self.clock()
+            return True
+        return False
+
+
+def backoff_delay(failures: int, base: float, maximum: float, rng: random.Random = random) -> float:
+    if failures <= 0:
+        return 0.0
+    ceiling = min(maximum, base * 2 ** (failures - 1))
+    # "Equal jitter": keep half the exponential delay, randomize the rest.
+    return ceiling / 2 + rng.uniform(0, ceiling / 2)
+
+
+class DomainHealth:
+    def __init__(self, budget: RetryBudget, breaker: CircuitBreaker):
+        self.budget = budget
+        self.breaker = breaker
+        self.base_delay: Optional[float] = None
+
+
+class BudgetedRetryFactory(RetryFactory):
+    """Zyte API client retry policy for requests retried by
+    DomainRetryBudgetMiddleware. Throttling and network errors between the
+    crawler and the API are still retried by the client, as they say nothing
+    about the target site; download errors (520/521 and other 5xx) are raised
+    on the first attempt, so the middleware counts each one against the
+    domain and pays for its retries from the domain's budget."""
+
+    download_error_stop = stop_after_attempt(1)
+    undocumented_error_stop = stop_after_attempt(1)
+
+
+BUDGETED_RETRY_POLICY = BudgetedRetryFactory().build()
@@ -0,0 +1,198 @@
+"""Per-request lifecycle spans written as Chrome trace events (the JSON array
+format read by https://ui.perfetto.dev and chrome://tracing).
+
+Every request is one track: a ``request`` span covering its whole life and
+one span per stage it went through (``queue``, ``slot``, ``download``,
+``inject``, ``extract``, ``pipeline``). Retries continue the same track.
+
+Spans are buffered until the request is done, so the sampling decision can
+look at the outcome: a ``sample_rate`` fraction of requests is kept, plus
+every request slower than ``slow_threshold`` seconds or ending in an error.
+"""
+
+import json
+import os
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+STAGES = ("queue", "slot", "download", "inject", "extract", "pipeline")
+# Traces left waiting after a failed download (no retry, no errback) are
+# written after this many idle seconds rather than held until the spider closes.
+ABANDON_AFTER = 300.0
+
+
+class RequestTrace:
+    __slots__ = (
+        "trace_id",
+        "url",
+        "sampled",
+        "started",
+        "updated",
+        "spans",
+        "marks",
+        "pending_items",
+        "output_done",
+        "error",
+    )
+
+    def __init__(self, trace_id: int, url: str, sampled: bool, now: float):
+        self.trace_id = trace_id
+        self.url = url
+        self.sampled = sampled
+        self.started = now
+        self.updated = now
+        self.spans: List[Tuple[str, float, float, Dict[str, Any]]] = []
+        self.marks: Dict[str, float] = {}
+        self.pending_items = 0
+        self.output_done = False
+        self.error: Optional[str] = None
+
+    def stage_times(self) -> Counter:
+        totals: Counter = Counter()
+        for name, start, end, _ in self.spans:
+            totals[name] += end - start
+        return totals
+
+
+class TraceWriter:
+    """Appends events to a JSON array file; the array is closed on close(),
+    but viewers also accept the file of a crawl that was killed."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "w", encoding="utf-8")
+        self.file.write("[")
+        self.count = 0
+
+    def write(self, events: List[Dict[str, Any]]) -> None:
+        for event in events:
+            self.file.write(",\n" if self.count else "\n")
+            self.file.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+            self.count += 1
+
+    def close(self) -> None:
+        self.file.write("\n]\n")
+        self.file.close()
+
+
+class Tracer:
+    def __init__(
+        self,
+        path: str | Path,
+        sample_rate: float = 0.01,
+        slow_threshold: float = 10.0,
+        process_name: str = "",
+        seed: Optional[int] = None,
+    ):
+        self.writer = TraceWriter(path)
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.random = random.Random(seed)
+        self.pid = os.getpid()
+        self.traces: Dict[int, RequestTrace] = {}
+        self.next_id = 1
+        self.started = self.written = self.slow = self.errors = 0
+        self.slow_stages: Counter = Counter()
+        # Spans are timed with perf_counter and written as wall-clock
+        # microseconds, so traces of several workers line up.
+        self._origin = time.time() - time.perf_counter()
+        if process_name:
+            self.writer.write([{"ph": "M", "name": "process_name", "pid": self.pid, "args": {"name": process_name}}])
+
+    @staticmethod
+    def now() -> float:
+        return time.perf_counter()
+
+    def get(self, trace_id: Optional[int]) -> Optional[RequestTrace]:
+        return self.traces.get(trace_id) if trace_id is not None else None
+
+    def start(self, url: str, trace_id: Optional[int] = None) -> RequestTrace:
+        """The trace ``trace_id`` (a retry of a traced request), else a new one."""
+        trace = self.get(trace_id)
+        if trace is not None:
+            trace.error = None
+            return trace
+        if self.started and self.started % 1000 == 0:
+            self.sweep()
+        trace = RequestTrace(self.next_id, url, self.random.random() < self.sample_rate, self.now())
+        self.traces[trace.trace_id] = trace
+        self.next_id += 1
+        self.started += 1
+        return trace
+
+    def mark(self, trace: RequestTrace, stage: str, at: Optional[float] = None) -> None:
+        trace.marks[stage] = self.now() if at is None else at
+        trace.updated = trace.marks[stage]
+
+    def end(self, trace: RequestTrace, stage: str, at: Optional[float] = None, **args: Any) -> None:
+        """Close the span opened by ``mark(trace, stage)``, if any."""
+        start = trace.marks.pop(stage, None)
+        if start is not None:
+            self.span(trace, stage, start, self.now() if at is None else at, **args)
+
+    def span(self, trace: RequestTrace, stage: str, start: float, end: float, **args: Any) -> None:
+        trace.spans.append((stage, start, end, args))
+        trace.updated = max(trace.updated, end)
+
+    def discard(self, trace: RequestTrace) -> None:
+        if self.traces.pop(trace.trace_id, None) is not None:
+            self.started -= 1
+
+    def finish(self, trace: RequestTrace, error: Optional[str] = None) -> None:
+        if self.traces.pop(trace.trace_id, None) is None:
+            return
+        error = error or trace.error
+        end = max(trace.updated, trace.started)
+        total = end - trace.started
+        slow = total >= self.slow_threshold
+        if slow:
+            self.slow += 1
+            stages = trace.stage_times()
+            if stages:
+                self.slow_stages[stages.most_common(1)[0][0]] += 1
+        if error:
+            self.errors += 1
+        if not (trace.sampled or slow or error):
+            return
+        args: Dict[str, Any] = {"url": trace.url, "ms": round(total * 1000, 3)}
+        if error:
+            args["error"] = error
+        if slow:
+            args["slow"] = True
+        events = [
+            {"ph": "M", "name": "thread_name", "pid": self.pid, "tid": trace.trace_id, "args": {"name": trace.url}},
+            self._event("request", trace, trace.started, end, args),
+        ]
+        events.extend(self._event(name, trace, start, stop, span_args) for name, start, stop, span_args in trace.spans)
+        self.writer.write(events)
+        self.written += 1
+
+    def _event(self, name: str, trace: RequestTrace, start: float, end: float, args: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "ph": "X",
+            "name": name,
+            "cat": "request" if name == "request" else "stage",
+            "pid": self.pid,
+            "tid": trace.trace_id,
+            "ts": round((self._origin + start) * 1e6, 1),
+            "dur": round(max(end - start, 0.0) * 1e6, 1),
+            "args": args,
+        }
+
+    def sweep(self, idle: float = ABANDON_AFTER) -> None:
+        """Write the traces of failed downloads nobody picked up again."""
+        cutoff = self.now() - idle
+        abandoned = [
+            trace for trace in self.traces.values() if trace.error and not trace.marks and trace.updated < cutoff
+        ]
+        for trace in abandoned:
+            self.finish(trace)
+
+    def close(self) -> None:
+        for trace in list(self.traces.values()):
+            self.finish(trace, trace.error or ("incomplete" if trace.marks or trace.pending_items else None))
+        self.writer.close()
@@ -0,0 +1,48 @@
+from typing import Dict, Optional, Tuple, Type
+
+import andi
+from itemadapter import ItemAdapter
+
+# Page objects declare the cheapest Zyte API response their fields need as
+# a ``zyte_api_automap`` class attribute, plus the ``zyte_api_required_fields``
+# that must be non-empty for that response to count as good enough. Items
+# missing any of them are fetched again with ``zyte_api_fallback``.
+
+# Raw HTML without response headers: the page objects only read the body,
+# and the response class and encoding are sniffed from the body itself.
+HTTP_RESPONSE_BODY: Dict[str, bool] = {"httpResponseBody": True, "httpResponseHeaders": False}
+BROWSER_HTML: Dict[str, bool] = {"browserHtml": True}
+
+_page_cls_cache: Dict[object, Optional[Type]] = {}
+
+
+def profiled_page_cls(callback) -> Optional[Type]:
+    """Return the first page object in ``callback``'s signature that
+    declares a Zyte API profile."""
+    key = getattr(callback, "__func__", callback)
+    if key in _page_cls_cache:
+        return _page_cls_cache[key]
+    page_cls = None
+    try:
+        plan = andi.inspect(callback)
+    except (TypeError, ValueError):
+        plan = {}
+    for types in plan.values():
+        for cls in types:
+            if isinstance(cls, type) and hasattr(cls, "zyte_api_automap"):
+                page_cls = cls
+                break
+        if page_cls is not None:
+            break
+    _page_cls_cache[key] = page_cls
+    return page_cls
+
+
+def fallback_profile(page_cls: Type) -> Dict[str, bool]:
+    return dict(getattr(page_cls, "zyte_api_fallback", BROWSER_HTML))
+
+
+def missing_fields(page_cls: Type, item) -> Tuple[str, ...]:
+    adapter = ItemAdapter(item)
+    required = getattr(page_cls, "zyte_api_required_fields", ())
+    return tuple(name for name in required if adapter.get(name) in (None, "", [], {}))
@@ -0,0 +1,35 @@
+import asyncio
+
+from web_poet import WebPage, field
+
+from mauromattos_scrapy.alloc_profile import PARSE_FIELD, AllocationReport, profile_page
+
+
+class ScratchPage(WebPage):
+    @field
+    def total(self):
+        # A transient buffer: gone by the time the field returns.
+        scratch = [bytearray(1024) for _ in range(512)]
+        return len(scratch)
+
+    @field
+    def title(self):
+        return self.css("title::text").get()
+
+
+def test_transient_allocations_reach_the_stacks():
+    body = b"<html><head><title>Scratch</title></head></html>"
+    profiles = asyncio.run(profile_page(ScratchPage, "https://example.com/", body))
+    by_field = {profile.field: profile for profile in profiles}
+    assert list(by_field) == [PARSE_FIELD, "total", "title"]
+
+    total = by_field["total"]
+    assert total.peak >= 512 * 1024
+    assert total.retained < 64 * 1024
+    assert all(stack.startswith("ScratchPage;total") for stack in total.stacks)
+    assert sum(total.stacks.values()) >= 0.9 * 512 * 1024
+    assert max(total.stacks, key=total.stacks.get).split(";")[-1].startswith("tests/test_alloc_profile.py:")
+
+    report = AllocationReport()
+    report.add(profiles)
+    assert report.summary()[1].startswith("ScratchPage;total")
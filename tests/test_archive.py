@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from mauromattos_scrapy.archive import FOOTER, ArchiveError, ArchiveReader, ArchiveWriter
+
+# Random bodies do not compress, so every record is larger than the cuts.
+PAGES = [(f"https://example.com/{n}", {"n": n}, random.Random(n).randbytes(500)) for n in range(5)]
+
+
+def write(path, pages, **kwargs):
+    writer = ArchiveWriter(path, **kwargs)
+    for url, meta, body in pages:
+        writer.add(url, body, meta)
+    return writer
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "pages.mmpa"
+    write(path, PAGES).close()
+    with ArchiveReader(path) as reader:
+        assert reader.complete
+        assert reader.urls() == [url for url, _, _ in PAGES]
+        assert [tuple(record) for record in reader] == PAGES
+        assert reader.get("https://example.com/3").meta == {"n": 3}
+        assert reader.get("https://example.com/missing") is None
+
+
+def test_unclosed_archive_is_readable(tmp_path):
+    path = tmp_path / "pages.mmpa"
+    writer = write(path, PAGES)
+    # The process died before close(): every record is on disk, no index.
+    with ArchiveReader(path) as reader:
+        assert not reader.complete
+        assert [tuple(record) for record in reader] == PAGES
+    writer.close()
+
+
+@pytest.mark.parametrize("cut", [1, 10, 100])
+def test_torn_record_is_dropped(tmp_path, cut):
+    path = tmp_path / "pages.mmpa"
+    write(path, PAGES)
+    path.write_bytes(path.read_bytes()[:-cut])
+    with ArchiveReader(path) as reader:
+        assert [tuple(record) for record in reader] == PAGES[:-1]
+
+
+def test_append_continues_an_archive(tmp_path):
+    path = tmp_path / "pages.mmpa"
+    write(path, PAGES[:2]).close()
+    write(path, PAGES[2:3], append=True).close()
+    # A crashed run, torn in the middle of its last record.
+    write(path, PAGES[3:], append=True)
+    path.write_bytes(path.read_bytes()[:-5])
+    writer = write(path, [("https://example.com/new", {}, b"new")], append=True)
+    writer.close()
+    with ArchiveReader(path) as reader:
+        assert reader.complete
+        assert [record.url for record in reader] == [url for url, _, _ in PAGES[:4]] + ["https://example.com/new"]
+
+
+def test_without_append_the_archive_is_replaced(tmp_path):
+    path = tmp_path / "pages.mmpa"
+    write(path, PAGES).close()
+    write(path, PAGES[:1]).close()
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 1
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "pages.mmpa"
+    path.write_bytes(b"")
+    with pytest.raises(ArchiveError):
+        ArchiveReader(path)
+    path.write_bytes(b"PK\x03\x04" + bytes(FOOTER.size))
+    with pytest.raises(ArchiveError):
+        ArchiveReader(path)
@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+from mauromattos_scrapy.canonical import UrlCanonicalizer, normalize_url, url_key
+
+PRODUCT = "https://www.americanas.com.br/produto-azul-123/p"
+
+
+def test_normalize_url():
+    assert (
+        normalize_url("HTTPS://WWW.Americanas.com.br:443/produto-azul-123/p/?utm_source=x&chave=1&cor=azul#fotos")
+        == "https://www.americanas.com.br/produto-azul-123/p?cor=azul"
+    )
+    assert normalize_url("https://macmagazine.com.br/post?gclid=1") == "https://macmagazine.com.br/post/"
+    assert normalize_url("https://macmagazine.com.br/imagem.jpg") == "https://macmagazine.com.br/imagem.jpg"
+
+
+def test_url_key_ignores_product_slug():
+    assert url_key(PRODUCT) == url_key("https://www.americanas.com.br/outro-nome-123/p") == "americanas.com.br#123"
+    assert url_key("https://macmagazine.com.br/post/") == "https://macmagazine.com.br/post/"
+
+
+def test_slug_variants_share_the_first_url_seen():
+    canonicalizer = UrlCanonicalizer()
+    assert canonicalizer.canonicalize(PRODUCT + "?utm_source=x") == PRODUCT
+    assert canonicalizer.canonicalize("https://www.americanas.com.br/outro-nome-123/p") == PRODUCT
+
+
+def test_canonicalize_without_remembering():
+    canonicalizer = UrlCanonicalizer()
+    assert canonicalizer.canonicalize(PRODUCT, remember=False) == PRODUCT
+    assert canonicalizer.seen == {}
+    assert canonicalizer.canonicalize("https://www.americanas.com.br/outro-nome-123/p", remember=False) != PRODUCT
+
+
+def test_learn_follows_same_page_mappings():
+    canonicalizer = UrlCanonicalizer()
+    assert canonicalizer.learn("https://macmagazine.com.br/?p=1", "https://macmagazine.com.br/post/", "redirect")
+    assert canonicalizer.canonicalize("https://macmagazine.com.br/?p=1") == "https://macmagazine.com.br/post/"
+    assert not canonicalizer.learn("https://macmagazine.com.br/?p=1", "https://macmagazine.com.br/post/", "redirect")
+
+
+def test_learn_rejects_other_pages():
+    canonicalizer = UrlCanonicalizer()
+    # Another site, the home page, a listing and another product id.
+    assert not canonicalizer.learn("https://macmagazine.com.br/post/", "https://example.com/post/", "canonical")
+    assert not canonicalizer.learn("https://macmagazine.com.br/post/", "https://macmagazine.com.br/", "redirect")
+    assert not canonicalizer.learn(PRODUCT, "https://www.americanas.com.br/categoria/celulares", "redirect")
+    assert not canonicalizer.learn(PRODUCT, "https://www.americanas.com.br/produto-novo-456/p", "redirect")
+    assert len(canonicalizer) == 0
+
+
+def test_learn_accepts_the_same_product_id():
+    canonicalizer = UrlCanonicalizer()
+    assert canonicalizer.learn(PRODUCT + "?cor=azul", PRODUCT, "canonical")
+    assert canonicalizer.canonicalize(PRODUCT + "?cor=azul") == PRODUCT
+
+
+def test_redirect_mappings_expire(tmp_path):
+    path = tmp_path / "canonical.db"
+    canonicalizer = UrlCanonicalizer(path)
+    canonicalizer.learn("https://macmagazine.com.br/?p=1", "https://macmagazine.com.br/post/", "redirect")
+    canonicalizer.learn("https://macmagazine.com.br/?p=2", "https://macmagazine.com.br/outro/", "canonical")
+    canonicalizer.close()
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE canonical_urls SET updated_at = ?", (time.time() - 3600,))
+
+    kept = UrlCanonicalizer(path, redirect_ttl=7200)
+    assert len(kept) == 2
+    kept.close()
+    expired = UrlCanonicalizer(path, redirect_ttl=60)
+    assert expired.learned == {"https://macmagazine.com.br/?p=2": "https://macmagazine.com.br/outro/"}
+    assert expired.canonicalize("https://macmagazine.com.br/?p=1") == "https://macmagazine.com.br/?p=1"
+    expired.close()
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from mauromattos_scrapy import extraction_server
+from mauromattos_scrapy.extraction_server import ExtractionServer, warm_up
+from mauromattos_scrapy.registry import FIXTURES_DIR
+
+PAGE = "mauromattos_scrapy.pages.americanas_com_br.AmericanasComBrAmericanasProductItemPage"
+URL = "https://www.americanas.com.br/x-123/p"
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ExtractionServer(port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def post(server, payload):
+    request = urllib.request.Request(
+        f"{server.address}extract", data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def test_extract_fixture(server):
+    html = (FIXTURES_DIR / PAGE / "test-1" / "inputs" / "HttpResponse-body.html").read_text(encoding="utf-8")
+    requests = [{"url": URL, "html": html}, {"url": URL, "html": html, "pageObject": PAGE}]
+    routed, named = post(server, {"requests": requests})["results"]
+    assert routed["pageObject"] == named["pageObject"] == PAGE
+    assert routed["item"]["productId"] == "7707265"
+    assert routed["item"]["name"].startswith("Smartphone Samsung Galaxy A26")
+    assert routed["item"] == named["item"]
+    assert "error" not in routed
+
+
+def test_error_results(server):
+    results = post(
+        server,
+        {
+            "requests": [
+                {"url": URL, "html": "<html></html>", "pageObject": "http.server.SimpleHTTPRequestHandler"},
+                {"url": URL, "html": "<html></html>", "pageObject": "collections.OrderedDict"},
+                {"url": "https://example.com/", "html": "<html></html>"},
+                {"url": URL},
+            ]
+        },
+    )["results"]
+    assert [result["error"] for result in results] == [
+        "LookupError: unknown page object: http.server.SimpleHTTPRequestHandler",
+        "LookupError: unknown page object: collections.OrderedDict",
+        "LookupError: no page object handles this URL",
+        "ValueError: missing html or body",
+    ]
+    assert not any("item" in result for result in results)
+
+
+def test_health(server):
+    with urllib.request.urlopen(f"{server.address}health") as response:
+        assert PAGE in json.load(response)["pageObjects"]
+
+
+def test_warm_up_logs_failures(monkeypatch, caplog):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(extraction_server, "extract", broken)
+    with caplog.at_level(logging.ERROR, logger=extraction_server.__name__):
+        assert warm_up() == 0
+    assert "Warm-up of" in caplog.text and "boom" in caplog.text
+
+
+def test_command_serves_on_a_unix_socket(tmp_path):
+    socket_path = tmp_path / "extract.sock"
+    root = Path(__file__).parent.parent
+    process = subprocess.Popen(
+        [sys.executable, "-m", "scrapy", "extractserver", "--no-warmup", "--socket", str(socket_path)],
+        cwd=root,
+        env={**os.environ, "PYTHONPATH": str(root)},
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        for line in process.stderr:
+            if "listening on" in line:
+                break
+        assert f"unix:{socket_path}" in line
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(str(socket_path))
+            client.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            reply = b"".join(iter(lambda: client.recv(65536), b""))
+        assert PAGE in json.loads(reply.split(b"\r\n\r\n", 1)[1])["pageObjects"]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
@@ -0,0 +1,112 @@
+from pathlib import Path
+
+from web_poet import HttpResponse
+
+from mauromattos_scrapy.fallbacks import FallbackChain, FallbackState, FallbackStateProvider
+from mauromattos_scrapy.pages.casasbahia_com_br import CasasbahiaComBrProductListPage
+
+FIXTURE = (
+    Path(__file__).parent.parent
+    / "fixtures"
+    / "mauromattos_scrapy.pages.casasbahia_com_br.CasasbahiaComBrProductListPage"
+    / "test-1"
+    / "inputs"
+    / "HttpResponse-body.html"
+)
+URL = "https://www.casasbahia.com.br/c/x"
+
+
+class Page:
+    def __init__(self, state=None, **values):
+        self.fallback_state = state
+        self.values = values
+        self.tried = []
+
+    def lookup(self, name):
+        self.tried.append(name)
+        return self.values.get(name)
+
+
+def chain(skip_after=3, probe_every=4):
+    return FallbackChain(
+        "TestPage",
+        "field",
+        [(name, lambda page, name=name: page.lookup(name)) for name in ("first", "second")],
+        skip_after=skip_after,
+        probe_every=probe_every,
+    )
+
+
+def test_first_hit_in_priority_order():
+    assert chain()(Page(first="a", second="b")) == "a"
+    assert chain()(Page(second="b")) == "b"
+    assert chain()(Page()) is None
+
+
+def test_missing_strategy_is_skipped_then_probed():
+    fields, state = chain(), FallbackState()
+    for _ in range(3):
+        fields(Page(state, second="b"))
+    pages = [Page(state, second="b") for _ in range(4)]
+    for page in pages:
+        assert fields(page) == "b"
+    # Three pages skip "first"; the fourth probes it.
+    assert [page.tried for page in pages] == [["second"]] * 3 + [["first", "second"]]
+    assert state.stats(fields)[0] == {"strategy": "first", "hits": 0, "misses": 4, "skips": 4, "skipping": True}
+
+
+def test_probe_hit_puts_strategy_back():
+    fields, state = chain(probe_every=1), FallbackState()
+    for _ in range(3):
+        fields(Page(state, second="b"))
+    assert fields(Page(state, first="a", second="b")) == "a"
+    assert not state.stats(fields)[0]["skipping"]
+
+
+def test_skipped_strategy_is_tried_before_giving_up():
+    fields, state = chain(), FallbackState()
+    for _ in range(3):
+        fields(Page(state, second="b"))
+    assert state.stats(fields)[0]["skipping"]
+    assert fields(Page(state, first="a")) == "a"
+    assert not state.stats(fields)[0]["skipping"]
+
+
+def test_state_is_not_shared_between_crawls():
+    fields, crawl, other = chain(), FallbackState(), FallbackState()
+    for _ in range(3):
+        fields(Page(crawl, second="b"))
+    assert state_skipping(crawl, fields) and not state_skipping(other, fields)
+    # Pages without a state learn nothing.
+    for _ in range(10):
+        fields(Page(second="b"))
+    assert not state_skipping(other, fields)
+
+
+def state_skipping(state, fields):
+    return state.stats(fields)[0]["skipping"]
+
+
+def test_provider_gives_one_state_per_crawler():
+    provider = FallbackStateProvider(injector=None)
+    (first,) = provider({FallbackState})
+    (second,) = provider({FallbackState})
+    assert first is second
+    assert FallbackStateProvider(injector=None)({FallbackState})[0] is not first
+
+
+def breadcrumbs(body: bytes, state):
+    page = CasasbahiaComBrProductListPage(response=HttpResponse(URL, body=body, encoding="utf-8"), fallback_state=state)
+    return page.breadcrumbs
+
+
+def test_same_page_same_output_after_a_run_of_misses():
+    body = FIXTURE.read_bytes()
+    odd = b'<html><body><div class="dsvia-breadcrumb"></div><h1>x</h1></body></html>'
+    state = FallbackState()
+    before = breadcrumbs(body, state)
+    assert before
+    for _ in range(60):
+        breadcrumbs(odd, state)
+    assert breadcrumbs(body, state) == before
+    assert breadcrumbs(body, None) == before
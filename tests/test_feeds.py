@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timezone
+
+from scrapy.http import HtmlResponse, XmlResponse
+from scrapy.utils.test import get_crawler
+
+from mauromattos_scrapy.feeds import advance_mark, iter_feed
+from mauromattos_scrapy.spiders.macmagazine_articles_po import MacmagazineArticlesPageObjectSpider
+from mauromattos_scrapy.state import load_state, save_state
+
+FEED_URL = "https://macmagazine.com.br/feed/"
+
+RSS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel>
+  <item><link> https://macmagazine.com.br/post/3/ </link><pubDate>Thu, 26 Feb 2026 12:00:00 +0000</pubDate></item>
+  <item><link>https://macmagazine.com.br/post/2/</link><dc:date>2026-02-25T12:00:00Z</dc:date></item>
+  <item><link>https://macmagazine.com.br/post/1/</link><pubDate>Wed, 25 Feb 2026 08:00:00 +0000</pubDate></item>
+  <item><link>https://macmagazine.com.br/post/undated/</link></item>
+  <item><pubDate>Wed, 25 Feb 2026 08:00:00 +0000</pubDate></item>
+</channel>
+</rss>"""
+
+ATOM = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <link rel="self" href="https://macmagazine.com.br/self/"/>
+    <link href="https://macmagazine.com.br/post/a/"/>
+    <updated>2026-02-26T10:00:00Z</updated>
+  </entry>
+  <entry>
+    <link rel="alternate" href="https://macmagazine.com.br/post/b/"/>
+    <published>2026-02-25T10:00:00Z</published>
+    <updated>2026-02-26T10:00:00Z</updated>
+  </entry>
+</feed>"""
+
+
+def utc(day, hour=12):
+    return datetime(2026, 2, day, hour, tzinfo=timezone.utc)
+
+
+def test_rss_entries():
+    entries = list(iter_feed(RSS))
+    assert [entry.link for entry in entries] == [
+        "https://macmagazine.com.br/post/3/",
+        "https://macmagazine.com.br/post/2/",
+        "https://macmagazine.com.br/post/1/",
+        "https://macmagazine.com.br/post/undated/",
+    ]
+    assert [entry.published for entry in entries] == [utc(26), utc(25), utc(25, 8), None]
+
+
+def test_atom_entries_prefer_published():
+    entries = list(iter_feed(ATOM))
+    assert [entry.link for entry in entries] == [
+        "https://macmagazine.com.br/post/a/",
+        "https://macmagazine.com.br/post/b/",
+    ]
+    assert [entry.published for entry in entries] == [utc(26, 10), utc(25, 10)]
+
+
+def test_advance_mark():
+    assert advance_mark(None, [utc(25), utc(26)], []) == utc(26)
+    assert advance_mark(utc(24), [None], []) == utc(24)
+    # A failed post holds the mark just below itself, whatever succeeded after.
+    assert advance_mark(utc(20), [utc(21), utc(23), utc(26)], [utc(22), utc(25)]) == utc(21)
+    assert advance_mark(utc(20), [utc(26)], [utc(22)]) == utc(20)
+    # Undated failures cannot be compared and do not hold the mark back.
+    assert advance_mark(utc(20), [utc(26)], [None]) == utc(26)
+    # The mark never moves backwards.
+    assert advance_mark(utc(26), [utc(25)], []) == utc(26)
+
+
+def make_spider(state_file):
+    crawler = get_crawler(MacmagazineArticlesPageObjectSpider)
+    crawler.spider = crawler._create_spider(
+        MacmagazineArticlesPageObjectSpider.name, discover="feed", state_file=str(state_file)
+    )
+    return crawler.spider
+
+
+def feed_requests(spider, body):
+    response = XmlResponse(FEED_URL, body=body)
+    requests = list(spider.parse_feed(response, page_number=1))
+    return [request for request in requests if request.callback == spider.parse]
+
+
+class Page:
+    async def to_item(self):
+        return {}
+
+
+def article(spider, request):
+    response = HtmlResponse(request.url, body=b"<html></html>", request=request)
+
+    async def collect():
+        return [item async for item in spider.parse(response, Page())]
+
+    return asyncio.run(collect())
+
+
+def test_failed_post_holds_the_mark(tmp_path):
+    state_file = tmp_path / "state.json"
+    save_state(state_file, {"feed_high_water_mark": utc(24).isoformat()})
+    spider = make_spider(state_file)
+    requests = feed_requests(spider, RSS)
+    assert [request.url for request in requests] == [
+        "https://macmagazine.com.br/post/3/",
+        "https://macmagazine.com.br/post/2/",
+        "https://macmagazine.com.br/post/1/",
+        "https://macmagazine.com.br/post/undated/",
+    ]
+    post3, post2, post1, undated = requests
+    # post/2 fails to download; the newer post/3 is crawled anyway.
+    for request in (post3, post1, undated):
+        article(spider, request)
+    spider.closed("finished")
+
+    state = load_state(state_file)
+    assert state["feed_high_water_mark"] == utc(25, 8).isoformat()
+    assert state["feed_undated_links"] == ["https://macmagazine.com.br/post/undated/"]
+    assert spider.crawler.stats.get_value("feed/failed_posts") == 1
+
+    # The next poll retries post/2 (and post/3) but not post/1 or the
+    # undated post.
+    spider = make_spider(state_file)
+    assert [request.url for request in feed_requests(spider, RSS)] == [
+        "https://macmagazine.com.br/post/3/",
+        "https://macmagazine.com.br/post/2/",
+    ]
+
+
+def test_mark_unchanged_when_the_crawl_does_not_finish(tmp_path):
+    state_file = tmp_path / "state.json"
+    spider = make_spider(state_file)
+    for request in feed_requests(spider, RSS):
+        article(spider, request)
+    spider.closed("shutdown")
+    assert not state_file.exists()
+
+    spider = make_spider(state_file)
+    for request in feed_requests(spider, RSS):
+        article(spider, request)
+    spider.closed("finished")
+    assert load_state(state_file)["feed_high_water_mark"] == utc(26).isoformat()
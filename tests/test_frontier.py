@@ -0,0 +1,165 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from mauromattos_scrapy.frontier import DONE, FAILED, PRIORITY_RECRAWL, SqliteFrontier
+
+
+@pytest.fixture
+def frontier(tmp_path):
+    frontier = SqliteFrontier(tmp_path / "frontier.sqlite")
+    yield frontier
+    frontier.close()
+
+
+def urls(entries):
+    return sorted(entry.url for entry in entries)
+
+
+def test_push_many_ignores_known_urls(frontier):
+    assert frontier.push_many(["https://a.com/1", "https://a.com/2"]) == 2
+    assert frontier.push_many(["https://a.com/2", "https://a.com/3"]) == 1
+    assert frontier.counts() == {"pending": 3}
+
+
+def test_pop_batch_leases_by_priority(frontier):
+    frontier.push_many([("https://a.com/low", 0), ("https://a.com/high", 10)])
+    (entry,) = frontier.pop_batch(1)
+    assert (entry.url, entry.domain, entry.priority) == ("https://a.com/high", "a.com", 10)
+    assert urls(frontier.pop_batch(10)) == ["https://a.com/low"]
+    assert frontier.pop_batch(10) == []
+    assert frontier.counts() == {"in_progress": 2}
+
+
+def test_pop_batch_spreads_over_domains(frontier):
+    frontier.push_many([f"https://www.a.com/{i}" for i in range(10)] + ["https://b.com/1", "https://b.com/2"])
+    domains = [entry.domain for entry in frontier.pop_batch(4)]
+    assert sorted(domains) == ["a.com", "a.com", "b.com", "b.com"]
+
+
+def test_pop_batch_waits_for_due_at(frontier):
+    frontier.push_many(["https://a.com/later"], due_at=2000.0)
+    assert frontier.pop_batch(10, now=1000.0) == []
+    assert urls(frontier.pop_batch(10, now=2000.0)) == ["https://a.com/later"]
+
+
+def test_recover_requeues_only_leased_urls(tmp_path):
+    path = tmp_path / "frontier.sqlite"
+    crashed = SqliteFrontier(path)
+    crashed.push_many([f"https://a.com/{i}" for i in range(4)])
+    leased = crashed.pop_batch(3)
+    crashed.mark([leased[0].url], DONE)
+    crashed.mark([leased[1].url], FAILED)
+    crashed.close()  # leased[2] was in flight when the run stopped
+
+    frontier = SqliteFrontier(path)
+    assert frontier.recover() == 1
+    assert frontier.counts() == {"pending": 2, "done": 1, "failed": 1}
+    assert leased[2].url in urls(frontier.pop_batch(10))
+    frontier.close()
+
+
+def test_requeue_restarts_finished_urls_but_not_leased_ones(frontier):
+    frontier.push_many(["https://a.com/1", "https://a.com/2"])
+    first, second = frontier.pop_batch(2)
+    frontier.mark([first.url], DONE)
+    assert frontier.push_many([first.url, second.url], priority=5, requeue=True) == 2
+    assert frontier.counts() == {"pending": 1, "in_progress": 1}
+    (entry,) = frontier.pop_batch(10)
+    assert (entry.url, entry.priority) == (first.url, 5)
+
+
+def test_schedule_recrawls(frontier):
+    frontier.push_many(["https://a.com/old", "https://a.com/new"])
+    frontier.mark(["https://a.com/old"], DONE)
+    frontier.db.execute("UPDATE frontier SET updated_at = 0 WHERE url = 'https://a.com/old'")
+    frontier.db.commit()
+    assert frontier.schedule_recrawls(older_than=3600) == 1
+    entries = frontier.pop_batch(10)
+    assert [(entry.url, entry.priority) for entry in entries][0] == ("https://a.com/old", PRIORITY_RECRAWL)
+
+
+# A crawl with a slow server and CONCURRENT_REQUESTS=4, in a subprocess
+# since the reactor can only run once. Each response records how many URLs
+# the frontier has leased at that moment.
+CRAWL = """
+import json, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+
+from mauromattos_scrapy.frontier import FrontierSpiderMixin, open_frontier
+from mauromattos_scrapy.resp import LocalRespServer
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(0.1)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+path = sys.argv[1]
+if path == "redis":
+    resp_server = LocalRespServer()
+    resp_server.start()
+    path = resp_server.url
+
+
+class Spider(FrontierSpiderMixin, scrapy.Spider):
+    name = "bounded"
+    leased = []
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        urls = [f"http://127.0.0.1:{server.server_port}/{i}" for i in range(int(sys.argv[2]))]
+        self.init_frontier(path, urls=urls)
+
+    async def start(self):
+        async for request in self.frontier_start():
+            yield request
+
+    def parse(self, response):
+        self.leased.append(self.frontier.counts().get("in_progress", 0))
+        yield {"url": response.url}
+
+
+process = CrawlerProcess({"CONCURRENT_REQUESTS": 4, "CONCURRENT_REQUESTS_PER_DOMAIN": 4, "LOG_LEVEL": "ERROR"})
+process.crawl(Spider)
+process.start()
+frontier = open_frontier(path, prefix="frontier:bounded")
+print(json.dumps({"leased": Spider.leased, "counts": frontier.counts()}))
+"""
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "redis"])
+def test_frontier_start_leases_only_what_the_crawl_can_take(tmp_path, backend):
+    path = tmp_path / "frontier.sqlite" if backend == "sqlite" else "redis"
+    script = tmp_path / "crawl.py"  # Scrapy reads callback sources, so not -c
+    script.write_text(CRAWL)
+    result = subprocess.run(
+        [sys.executable, str(script), str(path), "60"],
+        env={**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    output = json.loads(result.stdout.splitlines()[-1])
+    assert len(output["leased"]) == 60
+    # 2 x CONCURRENT_REQUESTS unanswered, plus answered ones not marked yet.
+    assert max(output["leased"]) <= 2 * 4 + 4
+    assert output["counts"]["done"] == 60
+    assert not output["counts"].get("in_progress")
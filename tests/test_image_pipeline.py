@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import json
+
+import pytest
+from aiohttp import web
+from scrapy.utils.test import get_crawler
+
+from mauromattos_scrapy.pipelines import ImageDownloadPipeline
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def images(request):
+    if request.match_info["name"] == "missing.png":
+        raise web.HTTPNotFound()
+    return web.Response(body=PNG, content_type="image/png")
+
+
+def make_pipeline(tmp_path, max_pending=256):
+    stats = get_crawler().stats
+    pipeline = ImageDownloadPipeline(
+        tmp_path / "images", concurrency=4, per_host=4, timeout=5, max_pending=max_pending, stats=stats
+    )
+    pipeline.open_spider()
+    return pipeline
+
+
+def item(base, *names):
+    return {"mainImage": {"url": f"{base}/{names[0]}"}, "images": [{"url": f"{base}/{name}"} for name in names]}
+
+
+def test_downloads_are_stored_once(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+
+    async def crawl():
+        runner, base = await serve(images)
+        await pipeline.process_item(item(base, "a.png", "b.png", "missing.png"))
+        await pipeline.close_spider()
+        await runner.cleanup()
+        return base
+
+    base = asyncio.run(crawl())
+    digest = hashlib.sha256(PNG).hexdigest()
+    assert (tmp_path / "images" / digest[:2] / f"{digest}.png").read_bytes() == PNG
+    stats = pipeline.stats.get_stats()
+    assert stats["images/downloaded"] == 1
+    assert stats["images/duplicate_content"] == 1
+    assert stats["images/failed"] == 1
+    assert f"{base}/missing.png" not in pipeline.known
+    index = [json.loads(line) for line in (tmp_path / "images" / "index.jsonl").read_text().splitlines()]
+    assert sorted(entry["url"] for entry in index) == [f"{base}/a.png", f"{base}/b.png"]
+
+
+def test_process_item_waits_at_the_high_water_mark(tmp_path):
+    pipeline = make_pipeline(tmp_path, max_pending=2)
+
+    async def crawl():
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return web.Response(body=request.match_info["name"].encode(), content_type="image/png")
+
+        runner, base = await serve(slow)
+        processing = asyncio.ensure_future(pipeline.process_item(item(base, *[f"{n}.png" for n in range(5)])))
+        await asyncio.sleep(0.2)
+        assert not processing.done()
+        assert len(pipeline.pending) == 2
+        release.set()
+        await processing
+        await pipeline.close_spider()
+        await runner.cleanup()
+
+    asyncio.run(crawl())
+    assert pipeline.stats.get_value("images/downloaded") == 5
+    assert pipeline.stats.get_value("images/backpressure_waits") >= 1
+
+
+def test_write_errors_count_as_failures(tmp_path, monkeypatch):
+    pipeline = make_pipeline(tmp_path)
+
+    def full_disk(path, body):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(pipeline, "_write", full_disk)
+
+    async def crawl():
+        runner, base = await serve(images)
+        await pipeline.process_item(item(base, "a.png"))
+        tasks = list(pipeline.pending)
+        await pipeline.close_spider()
+        await runner.cleanup()
+        return tasks
+
+    tasks = asyncio.run(crawl())
+    assert all(task.exception() is None for task in tasks)
+    assert pipeline.stats.get_value("images/failed") == 1
+    assert pipeline.known == {} and pipeline.hashes == set()
+    assert (tmp_path / "images" / "index.jsonl").read_text() == ""
+
+
+@pytest.mark.parametrize("max_pending", [1, 256])
+def test_known_urls_are_skipped(tmp_path, max_pending):
+    pipeline = make_pipeline(tmp_path, max_pending=max_pending)
+
+    async def crawl():
+        runner, base = await serve(images)
+        await pipeline.process_item(item(base, "a.png"))
+        await pipeline.process_item(item(base, "a.png"))
+        await pipeline.close_spider()
+        await runner.cleanup()
+
+    asyncio.run(crawl())
+    assert pipeline.stats.get_value("images/already_stored") == 1
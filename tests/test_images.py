@@ -0,0 +1,97 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from web_poet import HttpResponse
+
+from mauromattos_scrapy.images import canonical_images, image_key
+from mauromattos_scrapy.pages.macmagazine_com_br import MacmagazineComBrArticlePage
+from mauromattos_scrapy.perf_budget import BODY_PATH, PERF_FILE_NAME
+
+FIXTURES = Path(__file__).parent.parent / "fixtures" / "mauromattos_scrapy.pages.macmagazine_com_br.MacmagazineComBrArticlePage"
+UPLOADS = "https://macmagazine.com.br/wp-content/uploads/"
+LOGOS = [UPLOADS + "2024/01/logomm_light@2x.png", UPLOADS + "2024/01/logomm_dark@2x.png"]
+SIDEBAR = [UPLOADS + "2023/11/07-apple-studio-display-scaled.jpg", UPLOADS + "2026/02/20-claude-cowork.jpg"]
+
+
+def test_wordpress_variants():
+    urls = [
+        UPLOADS + "2026/02/foto-600x351.jpg.webp",
+        UPLOADS + "2026/02/foto-1260x788.jpg",
+        UPLOADS + "2026/02/foto.jpg.avif",
+        UPLOADS + "2026/02/foto.jpg",
+        UPLOADS + "2026/02/outra-scaled.jpg",
+        UPLOADS + "2026/02/outra-300x200.jpg",
+    ]
+    assert canonical_images(urls) == [UPLOADS + "2026/02/foto.jpg", UPLOADS + "2026/02/outra-scaled.jpg"]
+    assert image_key(urls[0]) == image_key(urls[3])
+
+
+def test_vtex_and_cdn_variants():
+    assert canonical_images(
+        [
+            "https://americanas.vtexassets.com/arquivos/ids/123-500-500/produto.jpg?v=1",
+            "https://americanas.vtexassets.com/arquivos/ids/123/produto.jpg?v=1",
+            "https://cdn.example.com/a.png?width=200&v=2",
+            "https://cdn.example.com/a.png?width=800&v=2",
+        ]
+    ) == [
+        "https://americanas.vtexassets.com/arquivos/ids/123/produto.jpg?v=1",
+        "https://cdn.example.com/a.png?v=2",
+    ]
+
+
+# Every srcset size and re-encoded copy in the fixtures collapses into one
+# URL per picture; lazy-loading placeholders (data: URIs) are dropped.
+EXPECTED = {
+    "test-1": (
+        UPLOADS + "2026/02/26-instagram-alertas-pais-1260x788.jpg",
+        LOGOS
+        + [UPLOADS + f"2026/02/26-instagram-alertas-pais-{n}.jpg" for n in (1, 2, 3, 4)]
+        + [UPLOADS + "2026/02/23-futebol.jpg"]
+        + SIDEBAR
+        + [
+            UPLOADS + "2026/02/25-Low-Cost-A18-Pro-MacBook-Feature-Pink.jpg",
+            UPLOADS + "2025/12/16-iPhone-17-Air-Apple-Store.jpg",
+        ],
+    ),
+    "test-2": (
+        UPLOADS + "2026/02/23-futebol.jpg",
+        LOGOS
+        + [
+            UPLOADS + "2026/02/23-futebol.jpg",
+            UPLOADS + "2026/02/Apple-Sports-BR-home.jpg",
+            UPLOADS + "2026/02/Apple-Sports-BR-Live-Activities.jpg",
+            UPLOADS + "2026/02/Apple-Podcasts-enables-video.jpg",
+        ]
+        + SIDEBAR
+        + [UPLOADS + "2026/02/18-iOS-26.4-Feature.jpg", UPLOADS + "2026/02/19-carplay-apple-tv.jpeg"],
+    ),
+    "test-3": (
+        UPLOADS + "2026/02/20-claude-cowork.jpg",
+        LOGOS
+        + [
+            UPLOADS + "2026/02/20-claude-cowork.jpg",
+            UPLOADS + "2026/01/13-claude-cowork.jpeg",
+            UPLOADS + "2026/02/Apple-Podcasts-enables-video.jpg",
+            SIDEBAR[0],
+            UPLOADS + "2026/02/18-iOS-26.4-Feature.jpg",
+            UPLOADS + "2026/02/19-carplay-apple-tv.jpeg",
+            UPLOADS + "2026/02/16-apple-evento.jpeg",
+        ],
+    ),
+}
+
+
+@pytest.mark.parametrize("test_name", sorted(EXPECTED))
+def test_macmagazine_fixture_images(test_name):
+    test_dir = FIXTURES / test_name
+    url = json.loads((test_dir / PERF_FILE_NAME).read_text())["url"]
+    page = MacmagazineComBrArticlePage(
+        response=HttpResponse(url, body=(test_dir / BODY_PATH).read_bytes(), encoding="utf-8")
+    )
+    item = asyncio.run(page.to_item())
+    main_image, images = EXPECTED[test_name]
+    assert item.mainImage == {"url": main_image}
+    assert [image["url"] for image in item.images] == images
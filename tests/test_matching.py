@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+from zyte_common_items import Product
+
+from mauromattos_scrapy.matching import MatchIndex, compact_offers, make_offer, normalize_gtin
+from mauromattos_scrapy.pipelines import ProductMatchingPipeline
+
+
+def offer(source, url, gtin=None, brand="Samsung", name="Smartphone Samsung Galaxy A15 128GB Preto", price="999.00"):
+    return make_offer(source, url, gtin, brand, name, price, "BRL", "InStock")
+
+
+def test_normalize_gtin():
+    assert normalize_gtin("789-1234567890") == "07891234567890"
+    assert normalize_gtin("012345678905") == "00012345678905"
+    assert normalize_gtin("123") is None
+
+
+def test_index_matches_by_gtin_then_name():
+    index = MatchIndex()
+    product, matched_by = index.add(offer("americanas", "https://a/1", gtin="07891234567890"))
+    assert matched_by == "new"
+    assert index.add(offer("casasbahia", "https://c/1", gtin=normalize_gtin("789 1234567890"), name="Outro nome"))[0] is product
+    same, matched_by = index.add(offer("magalu", "https://m/1", name="Samsung Galaxy A15 128GB Preto Smartphone"))
+    assert (same, matched_by) == (product, "name")
+    other, matched_by = index.add(offer("magalu", "https://m/2", name="Smartphone Samsung Galaxy A25 128GB Preto"))
+    assert matched_by == "new" and other is not product
+    assert len(index) == 2
+
+
+def test_compact_offers_keeps_latest_per_source_and_url(tmp_path):
+    path = tmp_path / "offers.jsonl"
+    rows = [
+        offer("americanas", "https://a/1", price="10.00"),
+        offer("casasbahia", "https://a/1"),
+        offer("americanas", "https://a/2"),
+        offer("americanas", "https://a/1", price="9.00"),
+    ]
+    path.write_text("".join(json.dumps(row._asdict()) + "\n" for row in rows), encoding="utf-8")
+    offers = compact_offers(path)
+    assert [(o.source, o.url, o.price) for o in offers] == [
+        ("americanas", "https://a/1", "9.00"),
+        ("casasbahia", "https://a/1", "999.00"),
+        ("americanas", "https://a/2", "999.00"),
+    ]
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+    assert compact_offers(tmp_path / "missing.jsonl") == []
+
+
+@pytest.fixture
+def crawler(tmp_path):
+    crawler = get_crawler(Spider, {"MATCHING_DIR": str(tmp_path)})
+    crawler.spider = crawler._create_spider("americanas_products_po")
+    return crawler
+
+
+def run(crawler, items):
+    pipeline = ProductMatchingPipeline.from_crawler(crawler)
+    pipeline.open_spider()
+    for item in items:
+        pipeline.process_item(item)
+    pipeline.close_spider()
+    return pipeline
+
+
+def test_pipeline_tags_offers_with_spider_name(crawler, tmp_path):
+    run(crawler, [Product(url="https://a/1", name="Galaxy A15", price="10.00")])
+    (line,) = (tmp_path / "offers.jsonl").read_text(encoding="utf-8").splitlines()
+    assert json.loads(line)["source"] == "americanas_products_po"
+
+
+def test_recrawled_offers_do_not_pile_up(crawler, tmp_path):
+    item = Product(url="https://a/1", name="Galaxy A15", price="10.00")
+    for _ in range(3):
+        pipeline = run(crawler, [item])
+    assert pipeline.stats.get_value("matching/offers_loaded") == 1
+    assert len(pipeline.index) == 1
+    assert len((tmp_path / "offers.jsonl").read_text(encoding="utf-8").splitlines()) == 2
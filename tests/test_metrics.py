@@ -0,0 +1,91 @@
+import pytest
+from scrapy import Request, Spider
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+from zyte_api import RequestError
+
+from mauromattos_scrapy import metrics
+from mauromattos_scrapy.middlewares import MauromattosScrapyDownloaderMiddleware, MauromattosScrapySpiderMiddleware
+
+URL = "https://www.americanas.com.br/produto-1/p"
+
+
+def make(middleware_cls, spider_name):
+    # The registry is process-wide: each test crawls as its own spider.
+    crawler = get_crawler(Spider, {"METRICS_ENABLED": True})
+    crawler.spider = crawler._create_spider(spider_name)
+    return middleware_cls.from_crawler(crawler)
+
+
+def histogram(metric, *labels):
+    samples = {(name, tuple(sample_labels)): value for name, _, sample_labels, value in metric.samples()}
+    return samples.get((f"{metric.name}_count", labels), 0), samples.get((f"{metric.name}_sum", labels), 0.0)
+
+
+def test_disabled_without_metrics_enabled():
+    with pytest.raises(NotConfigured):
+        MauromattosScrapyDownloaderMiddleware.from_crawler(get_crawler(Spider))
+
+
+def test_download_latency_is_the_handler_latency():
+    middleware = make(MauromattosScrapyDownloaderMiddleware, "latency")
+    # A retry of a request that waited 5 s for its slot the first time.
+    request = Request(URL, meta={"download_latency": 5.0})
+    middleware.process_request(request)
+    assert "download_latency" not in request.meta
+    request.meta["download_latency"] = 0.3  # set by the download handler
+    middleware.process_response(request, Response(URL, status=200))
+    assert histogram(metrics.DOWNLOAD_LATENCY, "latency", "americanas.com.br") == (1, 0.3)
+    assert metrics.REQUESTS.value("latency", "americanas.com.br") == 1
+    assert metrics.RESPONSES.value("latency", "americanas.com.br", "200") == 1
+
+
+def test_responses_without_a_download_are_not_timed():
+    middleware = make(MauromattosScrapyDownloaderMiddleware, "cached")
+    request = Request(URL)
+    middleware.process_request(request)
+    middleware.process_response(request, Response(URL, status=200))
+    assert histogram(metrics.DOWNLOAD_LATENCY, "cached", "americanas.com.br") == (0, 0.0)
+
+
+def test_exceptions():
+    middleware = make(MauromattosScrapyDownloaderMiddleware, "errors")
+    request = Request(URL)
+    middleware.process_request(request)
+    request.meta["download_latency"] = 1.5
+    error = RequestError(request_info=None, history=(), status=520, query={}, response_content=b"{}")
+    assert middleware.process_exception(request, error) is None
+    middleware.process_exception(Request(URL), TimeoutError())
+    assert metrics.ZYTE_API_ERRORS.value("errors", "520", "unknown") == 1
+    assert metrics.DOWNLOAD_EXCEPTIONS.value("errors", "americanas.com.br", "RequestError") == 1
+    assert metrics.DOWNLOAD_EXCEPTIONS.value("errors", "americanas.com.br", "TimeoutError") == 1
+    assert histogram(metrics.DOWNLOAD_LATENCY, "errors", "americanas.com.br") == (1, 1.5)
+
+
+def test_spider_middleware_counts_items_and_times_callbacks():
+    middleware = make(MauromattosScrapySpiderMiddleware, "items")
+    response = Response(URL, request=Request(URL))
+    middleware.process_spider_input(response)
+    output = list(middleware.process_spider_output(response, [{"name": "a"}, Request(URL + "?page=2"), {"name": "b"}]))
+    assert len(output) == 3
+    assert metrics.ITEMS.value("items") == 2
+    assert histogram(metrics.EXTRACTION_TIME, "items")[0] == 1
+
+
+def test_render():
+    registry = metrics.MetricsRegistry()
+    registry.counter("pages_total", "Pages.", ("site",)).inc('a"b')
+    registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0)).observe(0.5)
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 0',
+        'latency_seconds_bucket{le="1"} 1',
+        'latency_seconds_bucket{le="+Inf"} 1',
+        "latency_seconds_sum 0.5",
+        "latency_seconds_count 1",
+        "# HELP pages_total Pages.",
+        "# TYPE pages_total counter",
+        'pages_total{site="a\\"b"} 1',
+    ]
@@ -0,0 +1,36 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from itemadapter import ItemAdapter
+from web_poet import HttpResponse
+from web_poet.serialization import load_class
+
+from mauromattos_scrapy.parsers import PARSER_BACKENDS, ParserBackendMixin
+from mauromattos_scrapy.perf_budget import BODY_PATH, PERF_FILE_NAME
+
+FIXTURES = Path(__file__).parent.parent / "fixtures"
+
+
+def backend_fixtures():
+    for page_dir in sorted(FIXTURES.iterdir()):
+        if page_dir.is_dir() and issubclass(load_class(page_dir.name), ParserBackendMixin):
+            for test_dir in sorted(page_dir.iterdir()):
+                if (test_dir / BODY_PATH).exists():
+                    yield pytest.param(page_dir.name, test_dir, id=f"{page_dir.name.rsplit('.', 1)[-1]}/{test_dir.name}")
+
+
+def to_item(page_cls, backend, test_dir):
+    page_cls = type(page_cls.__name__, (page_cls,), {"parser_backend": backend})
+    url = json.loads((test_dir / PERF_FILE_NAME).read_text())["url"]
+    body = (test_dir / BODY_PATH).read_bytes()
+    page = page_cls(response=HttpResponse(url, body=body, encoding="utf-8"))
+    return ItemAdapter(asyncio.run(page.to_item())).asdict()
+
+
+@pytest.mark.parametrize("page_cls_name,test_dir", list(backend_fixtures()))
+def test_backends_extract_the_same_item(page_cls_name, test_dir):
+    page_cls = load_class(page_cls_name)
+    items = {backend: to_item(page_cls, backend, test_dir) for backend in PARSER_BACKENDS}
+    assert items["lxml"] == items["parsel"]
@@ -0,0 +1,63 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from mauromattos_scrapy.perf_budget import BODY_PATH, PERF_FILE_NAME, measure
+from mauromattos_scrapy.pages.americanas_com_br import AmericanasComBrAmericanasProductItemPage
+
+PAGE = "mauromattos_scrapy.pages.americanas_com_br.AmericanasComBrAmericanasProductItemPage"
+FIXTURE = Path(__file__).parent.parent / "fixtures" / PAGE / "test-1"
+URL = "https://www.americanas.com.br/x-123/p"
+
+
+def make_fixture(pytester, budget):
+    fixture_dir = pytester.path / "fixtures" / PAGE / "test-1"
+    (fixture_dir / BODY_PATH).parent.mkdir(parents=True)
+    shutil.copy(FIXTURE / BODY_PATH, fixture_dir / BODY_PATH)
+    perf_file = fixture_dir / PERF_FILE_NAME
+    perf_file.write_text(json.dumps(budget), encoding="utf-8")
+    return perf_file
+
+
+def run(pytester, *args):
+    return pytester.runpytest_inprocess("-p", "mauromattos_scrapy.perf_budget", "fixtures", *args)
+
+
+def test_measure():
+    result = measure(AmericanasComBrAmericanasProductItemPage, URL, (FIXTURE / BODY_PATH).read_bytes(), rounds=2)
+    assert result["ms"] > 0 and result["alloc_kib"] > 0
+
+
+def test_within_budget_passes(pytester):
+    make_fixture(pytester, {"url": URL, "max_ms": 10000, "max_alloc_kib": 1000000})
+    run(pytester).assert_outcomes(passed=1)
+
+
+@pytest.mark.parametrize(
+    "budget, message",
+    [
+        ({"max_ms": 0.001}, "to_item() took"),
+        ({"max_alloc_kib": 1}, "to_item() peaked at"),
+    ],
+)
+def test_over_budget_fails(pytester, budget, message):
+    make_fixture(pytester, {"url": URL, **budget})
+    result = run(pytester)
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines([f"*AmericanasComBrAmericanasProductItemPage/test-1: {message}*"])
+
+
+def test_missing_budget_is_skipped(pytester):
+    make_fixture(pytester, {"url": URL})
+    run(pytester).assert_outcomes(skipped=1)
+
+
+def test_perf_update_writes_budget(pytester):
+    perf_file = make_fixture(pytester, {"url": URL})
+    run(pytester, "--perf-update").assert_outcomes(passed=1)
+    budget = json.loads(perf_file.read_text(encoding="utf-8"))
+    assert budget["url"] == URL
+    assert budget["max_ms"] > 0 and budget["max_alloc_kib"] > 0
+    run(pytester).assert_outcomes(passed=1)
@@ -0,0 +1,134 @@
+import math
+
+import numpy as np
+import pytest
+
+from mauromattos_scrapy.price_history import MISSING_PRICE, PriceHistory, StoreLocked, scale_price
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = PriceHistory(tmp_path / "history", chunk_rows=3)
+    yield history
+    history.close()
+
+
+def fill(history):
+    history.append_many(
+        [
+            ("a", 100, "10.00", "https://schema.org/InStock"),
+            ("b", 100, None, "OutOfStock"),
+            ("a", 200, "9.50", "InStock"),
+            ("a", 300, "9.50", "OutOfStock"),
+            ("b", 300, "5", "InStock"),
+        ]
+    )
+    history.flush()
+
+
+def test_scale_price():
+    assert scale_price("10.005") == 1000
+    assert scale_price(1.5) == 150
+    assert scale_price("") == scale_price("n/a") == MISSING_PRICE
+
+
+def test_summary(history):
+    fill(history)
+    summary = history.summary()
+    assert list(summary.sku) == ["a", "b"]
+    assert list(summary.observations) == [3, 2]
+    assert list(summary.first_seen) == [100, 100]
+    assert list(summary.last_seen) == [300, 300]
+    assert list(summary.min_price) == [9.5, 5.0]
+    assert list(summary.max_price) == [10.0, 5.0]
+    assert list(summary.last_availability) == ["OutOfStock", "InStock"]
+    assert list(summary.price_changes) == [1, 1]
+    assert list(summary.availability_changes) == [1, 1]
+
+
+def test_changes_and_history(history):
+    fill(history)
+    changes = history.changes(since=250)
+    assert list(zip(changes.sku, changes.ts)) == [("a", 300), ("b", 300)]
+    assert list(changes.new_availability) == ["OutOfStock", "InStock"]
+    a = history.history("a")
+    assert list(a.ts) == [100, 200, 300]
+    assert math.isnan(a.old_price[0]) and list(a.new_price) == [10.0, 9.5, 9.5]
+    assert len(history.history("unknown").ts) == 0
+
+
+def test_compact_keeps_observations(history):
+    fill(history)
+    before = history.summary()
+    assert len(history.chunks()) == 2
+    assert history.compact() == 2
+    assert len(history.chunks()) == 1
+    assert len(history) == 5
+    assert list(history.summary().observations) == list(before.observations)
+
+
+def test_interrupted_compact_is_cleaned_up(history):
+    fill(history)
+    chunks = [path.name for path in history.chunks()]
+    # The merged chunk was written but the old ones were not removed yet.
+    history._write_chunk(history._by_sku(), replaces=chunks)
+    reader = PriceHistory(history.directory)
+    assert len(reader.chunks()) == 1
+    assert len(reader) == 5
+    # Readers leave the merged chunks in place; the writer removes them.
+    assert all((history.directory / name).exists() for name in chunks)
+    history.chunks()
+    assert not any((history.directory / name).exists() for name in chunks)
+
+
+def test_sorted_chunk_is_used_as_mapped(history):
+    fill(history)
+    history.compact()
+    reader = PriceHistory(history.directory)
+    columns = reader._by_sku()
+    assert all(isinstance(values, np.memmap) for values in columns.values())
+    assert list(reader.history("b").ts) == [100, 300]
+    assert list(reader.summary().observations) == [3, 2]
+
+
+def test_history_reads_each_chunk(history):
+    fill(history)
+    history.append("a", 50, "11.00")
+    history.flush()
+    assert len(history.chunks()) == 3
+    a = history.history("a")
+    assert list(a.ts) == [50, 100, 200, 300]
+    assert list(a.new_price) == [11.0, 10.0, 9.5, 9.5]
+    assert list(history.summary().first_seen) == [50, 100]
+
+
+def test_sku_with_newline_keeps_its_id(history):
+    history.append("a\nb", 100, "1.00")
+    history.append("a\nb", 200, "2.00")
+    history.close()
+    reopened = PriceHistory(history.directory)
+    assert reopened.skus == ["a b"]
+    reopened.append("a\nb", 300, "3.00")
+    reopened.close()
+    assert list(PriceHistory(history.directory).summary().observations) == [3]
+
+
+def test_second_writer_is_refused(history):
+    history.append("a", 100, "1.00")
+    other = PriceHistory(history.directory)
+    with pytest.raises(StoreLocked):
+        other.append("b", 100, "2.00")
+    with pytest.raises(StoreLocked):
+        other.compact()
+    # Reading needs no lock.
+    history.flush()
+    assert list(other.summary().sku) == ["a"]
+
+
+def test_next_writer_sees_the_skus_of_the_previous_one(history):
+    opened_earlier = PriceHistory(history.directory)
+    history.append("a", 100, "1.00")
+    history.close()
+    opened_earlier.append("b", 200, "2.00")
+    opened_earlier.close()
+    assert list(PriceHistory(history.directory).summary().sku) == ["a", "b"]
@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+from mauromattos_scrapy.recrawl import DAY, DEFAULT_RATE, PRIOR_WEIGHT, RecrawlPlanner, fingerprint
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def planner(tmp_path):
+    planner = RecrawlPlanner(tmp_path / "recrawl.db")
+    yield planner
+    planner.close()
+
+
+def test_observe_many_counts_new_and_changed(planner):
+    assert planner.observe_many([("a", fingerprint("10", "InStock"), T0), ("b", fingerprint("5", None), T0)]) == (2, 0)
+    # "a" changes twice within one batch; "b" is unchanged.
+    assert planner.observe_many(
+        [
+            ("a", fingerprint("9", "InStock"), T0 + DAY),
+            ("b", fingerprint("5", None), T0 + DAY),
+            ("a", fingerprint("9", "OutOfStock"), T0 + 2 * DAY),
+        ]
+    ) == (0, 2)
+    assert len(planner) == 2
+    row = planner.db.execute("SELECT observed, checks, changes FROM observations WHERE url = 'a'").fetchone()
+    assert row == (2 * DAY, 2, 2)
+
+
+def test_catalogue_rate(planner):
+    planner.observe_many([("a", "x", T0)])
+    assert planner.catalogue_rate() == DEFAULT_RATE
+    planner.observe_many([("a", "y", T0 + DAY)])
+    assert planner.catalogue_rate() == pytest.approx(1 / DAY)
+    planner.observe_many([("a", "y", T0 + 10_000 * DAY)])
+    # Never below a tenth of the default, however stable the catalogue.
+    assert planner.catalogue_rate() == pytest.approx(DEFAULT_RATE / 10)
+
+
+def test_rate_is_shrunk_towards_the_catalogue(planner):
+    # "busy" changed on both of its daily revisits, "calm" on neither.
+    planner.observe_many([("busy", "1", T0), ("calm", "1", T0)])
+    planner.observe_many([("busy", "2", T0 + DAY), ("calm", "1", T0 + DAY)])
+    planner.observe_many([("busy", "3", T0 + 2 * DAY), ("calm", "1", T0 + 2 * DAY)])
+    prior_rate = planner.catalogue_rate()
+    assert prior_rate == pytest.approx(2 / (4 * DAY))
+    rates = {planned.url: planned.rate_per_day for planned in planner.plan(2, now=T0 + 2 * DAY)}
+    prior_changes = prior_rate * PRIOR_WEIGHT
+    assert rates["busy"] == pytest.approx((2 + prior_changes) / (2 * DAY + PRIOR_WEIGHT) * DAY)
+    assert rates["calm"] == pytest.approx(prior_changes / (2 * DAY + PRIOR_WEIGHT) * DAY)
+    assert rates["calm"] < prior_rate * DAY < rates["busy"] < 1
+
+
+def test_urls_not_revisited_get_the_catalogue_rate(planner):
+    planner.observe_many([("old", "1", T0)])
+    planner.observe_many([("old", "2", T0 + DAY), ("new", "1", T0 + DAY)])
+    (new,) = [planned for planned in planner.plan(2, now=T0 + 3 * DAY) if planned.url == "new"]
+    assert new.rate_per_day == pytest.approx(planner.catalogue_rate() * DAY)
+    assert new.change_probability == pytest.approx(1 - math.exp(-planner.catalogue_rate() * 2 * DAY))
+
+
+def test_plan_takes_the_most_likely_changes(planner):
+    planner.observe_many([(url, "1", T0) for url in ("stale", "busy", "calm")])
+    planner.observe_many([("busy", "2", T0 + DAY), ("calm", "1", T0 + DAY)])
+    planner.observe_many([("busy", "3", T0 + 2 * DAY), ("calm", "1", T0 + 2 * DAY), ("fresh", "1", T0 + 2 * DAY)])
+    now = T0 + 3 * DAY
+    everything = planner.plan(10, now=now)
+    assert len(everything) == 4
+    probabilities = [planned.change_probability for planned in everything]
+    assert probabilities == sorted(probabilities, reverse=True)
+    # "stale" has the catalogue rate but was not seen for three days, which
+    # beats "busy" changing more often; "fresh" still has the catalogue
+    # rate, while "calm" proved more stable than the catalogue.
+    assert [planned.url for planned in everything] == ["stale", "busy", "fresh", "calm"]
+    assert [planned.url for planned in planner.plan(2, now=now)] == ["stale", "busy"]
+    assert planner.plan(0, now=now) == []
+
+
+def test_just_seen_urls_have_not_changed(planner):
+    planner.observe_many([("a", "1", T0)])
+    (planned,) = planner.plan(1, now=T0)
+    assert planned.change_probability == 0
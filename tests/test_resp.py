@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from mauromattos_scrapy.frontier import DONE, FAILED, PRIORITY_RECRAWL, RespFrontier
+from mauromattos_scrapy.resp import LocalRespServer, RespClient, RespError
+
+
+@pytest.fixture
+def server():
+    server = LocalRespServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    client = RespClient(server.url)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def frontier(server):
+    frontier = RespFrontier(server.url, lease=60.0)
+    yield frontier
+    frontier.close()
+
+
+def urls(entries):
+    return sorted(entry.url for entry in entries)
+
+
+def test_commands(client):
+    assert client.execute("SET", "a", "1") == "OK"
+    assert client.execute("INCRBY", "a", 2) == 3
+    assert client.execute("RPUSH", "l", "x", "y", "z") == 3
+    assert client.execute("LRANGE", "l", 0, -1) == [b"x", b"y", b"z"]
+    assert client.execute("LTRIM", "l", 2, -1) == "OK"
+    assert client.execute("LRANGE", "l", 0, 10) == [b"z"]
+    assert client.execute("ZADD", "z", 2, "b", 1, "a") == 2
+    assert client.execute("ZRANGEBYSCORE", "z", "-inf", 1.5) == [b"a"]
+    assert client.execute("ZADD", "z", "XX", "CH", 5, "a", 5, "c") == 1
+    assert client.execute("ZADD", "z", "NX", 9, "a", 3, "c") == 1
+    assert client.execute("ZRANGEBYSCORE", "z", "-inf", "+inf") == [b"b", b"c", b"a"]
+
+
+def test_pipeline_returns_errors_in_place(client):
+    ok, error = client.pipeline([("PING",), ("NOSUCHCOMMAND",)])
+    assert ok == "PONG"
+    assert isinstance(error, RespError)
+    client.execute("RPUSH", "l", "x")
+    with pytest.raises(RespError):
+        client.execute("INCR", "l")
+
+
+def test_transaction_applies_commands(client):
+    client.execute("RPUSH", "queue", "a", "b", "c")
+    replies = client.transaction(
+        ["queue"], [("LRANGE", "queue", 0, 1)], lambda heads: [("LTRIM", "queue", len(heads[0]), -1)]
+    )
+    assert replies == ["OK"]
+    assert client.execute("LRANGE", "queue", 0, -1) == [b"c"]
+
+
+def test_transaction_aborts_when_a_watched_key_changes(server, client):
+    client.execute("RPUSH", "queue", "a", "b")
+    other = RespClient(server.url)
+
+    def build(heads):
+        other.execute("LPOP", "queue")  # another worker gets there first
+        return [("LTRIM", "queue", len(heads[0]), -1)]
+
+    assert client.transaction(["queue"], [("LRANGE", "queue", 0, -1)], build) is None
+    assert client.execute("LRANGE", "queue", 0, -1) == [b"b"]
+    # The connection is usable and unwatched after an abort.
+    assert client.transaction(["queue"], [("LRANGE", "queue", 0, -1)], lambda heads: [("DEL", "queue")]) == [1]
+    other.close()
+
+
+def test_push_many_ignores_known_urls(frontier):
+    assert frontier.push_many(["https://a.com/1", "https://a.com/2"]) == 2
+    assert frontier.push_many(["https://a.com/2", "https://a.com/3"]) == 1
+    assert frontier.counts() == {"pending": 3, "in_progress": 0, "done": 0, "failed": 0}
+
+
+def test_pop_batch_leases_by_priority(frontier):
+    frontier.push_many([("https://a.com/low", 0), ("https://a.com/high", 10), ("https://a.com/mid", 5)])
+    (entry,) = frontier.pop_batch(1)
+    assert (entry.url, entry.domain, entry.priority) == ("https://a.com/high", "a.com", 10)
+    assert [entry.url for entry in frontier.pop_batch(10)] == ["https://a.com/mid", "https://a.com/low"]
+    assert frontier.pop_batch(10) == []
+    assert frontier.counts()["in_progress"] == 3
+
+
+def test_mark_ends_leases(frontier):
+    frontier.push_many(["https://a.com/1", "https://a.com/2"])
+    first, second = frontier.pop_batch(2)
+    frontier.mark([first.url], DONE)
+    frontier.mark([second.url], FAILED)
+    assert frontier.counts() == {"pending": 0, "in_progress": 0, "done": 1, "failed": 1}
+
+
+def test_expired_lease_goes_back_to_the_queue(server, frontier):
+    frontier.push_many(["https://a.com/1", "https://a.com/2"])
+    crashed = RespFrontier(server.url, lease=60.0)
+    leased = crashed.pop_batch(2, now=1000.0)
+    crashed.close()  # the worker died with both URLs leased
+
+    assert frontier.pop_batch(10, now=1059.0) == []
+    assert urls(frontier.pop_batch(10, now=1061.0)) == urls(leased)
+    assert frontier.counts()["in_progress"] == 2
+
+
+def test_renewed_leases_stay_with_their_worker(server, frontier):
+    frontier.push_many(["https://a.com/1", "https://a.com/2"])
+    worker = RespFrontier(server.url, lease=60.0)
+    now = time.time()
+    queued, downloaded = worker.pop_batch(2, now=now - 100)  # both leases expired
+    assert worker.renew([queued.url], now=now) == 1
+    assert frontier.recover() == 1
+    # Taken back for the other workers: renewing does not revive it.
+    assert worker.renew([downloaded.url], now=now) == 0
+    assert urls(frontier.pop_batch(10)) == [downloaded.url]
+    worker.close()
+
+
+def test_recover_leaves_live_leases_alone(server, frontier):
+    frontier.push_many(["https://a.com/1", "https://a.com/2"])
+    frontier.pop_batch(1)
+    crashed = RespFrontier(server.url, lease=-1.0)
+    crashed.pop_batch(1)
+    crashed.close()
+    assert frontier.recover() == 1
+    assert frontier.counts() == {"pending": 1, "in_progress": 1, "done": 0, "failed": 0}
+
+
+def test_concurrent_workers_lease_each_url_once(server):
+    seeds = [f"https://a.com/{i}" for i in range(300)]
+    RespFrontier(server.url).push_many(seeds)
+    leased = []
+
+    def work():
+        worker = RespFrontier(server.url)
+        while batch := worker.pop_batch(7):
+            leased.extend(entry.url for entry in batch)
+        worker.close()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(leased) == sorted(seeds)
+
+
+def test_schedule_recrawls(frontier):
+    frontier.push_many(["https://a.com/1"])
+    frontier.mark([entry.url for entry in frontier.pop_batch(1)], DONE)
+    assert frontier.schedule_recrawls(older_than=3600) == 0
+    assert frontier.schedule_recrawls(older_than=-1) == 1
+    (entry,) = frontier.pop_batch(1)
+    assert (entry.url, entry.priority) == ("https://a.com/1", PRIORITY_RECRAWL)
@@ -0,0 +1,50 @@
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+
+from mauromattos_scrapy.sitemaps import SitemapTooLarge, iter_sitemap
+
+URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc> https://www.americanas.com.br/produto/1 </loc><lastmod>2024-05-01T10:00:00Z</lastmod></url>
+  <url><loc>https://www.americanas.com.br/produto/2</loc></url>
+  <url><lastmod>2024-05-01</lastmod></url>
+</urlset>"""
+
+INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://www.americanas.com.br/sitemap-1.xml.gz</loc><lastmod>2024-05-02</lastmod></sitemap>
+</sitemapindex>"""
+
+
+def test_urlset_entries():
+    entries = list(iter_sitemap(URLSET))
+    assert [entry.loc for entry in entries] == [
+        "https://www.americanas.com.br/produto/1",
+        "https://www.americanas.com.br/produto/2",
+    ]
+    assert entries[0].lastmod == datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+    assert entries[1].lastmod is None
+    assert not any(entry.is_sitemap for entry in entries)
+
+
+def test_index_entries_are_sitemaps():
+    (entry,) = iter_sitemap(INDEX)
+    assert entry.is_sitemap
+    assert entry.lastmod == datetime(2024, 5, 2, tzinfo=timezone.utc)
+
+
+def test_gzip_body():
+    assert list(iter_sitemap(gzip.compress(URLSET))) == list(iter_sitemap(URLSET))
+
+
+def test_many_urls_stream():
+    body = b"<urlset>" + b"".join(b"<url><loc>https://x/%d</loc></url>" % i for i in range(20_000)) + b"</urlset>"
+    assert sum(1 for _ in iter_sitemap(body)) == 20_000
+
+
+def test_max_size_counts_decompressed_bytes():
+    body = b"<urlset>" + b"<url><loc>https://x/</loc></url>" * 10_000 + b"</urlset>"
+    with pytest.raises(SitemapTooLarge):
+        list(iter_sitemap(gzip.compress(body), max_size=64 * 1024))
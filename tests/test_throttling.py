@@ -0,0 +1,157 @@
+import asyncio
+import random
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.core.downloader import Slot
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+from zyte_api import RequestError
+
+from mauromattos_scrapy.middlewares import DomainRetryBudgetMiddleware
+from mauromattos_scrapy.throttling import BUDGETED_RETRY_POLICY, CircuitBreaker, RetryBudget, backoff_delay
+
+URL = "https://www.americanas.com.br/produto-1/p"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Downloader:
+    # Just the slot lookup DomainRetryBudgetMiddleware uses.
+    def __init__(self):
+        self.slots = {"americanas.com.br": Slot(concurrency=8, delay=0.5, jitter=0)}
+
+    def get_slot_key(self, request):
+        return "americanas.com.br"
+
+
+class Engine:
+    def __init__(self):
+        self.downloader = Downloader()
+
+
+def zyte_api_error(status):
+    return RequestError(request_info=None, history=(), status=status, query={}, response_content=b"{}")
+
+
+def test_budget_starts_with_min_tokens_and_refills_from_successes():
+    budget = RetryBudget(ratio=0.5, min_tokens=2, max_tokens=3)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(100):
+        budget.deposit()
+    assert budget.tokens == 3
+
+
+def test_breaker_opens_after_threshold_and_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, max_cooldown=25, clock=Clock())
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.is_open
+    # Failed probes back off, up to max_cooldown.
+    breaker.record_failure()
+    assert breaker.cooldown == 20
+    breaker.record_failure()
+    assert breaker.cooldown == 25
+    assert breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.cooldown == 10 and breaker.failures == 0
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, clock=Clock())
+    breaker.record_failure()
+    assert not breaker.record_success()
+    assert not breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_backoff_delay_bounds():
+    rng = random.Random(0)
+    assert backoff_delay(0, 1, 60, rng) == 0
+    for failures, ceiling in ((1, 1), (3, 4), (10, 60)):
+        for _ in range(20):
+            assert ceiling / 2 <= backoff_delay(failures, 1, 60, rng) <= ceiling
+
+
+def test_budgeted_policy_raises_download_errors_at_once():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        raise zyte_api_error(520)
+
+    with pytest.raises(RequestError):
+        asyncio.run(BUDGETED_RETRY_POLICY(fetch))
+    assert len(calls) == 1
+
+
+@pytest.fixture
+def middleware():
+    crawler = get_crawler(
+        Spider,
+        {
+            "RETRY_BUDGET_MIN_TOKENS": 2,
+            "RETRY_BUDGET_RATIO": 1,
+            "CIRCUIT_BREAKER_THRESHOLD": 4,
+            "RETRY_TIMES": 10,
+        },
+    )
+    crawler.spider = crawler._create_spider("test")
+    crawler.engine = Engine()
+    return DomainRetryBudgetMiddleware.from_crawler(crawler)
+
+
+def test_process_request_sets_retry_policy(middleware):
+    request = Request(URL)
+    middleware.process_request(request)
+    assert request.meta["zyte_api_retry_policy"] == DomainRetryBudgetMiddleware.retry_policy
+    custom = Request(URL, meta={"zyte_api_retry_policy": "zyte_api.zyte_api_retrying"})
+    middleware.process_request(custom)
+    assert custom.meta["zyte_api_retry_policy"] == "zyte_api.zyte_api_retrying"
+
+
+def test_zyte_api_errors_are_paid_from_the_budget(middleware):
+    stats = middleware.crawler.stats
+    retry = middleware.process_exception(Request(URL), zyte_api_error(520))
+    assert isinstance(retry, Request)
+    assert middleware.process_exception(Request(URL), zyte_api_error(520)) is not None
+    assert middleware.process_exception(Request(URL), zyte_api_error(520)) is None
+    assert stats.get_value("retry_budget/americanas.com.br/zyte_api_520") == 3
+    assert stats.get_value("retry_budget/americanas.com.br/exhausted") == 1
+    # A success earns a token back (RETRY_BUDGET_RATIO = 1).
+    middleware.process_response(Request(URL), Response(URL, status=200))
+    assert middleware.process_exception(Request(URL), zyte_api_error(520)) is not None
+
+
+def test_zyte_api_errors_open_the_breaker(middleware):
+    stats = middleware.crawler.stats
+    for _ in range(4):
+        middleware.process_exception(Request(URL), zyte_api_error(521))
+    assert stats.get_value("circuit_breaker/americanas.com.br/opened") == 1
+    assert middleware.process_exception(Request(URL), zyte_api_error(521)) is None
+    # The failure that opened the breaker was not retried either.
+    assert stats.get_value("retry_budget/americanas.com.br/skipped_circuit_open") == 2
+    slot = middleware.crawler.engine.downloader.slots["americanas.com.br"]
+    assert slot.delay == 120  # a failed probe doubled the 60s cooldown
+    middleware.process_response(Request(URL), Response(URL, status=200))
+    assert stats.get_value("circuit_breaker/americanas.com.br/closed") == 1
+    assert slot.delay == 0.5
+
+
+def test_rejected_requests_are_not_domain_failures(middleware):
+    assert middleware.process_exception(Request(URL), zyte_api_error(400)) is None
+    assert middleware.crawler.stats.get_value("retry_budget/americanas.com.br/zyte_api_400") == 1
+    _, health = middleware._health(Request(URL))
+    assert health.breaker.failures == 0
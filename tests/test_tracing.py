@@ -0,0 +1,146 @@
+import json
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from mauromattos_scrapy.middlewares import RequestTracingMiddleware
+from mauromattos_scrapy.tracing import Tracer
+
+
+class TracedSpider(Spider):
+    name = "traced"
+
+
+def read(path):
+    return json.loads(path.read_text())
+
+
+def requests(events):
+    return {event["args"]["url"]: event for event in events if event.get("name") == "request"}
+
+
+def run(tracer, trace, seconds, stage="download"):
+    start = trace.started
+    tracer.span(trace, stage, start, start + seconds)
+
+
+def test_sample_rate(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(path, sample_rate=0.5, seed=1)
+    traces = [tracer.start(f"https://example.com/{n}") for n in range(200)]
+    sampled = [trace.url for trace in traces if trace.sampled]
+    for trace in traces:
+        tracer.finish(trace)
+    tracer.close()
+    assert 60 < len(sampled) < 140
+    assert sorted(requests(read(path))) == sorted(sampled)
+    assert tracer.started == 200 and tracer.written == len(sampled)
+
+
+def test_slow_and_failed_requests_are_always_written(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(path, sample_rate=0, slow_threshold=1.0, process_name="test")
+    fast, slow, failed = (tracer.start(f"https://example.com/{name}") for name in ("fast", "slow", "failed"))
+    run(tracer, fast, 0.5)
+    run(tracer, slow, 0.5, "queue")
+    run(tracer, slow, 2.0, "extract")
+    tracer.finish(fast)
+    tracer.finish(slow)
+    tracer.finish(failed, "TimeoutError: took too long")
+    tracer.close()
+    written = requests(read(path))
+    assert sorted(written) == ["https://example.com/failed", "https://example.com/slow"]
+    assert written["https://example.com/slow"]["args"]["slow"] is True
+    assert written["https://example.com/slow"]["dur"] == pytest.approx(2e6)
+    assert written["https://example.com/failed"]["args"]["error"] == "TimeoutError: took too long"
+    assert (tracer.slow, tracer.errors) == (1, 1)
+    assert tracer.slow_stages == {"extract": 1}
+
+
+def test_sweep_writes_abandoned_failures(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(path, sample_rate=0)
+    failed, waiting = tracer.start("https://example.com/failed"), tracer.start("https://example.com/waiting")
+    failed.error = "download failed"
+    tracer.mark(waiting, "queue")
+    tracer.sweep()
+    assert len(tracer.traces) == 2
+    tracer.sweep(idle=0)
+    assert list(tracer.traces) == [waiting.trace_id]
+    tracer.close()
+    written = requests(read(path))
+    assert written["https://example.com/failed"]["args"]["error"] == "download failed"
+    assert written["https://example.com/waiting"]["args"]["error"] == "incomplete"
+
+
+def test_discard(tmp_path):
+    tracer = Tracer(tmp_path / "trace.json", sample_rate=1)
+    tracer.discard(tracer.start("https://example.com/"))
+    tracer.close()
+    assert tracer.started == 0
+    assert read(tmp_path / "trace.json") == []
+
+
+@pytest.fixture
+def middleware(tmp_path):
+    crawler = get_crawler(TracedSpider, {"TRACE_FILE": str(tmp_path / "{spider}.json"), "TRACE_SAMPLE_RATE": 1})
+    crawler.spider = crawler._create_spider()
+    middleware = RequestTracingMiddleware.from_crawler(crawler)
+    # Listed as a spider and a downloader middleware: one tracer.
+    assert RequestTracingMiddleware.from_crawler(crawler) is middleware
+    return middleware
+
+
+def close(middleware):
+    middleware.spider_closed(middleware.crawler.spider)
+    return requests(read(middleware.tracer.writer.path))
+
+
+def test_middleware_traces_a_request(middleware):
+    request = Request("https://example.com/")
+    middleware.request_scheduled(request)
+    middleware.request_reached_downloader(request)
+    response = HtmlResponse(request.url, body=b"<html></html>", request=request)
+    middleware.response_downloaded(response, request)
+    middleware.response_received(response, request)
+    middleware.process_spider_input(response)
+    item = {"url": request.url}
+    assert list(middleware.process_spider_output(response, [item])) == [item]
+    assert middleware.tracer.traces
+    middleware.item_done(item, response)
+    assert not middleware.tracer.traces
+    close(middleware)
+    events = read(middleware.tracer.writer.path)
+    stages = [event["name"] for event in events if event.get("cat") == "stage"]
+    assert stages == ["queue", "download", "inject", "extract", "pipeline"]
+
+
+@pytest.mark.parametrize(
+    "exception, error",
+    [(IgnoreRequest("robots.txt"), None), (ValueError("bad header"), "ValueError: bad header")],
+)
+def test_middleware_ends_requests_dropped_before_download(middleware, exception, error):
+    request = Request("https://example.com/")
+    middleware.request_scheduled(request)
+    assert middleware.process_exception(request, exception) is None
+    assert not middleware.tracer.traces
+    (trace,) = close(middleware).values()
+    assert trace["args"].get("error") == error
+    assert middleware.crawler.stats.get_value("tracing/errors") == (error is not None)
+
+
+def test_middleware_keeps_failed_downloads_for_a_retry(middleware):
+    request = Request("https://example.com/")
+    middleware.request_scheduled(request)
+    middleware.request_reached_downloader(request)
+    middleware.request_left_downloader(request)
+    # Seen after request_left_downloader; an errback may still retry.
+    middleware.process_exception(request, TimeoutError())
+    (trace,) = middleware.tracer.traces.values()
+    assert trace.error == "download failed"
+    middleware.request_scheduled(request.replace(dont_filter=True))
+    assert trace.error is None and list(trace.marks) == ["queue"]
+    assert close(middleware)["https://example.com/"]["args"]["error"] == "incomplete"